@@ -0,0 +1,101 @@
+import hashlib
+import os
+import pytest
+from zgoubidoo import ureg as _ureg
+from zgoubidoo import Input
+from zgoubidoo import assets as _assets
+from zgoubidoo.assets import AssetStore, AssetException
+from zgoubidoo.commands import *
+
+
+def _write(path, content: bytes):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_bytes(content)
+    return str(path)
+
+
+def test_asset_store_hard_link(tmp_path):
+    source = _write(tmp_path / 'fieldmap.table', b'1.0 2.0 3.0\n')
+    store = AssetStore(path=str(tmp_path / 'store'))
+    stored = store.register(source)
+    assert stored == os.path.join(str(tmp_path / 'store'), hashlib.sha256(b'1.0 2.0 3.0\n').hexdigest())
+    assert os.path.samefile(stored, source)
+
+    linked = store.link(source, str(tmp_path / 'run'))
+    assert linked == os.path.join(str(tmp_path / 'run'), 'fieldmap.table')
+    assert not os.path.islink(linked)
+    assert os.path.samefile(linked, source)
+
+    assert store.link(source, str(tmp_path / 'run')) == linked  # Existing links are replaced
+    assert os.path.samefile(linked, source)
+
+
+def test_asset_store_symlink_fallback(tmp_path, monkeypatch):
+    source = _write(tmp_path / 'fieldmap.table', b'1.0 2.0 3.0\n')
+
+    def _link(*_):
+        raise OSError("Invalid cross-device link")
+    monkeypatch.setattr(os, 'link', _link)
+
+    store = AssetStore(path=str(tmp_path / 'store'))
+    stored = store.register(source)
+    assert not os.path.samefile(stored, source)  # Copied in the store
+    assert open(stored, 'rb').read() == b'1.0 2.0 3.0\n'
+
+    linked = store.link(source, str(tmp_path / 'run'))
+    assert os.path.islink(linked)
+    assert os.readlink(linked) == stored
+
+
+def test_asset_store_deduplication(tmp_path):
+    a = _write(tmp_path / 'a.table', b'1.0 2.0 3.0\n')
+    b = _write(tmp_path / 'maps' / 'b.table', b'1.0 2.0 3.0\n')
+    c = _write(tmp_path / 'c.table', b'4.0 5.0 6.0\n')
+    store = AssetStore()
+    assert store.register(a) == store.register(b) == os.path.realpath(a)
+    assert store.register(c) == os.path.realpath(c)
+    assert store.assets == {
+        hashlib.sha256(b'1.0 2.0 3.0\n').hexdigest(): os.path.realpath(a),
+        hashlib.sha256(b'4.0 5.0 6.0\n').hexdigest(): os.path.realpath(c),
+    }
+    with pytest.raises(AssetException):
+        store.register(str(tmp_path / 'missing.table'))
+
+    store.clear()
+    assert store.assets == {}
+    assert os.path.isfile(a)  # Source files are not removed
+
+
+def test_asset_store_link_all(tmp_path):
+    base = tmp_path / 'base'
+    _write(base / 'a.table', b'a')
+    _write(base / 'maps' / 'b.table', b'b')
+    absolute = _write(tmp_path / 'c.table', b'c')
+    _write(tmp_path / 'd.table', b'd')
+    run = str(tmp_path / 'run')
+    store = AssetStore()
+    linked = store.link_all(['a.table', 'maps/b.table', 'a.table', absolute, '../d.table', 'missing.table'],
+                            run,
+                            base_path=str(base))
+    assert sorted(linked) == [os.path.join(run, 'a.table'), os.path.join(run, 'maps', 'b.table')]
+    assert sorted(os.listdir(run)) == ['a.table', 'maps']
+    assert open(os.path.join(run, 'maps', 'b.table'), 'rb').read() == b'b'
+
+
+def test_input_generate_links_assets(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(_assets, 'asset_store', AssetStore())
+    _write(tmp_path / 'maps' / 'fieldmap.table', b'1.0 2.0 3.0\n')
+    zi = Input(name='TEST', line=[
+        Objet2('BUNCH', BORO=2149 * _ureg.kilogauss * _ureg.cm),
+        Proton(),
+        Tosca('T1', FNAME='maps/fieldmap.table', IX=3, MOD=12),
+        End(),
+    ])
+    zi(mappings=[{}, {'T1.BNORM': 2.0}], path=str(tmp_path / 'runs'))
+    assert len(zi.paths) == 2
+    for _, target_dir, _ in zi.paths:
+        linked = os.path.join(target_dir.name, 'maps', 'fieldmap.table')
+        assert os.path.samefile(linked, str(tmp_path / 'maps' / 'fieldmap.table'))
+        assert os.path.isfile(os.path.join(target_dir.name, 'zgoubi.dat'))
+    zi.cleanup()
@@ -0,0 +1,45 @@
+import numpy as _np
+import pytest
+from zgoubidoo import ureg as _ureg
+from zgoubidoo import Kinematics
+from zgoubidoo.commands import BeamInputDistribution, BeamZgoubiDistribution
+from zgoubidoo.commands.beam import generate_multivariate_normal
+
+
+def test_generate_multivariate_normal_reproducible():
+    matrix = _np.array([[4.0, 1.0, 0.0], [1.0, 2.0, 0.5], [0.0, 0.5, 1.0]])
+    single = generate_multivariate_normal(10000, [1.0, 0.0, -1.0], matrix, seed=42, n_procs=1, shard_size=1024)
+    multiple = generate_multivariate_normal(10000, [1.0, 0.0, -1.0], matrix, seed=42, n_procs=3, shard_size=1024)
+    assert single.shape == (10000, 3)
+    assert _np.array_equal(single, multiple)
+    assert not _np.array_equal(single, generate_multivariate_normal(10000, [1.0, 0.0, -1.0], matrix, seed=43,
+                                                                    shard_size=1024))
+    assert _np.cov(single.T) == pytest.approx(matrix, abs=0.1)
+
+
+def test_generate_from_5d_sigma_matrix_without_momentum_spread():
+    distribution = BeamInputDistribution.generate_from_5d_sigma_matrix(
+        100000, s11=4e-6, s12=-1e-6, s22=1e-6, s33=2e-6, s44=1e-6, dpprms=0, seed=1,
+    )
+    assert distribution.shape == (100000, 5)
+    assert _np.all(distribution[:, 4] == 0)
+    expected = _np.diag([4e-6, 1e-6, 2e-6, 1e-6, 0.0])
+    expected[0, 1] = expected[1, 0] = -1e-6
+    assert _np.cov(distribution.T) == pytest.approx(expected, abs=5e-8)
+
+
+def _seeds(beam):
+    objet = beam.generate_object()
+    return objet.I1, objet.I2, objet.I3
+
+
+def test_beam_zgoubi_distribution_seeds():
+    kinematics = Kinematics(230 * _ureg.MeV)
+    a = BeamZgoubiDistribution('BUNCH', kinematics=kinematics, slices=2, SEED=42)
+    b = BeamZgoubiDistribution('BUNCH', kinematics=kinematics, slices=2, SEED=42)
+    assert _seeds(a) == _seeds(b)
+    seeds = _seeds(a)
+    a.SLICE = b.SLICE = 1
+    assert _seeds(a) == _seeds(b) != seeds
+    b.SEED = 43
+    assert _seeds(a) != _seeds(b)
@@ -0,0 +1,49 @@
+import pickle
+import numpy as _np
+import pandas as _pd
+import pytest
+import zgoubidoo.commands.beam as _beam
+from zgoubidoo.commands.beam import ArraySource, CsvSource, NpySource, ParquetSource, open_distribution
+
+COLUMNS = ['Y', 'T', 'Z', 'P', 'D']
+
+
+@pytest.fixture
+def distribution():
+    return _pd.DataFrame(_np.arange(5 * 1000, dtype=float).reshape(1000, 5) / 8, columns=COLUMNS)
+
+
+@pytest.fixture
+def files(tmp_path, distribution):
+    _np.save(str(tmp_path / 'beam.npy'), distribution.values)
+    distribution.to_csv(str(tmp_path / 'beam.csv'), index=False)
+    distribution.to_parquet(str(tmp_path / 'beam.parquet'), row_group_size=128)
+    return tmp_path
+
+
+def test_array_source(distribution):
+    source = ArraySource(distribution)
+    assert len(source) == 1000
+    assert _np.array_equal(source.read(10, 20), distribution.values[10:20])
+
+
+@pytest.mark.parametrize('file, source_type', [('beam.npy', NpySource),
+                                               ('beam.csv', CsvSource),
+                                               ('beam.parquet', ParquetSource)])
+def test_file_sources(files, distribution, monkeypatch, file, source_type):
+    monkeypatch.setattr(_beam, 'CSV_INDEX_STRIDE', 64)
+    source = open_distribution(file, path=str(files))
+    assert type(source) is source_type
+    assert len(source) == 1000
+    for start, stop in ((0, 1), (100, 300), (990, 1100), (500, 500)):
+        assert _np.array_equal(source.read(start, stop), distribution.values[start:stop])
+    assert len(open_distribution(file, path=str(files), n=300)) == 300
+
+
+@pytest.mark.parametrize('file', ['beam.csv', 'beam.parquet'])
+def test_file_sources_pickle(files, distribution, file):
+    source = pickle.loads(pickle.dumps(open_distribution(file, path=str(files))))
+    assert len(source) == 1000
+    assert _np.array_equal(source.read(200, 400), distribution.values[200:400])
+    source = pickle.loads(pickle.dumps(source))
+    assert _np.array_equal(source.read(0, 10), distribution.values[0:10])
@@ -0,0 +1,102 @@
+import os
+import numpy as _np
+import pytest
+from zgoubidoo import ureg as _ureg
+from zgoubidoo import Input, CheckpointedTracking, CheckpointException
+from zgoubidoo.commands import *
+from zgoubidoo.checkpoints import CHECKPOINT_FILENAME, CHECKPOINT_LABEL
+from zgoubidoo.zgoubi import ZgoubiResults
+
+
+def _ring(npass: int = 9) -> Input:
+    return Input(name='RING', line=[
+        Objet2('BUNCH', BORO=2149 * _ureg.kilogauss * _ureg.cm),
+        Proton(),
+        Drift('D1', XL=10 * _ureg.cm),
+        Rebelote('REB', NPASS=npass),
+        End(),
+    ])
+
+
+def test_checkpointed_tracking_requires_rebelote(tmp_path):
+    zi = Input(name='LINE', line=[Objet2('BUNCH'), Drift('D1', XL=10 * _ureg.cm), End()])
+    with pytest.raises(CheckpointException):
+        CheckpointedTracking(zi, chunk=2, path=str(tmp_path))
+    with pytest.raises(CheckpointException):
+        CheckpointedTracking(_ring(), chunk=0, path=str(tmp_path))
+
+
+def test_checkpointed_tracking_chunks(tmp_path):
+    tracking = CheckpointedTracking(_ring(npass=9), chunk=4, path=str(tmp_path))
+    assert tracking.passes_total == 10
+    assert tracking.passes_done == 0
+    assert not tracking.done
+    chunk = tracking._chunk_input(4)
+    assert chunk.keywords == ['OBJET', 'PARTICUL', 'FAISTORE', 'DRIFT', 'MARKER', 'REBELOTE', 'END']
+    assert chunk[4].LABEL1 == CHECKPOINT_LABEL
+    assert chunk[5].NPASS == 3
+    assert 'REBELOTE' not in tracking._chunk_input(1).keywords
+
+
+def _fai_file(filename, rows):
+    """Write (KEX, IT, IPASS, Y) rows in a Zgoubi .fai file."""
+    with open(filename, 'w') as f:
+        f.write("# FAISTORE\n#\n# KEX, Y-DY, T, Z, P, D-1, IT, IPASS, LABEL1\n# int, cm, mrad, cm, mrad, , , , \n")
+        for kex, it, ipass, y in rows:
+            f.write(f"{kex} {y} 0.0 0.0 0.0 0.0 {it} {ipass} '{CHECKPOINT_LABEL}'\n")
+
+
+class _Zgoubi:
+    """Writes the outputs of synthetic chunks in the run directories instead of executing Zgoubi."""
+
+    def __init__(self, chunks):
+        self.chunks = list(chunks)
+        self.runs = []
+
+    def __call__(self, zgoubi_input, mappings):
+        n = len(zgoubi_input.paths)
+        zgoubi_input(mappings=mappings)
+        for p in zgoubi_input.paths[n:]:
+            checkpoint, tracks = self.chunks.pop(0)
+            _fai_file(os.path.join(p[1].name, CHECKPOINT_FILENAME), checkpoint)
+            _fai_file(os.path.join(p[1].name, 'zgoubi.fai'), tracks)
+            self.runs.append((zgoubi_input, p))
+
+    def collect(self, paths):
+        return ZgoubiResults([{'input': zi, 'mapping': p[0], 'path': p[1]} for zi, p in self.runs
+                              if any(p[1] is q for q in paths)])
+
+
+def test_checkpointed_tracking_stitching(tmp_path):
+    # Particle numbers of the complete tracking: 1, 2 (lost during the first chunk) and 3; the Y coordinate encodes the
+    # particle and pass numbers of the complete tracking (10 * IT + IPASS)
+    zgoubi = _Zgoubi([
+        (
+            [(1, it, 3, 10 * it + 3) for it in (1, 3)] + [(-1, 2, 3, 23)],
+            [(1, it, ipass, 10 * it + ipass) for ipass in (1, 2, 3) for it in (1, 2, 3)],
+        ),
+        (
+            [(1, 2, 3, 36), (1, 1, 3, 16)],  # The restarted particles 1 and 2 are the particles 1 and 3
+            [(1, it, ipass, 10 * [1, 3][it - 1] + ipass + 3) for ipass in (1, 2, 3) for it in (1, 2)],
+        ),
+    ])
+    tracking = CheckpointedTracking(_ring(npass=5), chunk=3, path=str(tmp_path), outputs=('fai', ), zgoubi=zgoubi)
+    assert not tracking.run(max_chunks=1)
+    assert tracking.passes_done == 3
+    assert _np.array_equal(_np.load(str(tmp_path / 'chunk-0000.ids.npy')), [1, 3])
+    assert tracking.run()
+    assert tracking.passes_done == 6
+    assert len(zgoubi.runs) == 2
+    assert _np.array_equal(_np.load(str(tmp_path / 'chunk-0001.ids.npy')), [1, 3])
+    assert _np.load(str(tmp_path / 'chunk-0001.particles.npy'))[:, 0] == pytest.approx([16.0, 36.0])
+
+    tracks = tracking.tracks(output='fai')
+    assert len(tracks) == 9 + 6
+    assert sorted(tracks['IPASS'].unique()) == [1, 2, 3, 4, 5, 6]
+    assert _np.array_equal(tracks['Y-DY'].values, 10 * tracks['IT'].values + tracks['IPASS'].values)
+    assert sorted(tracks.query('IPASS > 3')['IT'].unique()) == [1, 3]
+
+    resumed = CheckpointedTracking(_ring(npass=5), chunk=3, path=str(tmp_path), outputs=('fai', ), zgoubi=zgoubi)
+    assert resumed.done
+    assert resumed.tracks(output='fai').equals(tracks)
+    assert [f for f in os.listdir(str(tmp_path)) if f.startswith('state')] == ['state.json']
@@ -0,0 +1,39 @@
+import pandas as _pd
+import pytest
+from zgoubidoo import ureg as _ureg
+from zgoubidoo import Kinematics
+from zgoubidoo.converters import VECTORIZED_CONVERTERS, marker_to_zgoubi, drift_to_zgoubi, quadrupole_to_zgoubi
+
+
+def _tokens(commands):
+    tokens = []
+    for c in commands:
+        for t in str(c).split():
+            try:
+                tokens.append(float(t))
+            except ValueError:
+                tokens.append(t)
+    return tokens
+
+
+@pytest.mark.parametrize('keyword, converter', [('MARKER', marker_to_zgoubi),
+                                                ('DRIFT', drift_to_zgoubi),
+                                                ('QUADRUPOLE', quadrupole_to_zgoubi)])
+def test_vectorized_converters(keyword, converter):
+    kinematics = Kinematics(230 * _ureg.MeV)
+    df = _pd.DataFrame({
+        'KEYWORD': ['MARKER', 'DRIFT', 'QUADRUPOLE', 'QUADRUPOLE', 'DRIFT', 'MARKER', 'QUADRUPOLE'],
+        'L': [0 * _ureg.m, 1.5 * _ureg.m, 0.3 * _ureg.m, 0.4 * _ureg.m, 25 * _ureg.cm, 0 * _ureg.m, 0.2 * _ureg.m],
+        'K1': [0.0, 0.0, 1.2, -0.8, 0.0, 0.0, 0.0],
+        'K1L': [0.0, 0.0, 0.0, 0.0, 0.0, 0.0, 0.5],
+    }, index=['START', 'D1', 'Q1', 'Q2', 'D2', 'END', 'QUADRUPOLE_WITH_A_LONG_NAME'])
+    elements = df[df['KEYWORD'] == keyword]
+    vectorized = VECTORIZED_CONVERTERS[keyword](elements, kinematics, {})
+    per_element = [converter(e, kinematics, {}) for _, e in elements.iterrows()]
+    assert len(vectorized) == len(per_element) == len(elements)
+    for v, e in zip(vectorized, per_element):
+        assert [type(c) for c in v] == [type(c) for c in e]
+        tokens = _tokens(e)
+        assert len(_tokens(v)) == len(tokens)
+        for a, b in zip(_tokens(v), tokens):
+            assert a == (pytest.approx(b, rel=1e-12, abs=1e-15) if isinstance(b, float) else b)
@@ -0,0 +1,33 @@
+import numpy as _np
+import pytest
+from zgoubidoo import ureg as _ureg
+from zgoubidoo import ResultsCube
+from zgoubidoo.mappings import mapping_key
+
+
+def test_mapping_key_units():
+    assert mapping_key({'B1.B1': 2000 * _ureg.gauss}) == mapping_key({'B1.B1': 0.2 * _ureg.tesla})
+    assert mapping_key({'B1.B1': 3 * _ureg.kilogauss, 'D1.XL': 15 * _ureg.cm}) == \
+        mapping_key({'D1.XL': 0.15 * _ureg.m, 'B1.B1': 0.3 * _ureg.tesla})
+    assert mapping_key({'B1.B1': 0.3 * _ureg.tesla}) != mapping_key({'B1.B1': 0.31 * _ureg.tesla})
+
+
+def test_cube_from_mappings():
+    mappings = [{'Q1.K1': k1, 'B1.B1': b1 * _ureg.kilogauss} for b1 in (1.0, 2.0) for k1 in (0.1, 0.2, 0.3)]
+    cube = ResultsCube.from_mappings(mappings[:-1], observables={'T': [0.1, 0.2, 0.3, 0.4, 0.5]})
+    assert cube.shape == (3, 2)
+    assert len(cube) == 5
+    assert cube.value('T', {'Q1.K1': 0.2, 'B1.B1': 0.2 * _ureg.tesla}) == pytest.approx(0.5)
+    assert cube.run({'Q1.K1': 0.1, 'B1.B1': 1000 * _ureg.gauss}) == 0
+    assert {'Q1.K1': 0.3, 'B1.B1': 0.2 * _ureg.tesla} not in cube
+    assert _np.isnan(cube['T'][2, 1])
+    assert cube.sel({'Q1.K1': 0.1})['T'] == pytest.approx([0.1, 0.4])
+
+
+def test_cube_assign():
+    cube = ResultsCube.from_mappings([{'Q1.K1': 0.1}, {'Q1.K1': 0.2}], observables={'T': [1.0, 2.0]})
+    other = cube.assign({'N': [10, None]})
+    assert other.observables == ['T', 'N']
+    assert other['N'][0] == 10
+    assert _np.isnan(other['N'][1])
+    assert cube.observables == ['T']
@@ -0,0 +1,51 @@
+import numpy as _np
+import pandas as _pd
+import pytest
+from zgoubidoo.envelope import LinearEnvelope, sigma_from_twiss
+
+
+def _drifts(lengths):
+    """Step-by-step transfer matrices of a drift, in the format of `zgoubidoo.twiss.compute_transfer_matrix`."""
+    rows = []
+    for s in lengths:
+        r = _np.eye(5)
+        r[0, 1] = r[2, 3] = s
+        rows.append({'S': s, 'LABEL1': 'D1', 'KEYWORD': 'DRIFT',
+                     **{f"R{i + 1}{j + 1}": r[i, j] for i in range(5) for j in range(5)}})
+    return _pd.DataFrame(rows)
+
+
+def test_sigma_from_twiss():
+    sigma = sigma_from_twiss(beta_y=[5.0, 10.0], alpha_y=-1.0, emit_y=1e-6, beta_z=2.0, emit_z=2e-6, dpp_rms=1e-3,
+                             disp_y=1.5)
+    assert sigma.shape == (2, 5, 5)
+    assert sigma[1, 0, 0] == pytest.approx(10e-6 + 1.5 ** 2 * 1e-6)
+    assert sigma[0, 0, 1] == pytest.approx(1e-6)
+    assert sigma[0, 3, 3] == pytest.approx(0.5 * 2e-6)
+    assert sigma[0, 0, 4] == pytest.approx(1.5e-6)
+    assert sigma[0, 4, 4] == pytest.approx(1e-6)
+    assert _np.all(_np.linalg.det(sigma[:, :4, :4]) >= 0)
+
+
+def test_propagate():
+    envelope = LinearEnvelope(_drifts([0.0, 1.0, 2.0]))
+    assert len(envelope) == 3
+    sigma = sigma_from_twiss(beta_y=1.0, emit_y=1e-6, beta_z=4.0, emit_z=1e-6, dpp_rms=1e-3)
+    s = envelope.propagate(sigma)
+    assert s.shape == (3, 5, 5)
+    _np.testing.assert_allclose(s[0], sigma)
+    assert s[:, 0, 0] == pytest.approx(1e-6 * (1 + _np.array([0.0, 1.0, 2.0]) ** 2))
+    assert s[:, 2, 2] == pytest.approx(1e-6 * (4 + _np.array([0.0, 1.0, 2.0]) ** 2 / 4))
+    _np.testing.assert_allclose(envelope.sizes(sigma), _np.sqrt(_np.diagonal(s, axis1=1, axis2=2)))
+    _np.testing.assert_allclose(envelope.sizes(_np.stack([sigma, 2 * sigma]))[1], _np.sqrt(2) * envelope.sizes(sigma))
+    assert envelope.propagate_centroid([1e-3, 1e-3, 0.0, 0.0, 0.0])[:, 0] == pytest.approx([1e-3, 2e-3, 3e-3])
+
+
+def test_to_df():
+    envelope = LinearEnvelope(_drifts([0.0, 1.0]))
+    df = envelope.to_df(sigma_from_twiss(beta_y=1.0, emit_y=1e-6, dpp_rms=1e-3))
+    assert list(df.columns[:3]) == ['S', 'LABEL1', 'KEYWORD']
+    assert {'SIGMA_Y_Y', 'SIGMA_Y_D', 'SIGMA_D_D', 'SIZE_Y', 'SIZE_D'} <= set(df.columns)
+    assert not any('D-1' in c for c in df.columns)
+    assert df['SIZE_D'].values == pytest.approx([1e-3, 1e-3])
+    assert df['SIZE_Y'].values == pytest.approx(_np.sqrt([1e-6, 2e-6]))
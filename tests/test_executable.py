@@ -0,0 +1,196 @@
+import os
+import sys
+import threading
+import time
+import pytest
+from zgoubidoo.executable import Executable, ExecutableException, ExecutionGovernor, RunProgress, PROGRESS_PATTERNS
+
+ZGOUBI_STDOUT = [
+    "  Zgoubi, author's dvlpmnt version.",
+    "  Job  started  on  19-10-2026,  at  10:02:13",
+    "    1  Keyword, label(s) :  OBJET       BUNCH                                                IPASS= 1",
+    "    2  Keyword, label(s) :  PARTICUL                                                         IPASS= 1",
+    "    3  Keyword, label(s) :  QUADRUPO    Q1                                                   IPASS= 1",
+    "    4  Keyword, label(s) :  REBELOTE                                                         IPASS= 1",
+    "                   Pass #/Requested :          1/      1000.  Particles remaining/launched :    100/    100",
+    "                   Pass #/Requested :          2/      1000.  Particles remaining/launched :    100/    100",
+    "                   End of pass #        3 through the optical structure",
+    "  STATUS OF VARIABLES  (Iteration #     0 /    200 max.)",
+    "  STATUS OF VARIABLES  (Iteration #    12 /    200 max.)",
+    "  Fit reached penalty value   1.2345E-12",
+    "  CPU time, total :   1.234567E-02",
+    "  Job  ended  on    19-10-2026,  at  10:02:14",
+    "  Zgoubi run completed.",
+]
+"""Lines of the standard output of Zgoubi runs (Rebelote loop and Fit)."""
+
+
+def _wait_for(condition, timeout: float = 5.0):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "Timeout."
+        time.sleep(0.001)
+
+
+def test_governor_concurrency_cap():
+    g = ExecutionGovernor(max_concurrency=2)
+    lock = threading.Lock()
+    running, peak = [0], [0]
+
+    def run():
+        with g.token():
+            with lock:
+                running[0] += 1
+                peak[0] = max(peak[0], running[0])
+            time.sleep(0.01)
+            with lock:
+                running[0] -= 1
+
+    threads = [threading.Thread(target=run) for _ in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert peak[0] == 2
+    assert g.running == 0 and g.waiting == 0
+
+
+def test_governor_priority_order():
+    g = ExecutionGovernor(max_concurrency=1)
+    order = []
+    g.acquire()
+
+    def run(priority, name):
+        with g.token(priority):
+            order.append(name)
+
+    threads = []
+    for priority, name in ((0, 'low'), (10, 'high'), (0, 'low2'), (5, 'medium')):
+        threads.append(threading.Thread(target=run, args=(priority, name)))
+        threads[-1].start()
+        _wait_for(lambda: g.waiting == len(threads))
+    g.release()
+    for t in threads:
+        t.join()
+    assert order == ['high', 'medium', 'low', 'low2']
+
+
+def test_governor_cancellation():
+    g = ExecutionGovernor(max_concurrency=1)
+    g.acquire()
+    assert not g.acquire(priority=10, timeout=0.01)
+    assert g.waiting == 0
+
+    class _Interrupted(BaseException):
+        pass
+
+    wait = g._condition.wait
+
+    def interrupted_wait(timeout=None):
+        g._condition.wait = wait
+        raise _Interrupted
+    g._condition.wait = interrupted_wait
+    with pytest.raises(_Interrupted):
+        g.acquire(priority=10)
+    assert g.waiting == 0
+
+    acquired = []
+    t = threading.Thread(target=lambda: acquired.append(g.acquire()), daemon=True)
+    t.start()
+    _wait_for(lambda: g.waiting == 1)
+    g.release()
+    t.join(timeout=5)
+    assert acquired == [True]
+    assert g.running == 1
+
+
+def test_progress_patterns():
+    matches = {line.strip(): {k: p.search(line).groups() for k, p in PROGRESS_PATTERNS.items() if p.search(line)}
+               for line in ZGOUBI_STDOUT}
+    assert {k: v for k, v in matches.items() if v} == {
+        "Pass #/Requested :          1/      1000.  Particles remaining/launched :    100/    100":
+            {'pass': ('1', '1000')},
+        "Pass #/Requested :          2/      1000.  Particles remaining/launched :    100/    100":
+            {'pass': ('2', '1000')},
+        "End of pass #        3 through the optical structure": {'pass': ('3', None)},
+        "STATUS OF VARIABLES  (Iteration #     0 /    200 max.)": {'iteration': ('0', '200')},
+        "STATUS OF VARIABLES  (Iteration #    12 /    200 max.)": {'iteration': ('12', '200')},
+    }
+
+
+def test_run_progress():
+    progress = RunProgress(mapping={}, path='.')
+    updates = []
+    for line in ZGOUBI_STDOUT:
+        if progress.update(line.strip()):
+            updates.append((progress.ipass, progress.npass, progress.iteration, progress.max_iterations))
+    assert updates == [
+        (1, 1000, None, None),
+        (2, 1000, None, None),
+        (3, 1000, None, None),  # The requested number of passes is kept
+        (3, 1000, 0, 200),
+        (3, 1000, 12, 200),
+    ]
+    assert progress.lines == len(ZGOUBI_STDOUT)
+    assert progress.last_line == "Zgoubi run completed."
+    assert progress.idle < progress.elapsed
+
+
+class _Script(Executable):
+    """Runs a Python script (`run.py`) printing Zgoubi-like outputs."""
+    INPUT_FILENAME = 'run.py'
+    COMMAND_ARGUMENT = True
+
+    def __init__(self, **kwargs):
+        super().__init__(executable=os.path.basename(sys.executable),
+                         results_type=None,
+                         path=os.path.dirname(sys.executable),
+                         n_procs=1,
+                         execution_governor=ExecutionGovernor(max_concurrency=1),
+                         **kwargs)
+
+
+def _script(path, lines, sleep: float = 0.0):
+    with open(os.path.join(path, 'run.py'), 'w') as f:
+        f.write(f"import time\nfor line in {lines!r}:\n    print(line, flush=True)\ntime.sleep({sleep})\n")
+
+
+def test_executable_progress(tmp_path):
+    _script(str(tmp_path), ZGOUBI_STDOUT)
+    reports = []
+    executable = _Script(progress_callback=lambda p: reports.append((p.ipass, p.iteration, p.finished)))
+    result = executable._pool.submit(executable._execute, {'Q1.B0': 1.0}, None, str(tmp_path)).result(timeout=30)
+    assert reports == [
+        (None, None, False),
+        (1, None, False),
+        (2, None, False),
+        (3, None, False),
+        (3, 0, False),
+        (3, 12, False),
+        (3, 12, True),
+    ]
+    assert result['cputime'] == pytest.approx(1.234567E-02)
+    assert result['mapping'] == {'Q1.B0': 1.0}
+    assert executable.progress == []
+
+
+def test_executable_stalled_terminate(tmp_path):
+    _script(str(tmp_path), ZGOUBI_STDOUT[:8], sleep=60)
+    executable = _Script()
+    future = executable._pool.submit(executable._execute, {}, None, str(tmp_path))
+    _wait_for(lambda: len(executable.progress) == 1 and executable.progress[0].ipass == 2)
+    progress = executable.progress[0]
+    assert executable.stalled(timeout=30) == []
+    _wait_for(lambda: executable.stalled(timeout=0.05) == [progress])
+    executable.terminate(progress)
+    result = future.result(timeout=30)
+    assert progress.finished
+    assert progress.process.returncode != 0
+    assert result['stdout'][:-1] == ZGOUBI_STDOUT[:8]
+    assert executable.progress == []
+    executable.terminate(progress)  # No effect on a finished run
+
+
+def test_executable_stalled_buffered():
+    with pytest.raises(ExecutableException):
+        _Script(unbuffered=False).stalled(timeout=1.0)
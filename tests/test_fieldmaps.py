@@ -0,0 +1,198 @@
+import os
+import numpy as _np
+import pandas as _pd
+import pytest
+from scipy import interpolate
+from zgoubidoo.assets import write_json
+from zgoubidoo.commands import Tosca
+from zgoubidoo.fieldmaps.fieldmap import FIELDMAP_COLUMNS, FieldMap, load_cached_fieldmap
+
+
+def test_load_cached_fieldmap(tmp_path):
+    source = tmp_path / 'map.table'
+    source.write_text('field map')
+    calls = []
+
+    def _load():
+        calls.append(1)
+        return _pd.DataFrame(_np.full((4, len(FIELDMAP_COLUMNS)), float(len(calls))), columns=FIELDMAP_COLUMNS)
+
+    cache = str(tmp_path / 'cache')
+    first = load_cached_fieldmap(['map.table'], _load, path=str(tmp_path), cache_path=cache)
+    second = load_cached_fieldmap(['map.table'], _load, path=str(tmp_path), cache_path=cache)
+    assert len(calls) == 1
+    _pd.testing.assert_frame_equal(first, second)
+    os.utime(str(source), (0, 0))
+    third = load_cached_fieldmap(['map.table'], _load, path=str(tmp_path), cache_path=cache)
+    assert len(calls) == 2
+    assert third['BX'].iloc[0] == 2.0
+
+
+def test_tosca_binary_files(tmp_path):
+    text, binary = tmp_path / 'map.table', tmp_path / 'b_map.table'
+    text.write_text('field map')
+    binary.write_bytes(b'field map')
+    tosca = Tosca('T1', FNAME=str(text))
+    os.utime(str(text), (1, 1))
+    os.utime(str(binary), (2, 2))
+    assert tosca.files == [str(binary)]
+    os.utime(str(binary), (0, 0))
+    assert tosca.files == [str(text)]
+    tosca.BINARY = False
+    os.utime(str(binary), (2, 2))
+    assert tosca.files == [str(text)]
+
+
+def test_tosca_load(tmp_path):
+    text = tmp_path / 'map.table'
+    text.write_text('\n' * 8 + '\n'.join(f"0.0 0.0 {x:.1f} 0.0 1.0 0.0" for x in (-5.0, 0.0, 5.0)) + '\n')
+    assert Tosca('T0', FNAME=str(text), IX=3, MOD=15).read_metadata() is None
+    tosca = Tosca('T1', FNAME=str(text), IX=3, MOD=12).load(cache=True, cache_path=str(tmp_path / 'cache'))
+    assert tosca.length.m_as('cm') == 10.0
+    assert not os.path.exists(str(tmp_path / 'cache'))
+
+    tosca = Tosca('T2', FNAME=str(text), IX=3, MOD=22)
+    write_json(os.path.join(str(tmp_path / 'cache'), f"{tosca.metadata_key}.json"), {'LENGTH': 12.5})
+    assert tosca.load(cache=True, cache_path=str(tmp_path / 'cache')).length.m_as('cm') == 12.5
+
+
+def test_tosca_multiple_files():
+    tosca = Tosca('T1', FNAME='map1.table\nmap2.table', MOD=15, MOD2=2)
+    assert tosca.files == ['map1.table', 'map2.table']
+    lines = [line.strip() for line in str(tosca).splitlines()]
+    assert lines.index('map2.table') == lines.index('map1.table') + 1
+
+
+def _field_map(x=(-2.0, -1.0, 0.0, 1.0, 2.0), y=(-1.5, -0.5, 0.5, 1.5), z=(-1.0, 0.0, 1.0)) -> FieldMap:
+    """Field map of a non-linear field on a regular mesh."""
+    xx, yy, zz = (_.ravel() for _ in _np.meshgrid(x, y, z, indexing='ij'))
+    return FieldMap(_pd.DataFrame({
+        'X': xx, 'Y': yy, 'Z': zz,
+        'BX': xx * yy * zz, 'BY': _np.sin(xx) + zz ** 2, 'BZ': 1.0 + xx ** 2 * yy,
+        'MATCODE': 0.0,
+    }, columns=FIELDMAP_COLUMNS))
+
+
+@pytest.mark.parametrize('method', ['nearest', 'linear'])
+def test_fieldmap_grid_sampling(method):
+    fm = _field_map()
+    assert fm.grid is not None
+    nodes = fm.data[:, :3]
+    for i, c in enumerate(('BX', 'BY', 'BZ')):
+        expected = interpolate.griddata(nodes, fm.data[:, 3 + i], nodes, method=method)
+        assert fm.sample(nodes, field_component=c, method=method) == pytest.approx(expected, abs=1e-12)
+    assert fm.sample(nodes, method=method) == pytest.approx(_np.linalg.norm(fm.data[:, 3:6], axis=1), abs=1e-12)
+
+
+def test_fieldmap_grid_linear_between_nodes():
+    fm = _field_map()
+    points = _np.array([[0.5, 0.0, 0.5], [-1.25, 1.0, -0.25]])
+    bx = fm.sample(points, field_component='BX', method='linear')
+    assert bx[0] == pytest.approx(0.0)  # Trilinear interpolation of X * Y * Z (exact)
+    assert bx[1] == pytest.approx(-1.25 * 1.0 * -0.25)
+
+
+def test_fieldmap_irregular_mesh(monkeypatch):
+    fm = FieldMap(_field_map().df.iloc[1:].reset_index(drop=True))
+    assert fm.grid is None
+    calls = []
+    unique = _np.unique
+    monkeypatch.setattr(_np, 'unique', lambda *args, **kwargs: calls.append(1) or unique(*args, **kwargs))
+    points = _np.array([[0.5, 0.0, 0.5], [1.0, 0.5, 0.0]])
+    for c in ('BX', 'BY', 'BZ'):
+        expected = interpolate.griddata(fm.data[:, :3], fm.df[c].values, points, method='linear')
+        assert fm.sample(points, field_component=c, method='linear') == pytest.approx(expected)
+    assert fm.grid is None
+    assert calls == []
+
+
+def _symmetric_field_map() -> FieldMap:
+    """Field map antisymmetric along X ('antimirror') and symmetric along Y ('mirror')."""
+    x, y, z = (_np.linspace(-2.0, 2.0, 5), _np.array([-0.3, -0.1, 0.1, 0.3]), _np.array([-1.0, 0.0, 1.0]))
+    xx, yy, zz = (_.ravel() for _ in _np.meshgrid(x, y, z, indexing='ij'))
+    return FieldMap(_pd.DataFrame({
+        'X': xx, 'Y': yy, 'Z': zz,
+        'BX': xx * yy, 'BY': xx ** 2 + yy ** 2 + zz, 'BZ': xx ** 2 * yy * (1.0 + zz),
+        'MATCODE': 0.0,
+    }, columns=FIELDMAP_COLUMNS))
+
+
+def test_fieldmap_compact():
+    fm = _symmetric_field_map()
+    compact = fm.compact({'X': 'antimirror', 'Y': 'mirror'}, tolerance=1e-12)
+    assert compact.symmetries == {'X': 'antimirror', 'Y': 'mirror'}
+    assert len(compact.df) == 3 * 2 * 3
+    assert (compact.df[['X', 'Y']] >= 0).all().all()
+    assert compact.df['X'].dtype == _np.float64 and compact.df['BX'].dtype == _np.float32
+    with pytest.raises(ValueError):
+        fm.compact({'X': 'mirror'}, tolerance=1e-12)
+    with pytest.raises(ValueError):
+        fm.compact({'Y': 'antimirror'}, tolerance=1e-12)
+
+    nodes = fm.data[:, :3]
+    for i, c in enumerate(('BX', 'BY', 'BZ')):
+        assert compact.sample(nodes, field_component=c) == pytest.approx(fm.data[:, 3 + i], rel=1e-6)
+    points = _np.array([[-1.5, -0.2, 0.5], [1.5, -0.2, 0.5], [-1.5, 0.2, 0.5]])
+    bx = compact.sample(points, field_component='BX', method='linear')
+    by = compact.sample(points, field_component='BY', method='linear')
+    assert bx == pytest.approx([0.3, -0.3, -0.3])  # Odd along X and along Y
+    assert by[0] == pytest.approx(by[1]) == pytest.approx(by[2])  # Even along X and along Y
+
+
+def test_fieldmap_expand():
+    fm = _symmetric_field_map()
+    original = fm.df.sort_values(['X', 'Y', 'Z']).reset_index(drop=True)
+    expanded = fm.compact({'X': 'antimirror', 'Y': 'mirror'}).expand().df
+    _pd.testing.assert_frame_equal(expanded[['X', 'Y', 'Z']], original[['X', 'Y', 'Z']], check_exact=True)
+    assert expanded[['BX', 'BY', 'BZ']].values == pytest.approx(original[['BX', 'BY', 'BZ']].values, rel=1e-6)
+    exact = fm.compact({'X': 'antimirror', 'Y': 'mirror'}, dtype=None).expand().df
+    _pd.testing.assert_frame_equal(exact, original)
+
+
+def test_fieldmap_export_bdsim(tmp_path):
+    fm = _field_map()
+    single = fm.export('single.dat', path=str(tmp_path), resolution=(7, 6, 5), method='linear', n_procs=1,
+                       slab_points=40)
+    fm.export('multiple.dat', path=str(tmp_path), resolution=(7, 6, 5), method='linear', n_procs=3, slab_points=40)
+    assert single == {'NX': 7, 'NY': 6, 'NZ': 5, 'FNAME': 'single.dat'}
+    assert (tmp_path / 'single.dat').read_bytes() == (tmp_path / 'multiple.dat').read_bytes()
+    lines = (tmp_path / 'single.dat').read_text().splitlines()
+    assert lines[:3] == ['xmin> -2.0', 'xmax> 2.0', 'nx> 7']
+    data = _np.loadtxt(lines[10:])
+    assert data.shape == (7 * 6 * 5, 6)
+    assert _np.all(_np.diff(data[:7, 0]) > 0)  # X varies fastest
+    for i, c in enumerate(('BX', 'BY', 'BZ')):
+        assert data[:, 3 + i] == pytest.approx(-fm.sample(data[:, :3], field_component=c, method='linear'), abs=1e-9)
+
+
+@pytest.mark.parametrize('binary', [False, True])
+def test_fieldmap_export_zgoubi(tmp_path, binary):
+    fm = _field_map()
+    expected = fm.to_zgoubi('map.table', path=str(tmp_path), binary=binary)
+    parameters = [
+        fm.export(f"{n}.table", fmt='zgoubi', path=str(tmp_path), resolution=(5, 4, 3), binary=binary, n_procs=n,
+                  slab_points=20)
+        for n in (1, 3)
+    ]
+    for p in parameters:
+        assert {**p, 'FNAME': None} == {**expected, 'FNAME': None}
+        assert (tmp_path / p['FNAME']).read_bytes() == (tmp_path / expected['FNAME']).read_bytes()
+
+
+def test_fieldmap_to_zgoubi_binary(tmp_path):
+    fm = _field_map()
+    parameters = fm.to_zgoubi('map.table', path=str(tmp_path), binary=True)
+    assert parameters == {'IX': 3, 'IY': 5, 'IZ': 4, 'MOD': 12, 'MOD2': 0, 'FNAME': 'b_map.table'}
+    records = _np.fromfile(str(tmp_path / 'b_map.table'),
+                           dtype=[('head', '<i4'), ('values', '<f8', 6), ('tail', '<i4')])
+    assert len(records) == 5 * 4 * 3
+    assert (records['head'] == 48).all() and (records['tail'] == 48).all()
+    values = records['values']
+    assert values[:3, 2] == pytest.approx([-1.0, 0.0, 1.0])  # Z (longitudinal axis of Zgoubi) varies fastest
+    assert values[:15:3, 0] == pytest.approx([-2.0, -1.0, 0.0, 1.0, 2.0])  # then X, then Y
+    assert values[::15, 1] == pytest.approx([-1.5, -0.5, 0.5, 1.5])
+    df = fm.df.set_index(['X', 'Y', 'Z'])
+    assert values[:, 3:] == pytest.approx(df.loc[list(map(tuple, values[:, :3])), ['BX', 'BY', 'BZ']].values)
+
+    tosca = Tosca('T1', **{**parameters, 'FNAME': str(tmp_path / parameters['FNAME'])})
+    assert tosca.read_metadata() == {'LENGTH': 2.0, 'X_MIN': -1.0, 'X_MAX': 1.0}
@@ -0,0 +1,49 @@
+import pickle
+import numpy as _np
+import pytest
+from zgoubidoo import ureg as _ureg
+from zgoubidoo import Input, ZgoubiInputException
+from zgoubidoo.commands import *
+from zgoubidoo.input import _dump
+
+
+def test_input_binary_roundtrip(tmp_path):
+    zi = Input(name='TEST', line=[
+        Objet2('BUNCH', BORO=2149 * _ureg.kilogauss * _ureg.cm),
+        Proton(),
+        Drift('D1', XL=10 * _ureg.cm),
+        Quadrupole('Q1', XL=30 * _ureg.cm, R0=5 * _ureg.cm, B0=2 * _ureg.kilogauss),
+        Marker('M1'),
+        End(),
+    ])
+    zi.save_binary(str(tmp_path / 'test.zgb'))
+    loaded = Input.load_binary(str(tmp_path / 'test.zgb'))
+    assert loaded.name == 'TEST'
+    assert [e.LABEL1 for e in loaded.line] == [e.LABEL1 for e in zi.line]
+    assert loaded['D1'].XL == 10 * _ureg.cm
+    assert loaded['Q1'].B0 == 2 * _ureg.kilogauss
+    assert loaded['Q1'].B0.units == _ureg.kilogauss
+    assert str(loaded) == str(zi)
+
+
+def test_input_binary_quantities(tmp_path):
+    data = {
+        'length': 1.5 * _ureg.m,
+        'field': _np.array([0.5, 1.0]) * _ureg.tesla,
+        'unit': _ureg.mrad,
+    }
+    with open(tmp_path / 'data.zgb', 'wb') as f:
+        _dump(data, f)
+    with open(tmp_path / 'data.zgb', 'rb') as f:
+        _, loaded = pickle.load(f)
+    assert loaded['length'] == 1.5 * _ureg.m
+    assert isinstance(loaded['length'], _ureg.Quantity)
+    assert _np.array_equal(loaded['field'].magnitude, [0.5, 1.0])
+    assert loaded['field'].units == _ureg.tesla
+    assert loaded['unit'] == _ureg.mrad
+
+
+def test_input_binary_invalid(tmp_path):
+    (tmp_path / 'invalid.zgb').write_bytes(b'not a snapshot')
+    with pytest.raises(ZgoubiInputException):
+        Input.load_binary(str(tmp_path / 'invalid.zgb'))
@@ -0,0 +1,55 @@
+import os
+import numpy as _np
+import pandas as _pd
+import pytest
+from zgoubidoo import outputs as _outputs
+from zgoubidoo.outputs import read_plt_file, read_plt_files, _ZGOUBI_PLT_HEADERS
+
+
+def _plt_file(path, n: int, seed: int = 0):
+    """Write n tracks in a Zgoubi .plt file."""
+    rng = _np.random.default_rng(seed)
+    strings = {'KLEY': "'MARKER  '", 'LABEL2': "'        '", 'LET': "'A'"}
+    os.makedirs(str(path), exist_ok=True)
+    with open(os.path.join(str(path), 'zgoubi.plt'), 'w') as f:
+        f.write('\n' * 4)
+        for i in range(n):
+            values = {'# KEX': 1, 'Y-DY': rng.normal(), 'T': rng.normal(), 'IT': i + 1, 'IPASS': 1,
+                      'LABEL1': f"'{['START', 'END'][i % 2]:<10}'"}
+            f.write(' '.join(strings.get(h, str(values.get(h, 0))) for h in _ZGOUBI_PLT_HEADERS) + '\n')
+    return str(path)
+
+
+def test_read_plt_files(tmp_path, monkeypatch):
+    paths = [_plt_file(tmp_path / f"run{i}", n=10 * (i + 1), seed=i) for i in range(4)] + [str(tmp_path / 'missing')]
+    events = []
+    read, release = _outputs._read_shared_memory, _outputs._release_shared_memory
+
+    def _read(*block):
+        events.append(('read', block[0]))
+        return read(*block)
+
+    def _release(name):
+        events.append(('release', name))
+        release(name)
+    monkeypatch.setattr(_outputs, '_read_shared_memory', _read)
+    monkeypatch.setattr(_outputs, '_release_shared_memory', _release)
+    results = read_plt_files(paths, n_procs=2)
+    assert results[-1] is None
+    for path, df in zip(paths[:-1], results[:-1]):
+        _pd.testing.assert_frame_equal(df, read_plt_file(path=path), check_dtype=False, check_categorical=False)
+    # Each block is released as soon as it has been read
+    assert [e[0] for e in events] == ['read', 'release'] * 4
+    assert all(events[i][1] == events[i + 1][1] for i in range(0, 8, 2))
+    if os.path.isdir('/dev/shm'):
+        assert not any(os.path.exists(os.path.join('/dev/shm', e[1].lstrip('/'))) for e in events)
+
+
+def test_read_plt_files_failure(tmp_path):
+    paths = [_plt_file(tmp_path / f"run{i}", n=10, seed=i) for i in range(3)]
+    os.makedirs(str(tmp_path / 'invalid' / 'zgoubi.plt'))
+    blocks = set(os.listdir('/dev/shm')) if os.path.isdir('/dev/shm') else set()
+    with pytest.raises(OSError):
+        read_plt_files(paths + [str(tmp_path / 'invalid')], n_procs=2)
+    if os.path.isdir('/dev/shm'):
+        assert set(os.listdir('/dev/shm')) <= blocks  # The blocks of the other files are released
@@ -0,0 +1,89 @@
+import numpy as _np
+import pytest
+from zgoubidoo import ureg as _ureg
+from zgoubidoo import Input
+from zgoubidoo.commands import *
+from zgoubidoo.parser import parse
+
+
+def _roundtrip(*commands):
+    zi = Input(name='TEST', line=list(commands))
+    title, parsed = parse(str(zi).splitlines(), strict=True)
+    assert title == 'TEST'
+    assert [c.KEYWORD for c in parsed] == [c.KEYWORD for c in commands]
+    assert [c.LABEL1 for c in parsed] == [c.LABEL1 for c in commands]
+    return parsed
+
+
+def test_parse_objet2():
+    o = Objet2('BUNCH', BORO=2149 * _ureg.kilogauss * _ureg.cm)
+    o.add(_np.array([[1.0, 2.0, 3.0, 4.0, 0.0, 1.0, 1], [-1.0, -2.0, -3.0, -4.0, 0.0, 1.01, 1]]))
+    parsed = _roundtrip(o, End())[0]
+    assert isinstance(parsed, Objet2)
+    assert parsed.BORO.m_as('kilogauss * cm') == pytest.approx(2149)
+    assert parsed.IMAX == 2
+    assert parsed.PARTICULES == pytest.approx(o.PARTICULES)
+
+
+def test_parse_objet5():
+    o = Objet5('BUNCH', BORO=2149 * _ureg.kilogauss * _ureg.cm, BETA_Y=5 * _ureg.m, ALPHA_Z=-1.5, D_Y=1.2 * _ureg.m)
+    parsed = _roundtrip(o, End())[0]
+    assert isinstance(parsed, Objet5)
+    assert parsed.BETA_Y.m_as('m') == pytest.approx(5)
+    assert parsed.ALPHA_Z == pytest.approx(-1.5)
+    assert parsed.D_Y.m_as('m') == pytest.approx(1.2)
+
+
+def test_parse_magnets():
+    q = Quadrupole('Q1', XL=30 * _ureg.cm, R0=5 * _ureg.cm, B0=0.5 * _ureg.tesla, XPAS=1 * _ureg.cm)
+    b = Bend('B1', XL=100 * _ureg.cm, B1=1.5 * _ureg.tesla, SK=0.1 * _ureg.radian, LENGTH_IS_ARC_LENGTH=False)
+    parsed = _roundtrip(q, b, End())
+    assert isinstance(parsed[0], Quadrupole)
+    assert parsed[0].XL.m_as('cm') == pytest.approx(30)
+    assert parsed[0].B0.m_as('tesla') == pytest.approx(0.5)
+    assert isinstance(parsed[1], Bend)
+    assert parsed[1].XL.m_as('cm') == pytest.approx(100)
+    assert parsed[1].B1.m_as('tesla') == pytest.approx(1.5)
+    assert parsed[1].SK.m_as('radian') == pytest.approx(0.1)
+    assert str(parsed[1]) == str(b)
+
+
+def test_parse_drifts():
+    parsed = _roundtrip(Drift('D1', XL=10 * _ureg.cm, SPLIT=False), ESL('D2', XL=20 * _ureg.cm), End())
+    assert type(parsed[0]) is Drift
+    assert type(parsed[1]) is ESL
+    assert parsed[1].XL.m_as('cm') == pytest.approx(20)
+    assert parsed[1].SPLITS == 10
+
+
+def test_parse_deck():
+    deck = """Test deck
+ 'OBJET'
+ 2149.0
+ 5.01
+ 1.0e-3 1.0e-3 1.0e-3 1.0e-3 0.0 1.0e-3
+ 0.0 0.0 0.0 0.0 0.0 1.0
+ 0.0 10.0 0.0 10.0 0.0 1.0 0.0 0.0 0.0 0.0
+ 'PARTICUL'
+ PROTON
+ 'ESL' L1                    ! Drift with the old keyword
+ 25.0
+ 'BEND' B1
+ 2
+ 100.0 0.0 15.0
+ 0.0 0.0 0.0
+ 6 0.2401 1.8639 -0.5572 0.3904 0.0 0.0
+ 0.0 0.0 0.0
+ 6 0.2401 1.8639 -0.5572 0.3904 0.0 0.0
+ 1.0
+ 3 0.0 0.0 0.0
+ 'FAISCEAU'
+ 'END'
+"""
+    zi = Input.parse(deck, debug=True)
+    assert zi.name == 'Test deck'
+    assert zi.keywords == ['OBJET', 'PARTICUL', 'ESL', 'BEND', 'FAISCEAU', 'END']
+    assert zi.B1.B1.m_as('kilogauss') == pytest.approx(15)
+    assert zi.B1.XL.m_as('cm') == pytest.approx(100)
+    assert zi.B1.C1_E == pytest.approx(1.8639)
+    assert "'ESL' L1" in str(zi)
@@ -0,0 +1,45 @@
+import os
+import numpy as _np
+import zgoubidoo.fieldmaps.profiles as _profiles
+from zgoubidoo.fieldmaps.fieldmap import enge
+from zgoubidoo.fieldmaps.profiles import EngeFit, FieldProfile, fit_field_profiles
+
+
+class _FieldMap:
+    hash = 'field_map'
+
+    def sample(self, trajectory, field_component, method):
+        return enge(trajectory[:, 0] + 20, lam_e=3.0, lam_s=3.0, offset_e=10.0, offset_s=30.0)
+
+
+def _profile():
+    trajectory = _np.zeros((41, 3))
+    trajectory[:, 0] = _np.linspace(-20, 20, 41)
+    return FieldProfile(field_map=_FieldMap(), trajectory=trajectory, label='P')
+
+
+def test_fit_field_profiles_cache(tmp_path, monkeypatch):
+    fits = fit_field_profiles([_profile()], n_procs=1, cache_path=str(tmp_path))
+    assert fits[0].success
+    assert os.listdir(str(tmp_path)) == [f"{fits[0].key}.json"]
+
+    def _fail(s, data, values=None):
+        raise AssertionError("A converged fit found in the cache is fitted again.")
+    monkeypatch.setattr(_profiles, '_fit', _fail)
+    assert fit_field_profiles([_profile()], n_procs=1, cache_path=str(tmp_path))[0].values == fits[0].values
+
+
+def test_fit_field_profiles_failures_not_cached(tmp_path, monkeypatch):
+    calls = []
+
+    def _fit(s, data, values=None):
+        calls.append(values)
+        return {'values': dict(values or {'ce_0': 0.0}), 'success': False, 'chisqr': 1.0, 'nfev': 1}
+    monkeypatch.setattr(_profiles, '_fit', _fit)
+    fit_field_profiles([_profile()], n_procs=1, cache_path=str(tmp_path))
+    assert os.listdir(str(tmp_path)) == []
+    fits = fit_field_profiles([_profile()], n_procs=1, cache_path=str(tmp_path),
+                              previous=[EngeFit(label='P', key='', values={'ce_0': 0.1}, success=True,
+                                                        chisqr=0.0, nfev=0, s=None, data=None)])
+    assert not fits[0].success
+    assert calls == [None, {'ce_0': 0.1}]
@@ -0,0 +1,20 @@
+import os
+from zgoubidoo.retention import OutputRetention
+
+
+def test_spilled_outputs(tmp_path):
+    policy = OutputRetention(spill_path=str(tmp_path))
+    first = policy.retain(['line 1', 'line 2', 'line 3'])
+    second = policy.retain(['other'])
+    assert len(first) == 3
+    assert [first[i] for i in range(len(first))] == ['line 1', 'line 2', 'line 3']
+    assert list(second) == ['other']
+    policy.clear()
+    assert os.listdir(str(tmp_path)) == []
+
+
+def test_discarded_outputs():
+    assert OutputRetention(keep_raw=False).retain(['line']) is None
+    entries = list(range(10))
+    OutputRetention(max_runs=3).trim(entries)
+    assert entries == [7, 8, 9]
@@ -0,0 +1,88 @@
+import numpy as _np
+import pandas as _pd
+import pytest
+from zgoubidoo import ureg as _ureg
+from zgoubidoo import Input, SegmentedInput, SegmentationException
+from zgoubidoo.commands import *
+from zgoubidoo.segments import particles_from_fai, restart_head
+from zgoubidoo.zgoubi import ZgoubiResults
+
+
+def test_particles_from_fai():
+    fai = _pd.DataFrame({
+        '# KEX': [1, -1],
+        'Y-DY': [1.0, 2.0],
+        'T': [0.1, 0.2],
+        'Z': [3.0, 4.0],
+        'P': [0.3, 0.4],
+        'D-1': [0.0, 0.01],
+    })
+    particles = particles_from_fai(fai)
+    assert particles.shape == (2, 7)
+    assert particles[:, 0] == pytest.approx([1.0, 2.0])
+    assert particles[:, 4] == pytest.approx([0.0, 0.0])
+    assert particles[:, 5] == pytest.approx([1.0, 1.01])
+    assert particles[:, 6] == pytest.approx([1.0, -1.0])
+
+
+def test_restart_head():
+    objet = Objet2('BUNCH', BORO=2149 * _ureg.kilogauss * _ureg.cm)
+    zi = Input(name='TEST', line=[objet, Proton(), Drift('D1', XL=10 * _ureg.cm), Marker('M1'), End()])
+    particles = _np.array([[1.0, 0.1, 2.0, 0.2, 0.0, 1.0, 1.0]])
+    head = restart_head(zi, particles, label='RESTART')
+    assert isinstance(head[0], Objet2)
+    assert head[0].LABEL1 == 'RESTART'
+    assert head[0].BORO.m_as('kilogauss * cm') == pytest.approx(2149)
+    assert head[0].PARTICULES == pytest.approx(particles)
+
+
+def test_segmented_input_rejects_rebelote():
+    zi = Input(name='TEST', line=[Objet2('BUNCH'), Marker('M1'), Rebelote(NPASS=10), End()])
+    with pytest.raises(SegmentationException):
+        SegmentedInput(zi, markers=['M1'])
+
+
+class _Zgoubi:
+    """Records the runs instead of executing Zgoubi (the inputs are generated, i.e. the mappings are applied)."""
+
+    def __init__(self):
+        self.runs = []
+
+    def __call__(self, zgoubi_input, mappings):
+        n = len(zgoubi_input.paths)
+        zgoubi_input(mappings=mappings)
+        self.runs += [(zgoubi_input, p) for p in zgoubi_input.paths[n:]]
+
+    def collect(self, paths):
+        return ZgoubiResults([{'input': zi, 'mapping': p[0], 'path': p[1]} for zi, p in self.runs
+                              if any(p[1] is q for q in paths)])
+
+
+def test_segmented_input_run():
+    zi = Input(name='TEST', line=[
+        Objet2('BUNCH', BORO=2149 * _ureg.kilogauss * _ureg.cm),
+        Proton(),
+        Quadrupole('Q1', XL=10 * _ureg.cm, R0=5 * _ureg.cm, B0=2 * _ureg.kilogauss),
+        Marker('M1'),
+        Drift('D1', XL=10 * _ureg.cm),
+        Quadrupole('Q9', XL=10 * _ureg.cm, R0=5 * _ureg.cm, B0=1 * _ureg.kilogauss),
+        End(),
+    ])
+    zgoubi = _Zgoubi()
+    segmented = SegmentedInput(zi, markers=['M1'], zgoubi=zgoubi)
+    segmented._baseline = {'Q1.B0': 2 * _ureg.kilogauss}
+    segmented._stored = {(): {'M1': _np.array([[1.0, 0.1, 2.0, 0.2, 0.0, 1.0, 1.0]])}}
+    mappings = [
+        {'Q1.B0': 2 * _ureg.kilogauss, 'Q9.B0': 3 * _ureg.kilogauss},
+        {'Q1.B0': 2 * _ureg.kilogauss, 'Q9.B0': 4 * _ureg.kilogauss},
+        {'Q1.B0': 3 * _ureg.kilogauss, 'Q9.B0': 3 * _ureg.kilogauss},
+    ]
+    assert segmented.restart_point(mappings[0]) == 'M1'
+    assert segmented.restart_point(mappings[2]) is None
+    results = segmented(mappings=mappings)
+    assert len(zgoubi.runs) == 3
+    segment_runs = [(r, p) for r, p in zgoubi.runs if r is not zi]
+    assert [p[0] for _, p in segment_runs] == [{'Q9.B0': 3 * _ureg.kilogauss}, {'Q9.B0': 4 * _ureg.kilogauss}]
+    assert 'Q1' not in [e.LABEL1 for e in segment_runs[0][0].line]
+    assert sorted(r['mapping']['Q9.B0'].m_as('kilogauss') for r in results._results) == [3, 3, 4]
+    assert all('Q1.B0' in r['mapping'] for r in results._results)
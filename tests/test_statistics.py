@@ -0,0 +1,61 @@
+import numpy as _np
+import pandas as _pd
+import pytest
+from zgoubidoo.outputs import read_plt_file
+from zgoubidoo.statistics import BeamStatistics
+
+
+def _tracks(n: int = 1000, seed: int = 0) -> _pd.DataFrame:
+    rng = _np.random.default_rng(seed)
+    return _pd.DataFrame({
+        'LABEL1': _np.repeat(['START', 'END'], n),
+        'IPASS': 1,
+        'KEX': _np.where(rng.random(2 * n) < 0.9, 1, -1),
+        'Y': rng.normal(1e-3, 2e-3, 2 * n),
+        'T': rng.normal(0.0, 1e-3, 2 * n),
+        'Z': rng.normal(0.0, 3e-3, 2 * n),
+        'P': rng.normal(0.0, 1e-3, 2 * n),
+        'D-1': rng.normal(0.0, 1e-3, 2 * n),
+    })
+
+
+def test_statistics_single_key():
+    tracks = _tracks()
+    df = BeamStatistics(by=['LABEL1']).update(tracks).to_df()
+    alive = tracks.query('KEX > 0 and LABEL1 == "END"')
+    assert list(df.index.names) == ['LABEL1']
+    assert df.loc['END', 'N'] == 1000
+    assert df.loc['END', 'N_ALIVE'] == len(alive)
+    assert df.loc['END', 'MEAN_Y'] == pytest.approx(alive['Y'].mean())
+    assert df.loc['END', 'SIGMA_Y_D'] == pytest.approx(_np.cov(alive['Y'], alive['D-1'], bias=True)[0, 1])
+    assert df.loc['END', 'MAX_Z'] == pytest.approx(alive['Z'].max())
+
+
+def test_statistics_merge():
+    a, b = _tracks(seed=1), _tracks(seed=2)
+    merged = (BeamStatistics().update(a) + BeamStatistics().update(b)).to_df()
+    total = BeamStatistics().update(_pd.concat([a, b])).to_df()
+    assert list(merged.index.names) == ['LABEL1', 'IPASS']
+    _pd.testing.assert_frame_equal(merged, total.loc[merged.index])
+
+
+def _plt_file(path, tracks: _pd.DataFrame):
+    """Write tracks in a Zgoubi .plt file (Zgoubi units, padded labels)."""
+    from zgoubidoo.outputs import _ZGOUBI_PLT_HEADERS
+    strings = {'KLEY': "'MARKER  '", 'LABEL2': "'        '", 'LET': "'A'"}
+    with open(str(path / 'zgoubi.plt'), 'w') as f:
+        f.write('\n' * 4)
+        for _, t in tracks.iterrows():
+            values = {'# KEX': t['KEX'], 'Y-DY': t['Y'] * 1e2, 'T': t['T'] * 1e3, 'Z': t['Z'] * 1e2,
+                      'P': t['P'] * 1e3, 'D-1': t['D-1'], 'IPASS': t['IPASS'], 'LABEL1': f"'{t['LABEL1']:<10}'"}
+            f.write(' '.join(strings.get(h, str(values.get(h, 0))) for h in _ZGOUBI_PLT_HEADERS) + '\n')
+
+
+def test_statistics_from_file(tmp_path):
+    tracks = _tracks(n=50)
+    _plt_file(tmp_path, tracks)
+    from_file = BeamStatistics().update_from_file(path=str(tmp_path), chunksize=30).to_df()
+    in_memory = BeamStatistics().update(read_plt_file(path=str(tmp_path))).to_df()
+    assert sorted(from_file.index.get_level_values('LABEL1').unique()) == ['END', 'START']
+    _pd.testing.assert_frame_equal(from_file, in_memory, check_index_type=False)
+    assert from_file.loc[('END', 1), 'MEAN_Y'] == pytest.approx(tracks.query('KEX > 0 and LABEL1 == "END"')['Y'].mean())
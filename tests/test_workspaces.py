@@ -0,0 +1,81 @@
+import gc
+import os
+import weakref
+from zgoubidoo import workspaces as _workspaces
+from zgoubidoo.workspaces import WorkspaceManager
+
+
+def test_workspaces_are_pooled(tmp_path):
+    manager = WorkspaceManager(disk_path=str(tmp_path), pool_size=4)
+    w = manager.acquire()
+    assert not w.in_ram
+    path = w.name
+    with open(os.path.join(path, 'zgoubi.res'), 'w') as f:
+        f.write('results')
+    w.cleanup()
+    manager.wait()
+    w = manager.acquire()
+    assert w.name == path
+    assert os.listdir(w.name) == []
+    manager.shutdown()
+    assert not os.path.exists(path)
+
+
+def test_workspaces_spill_to_disk(tmp_path):
+    ram, disk = tmp_path / 'ram', tmp_path / 'disk'
+    ram.mkdir()
+    disk.mkdir()
+    manager = WorkspaceManager(ram_path=str(ram), ram_cap=1000, ram_min_free=0, disk_path=str(disk))
+    small, large = manager.acquire(), manager.acquire()
+    assert small.in_ram and large.in_ram
+    with open(os.path.join(small.name, 'zgoubi.plt'), 'wb') as f:
+        f.write(b'0' * 400)
+    assert small.settle() == small.name
+    assert small.in_ram
+    assert manager.ram_usage == 400
+    with open(os.path.join(large.name, 'zgoubi.plt'), 'wb') as f:
+        f.write(b'0' * 800)
+    path = large.settle()
+    assert not large.in_ram
+    assert path == large.name and path.startswith(str(disk))
+    assert os.path.getsize(os.path.join(path, 'zgoubi.plt')) == 800
+    assert manager.ram_usage == 400
+    small.cleanup()
+    manager.wait()
+    assert manager.ram_usage == 0
+    manager.shutdown()
+
+
+def test_ram_is_opt_in():
+    manager = WorkspaceManager()
+    assert not manager.ram_enabled
+    manager.shutdown()
+
+
+def test_workspace_managers_exit_hook(tmp_path, monkeypatch):
+    monkeypatch.setattr(_workspaces, '_managers', weakref.WeakSet())  # Leave the default manager alone
+    manager = WorkspaceManager(disk_path=str(tmp_path))
+    assert manager in _workspaces._managers
+    manager.shutdown()
+    assert manager not in _workspaces._managers
+
+    manager = WorkspaceManager(disk_path=str(tmp_path))
+    w = manager.acquire()
+    path = w.name
+    _workspaces._shutdown_managers()
+    assert not os.path.exists(path)
+    assert manager not in _workspaces._managers
+
+
+def test_workspace_managers_garbage_collected(tmp_path):
+    manager = WorkspaceManager(disk_path=str(tmp_path))
+    w = manager.acquire()
+    path = w.name
+    w.cleanup()
+    manager.wait()
+    reference = weakref.ref(manager)
+    del manager, w
+    gc.collect()
+    assert reference() is None  # Not kept alive by an exit hook
+    assert not os.path.exists(path)
+    assert os.listdir(str(tmp_path)) == []
@@ -83,10 +83,20 @@ from . import fieldmaps
 from . import physics
 from . import vis
 from . import twiss
+from . import envelope
+from . import parser
+from . import workspaces
+from . import assets
+from . import statistics
+from . import retention
 from .input import Input, ZgoubiInputValidator, ZgoubiInputException
 from .outputs import read_fai_file, read_matrix_file, read_optics_file, read_plt_file, read_srloss_file, \
     read_srloss_steps_file
 from .mappings import ParametricMapping, ParametersMappingType
 from .zgoubi import Zgoubi, ZgoubiResults, ZgoubiException
+from .cube import ResultsCube
+from .segments import SegmentedInput, SegmentationException
+from .checkpoints import CheckpointedTracking, CheckpointException
+from .executable import ExecutionGovernor, governor, RunProgress
 from .surveys import survey, clear_survey, survey_reference_trajectory
 from .polarity import HorizontalPolarity, VerticalPolarity
@@ -0,0 +1,230 @@
+"""Shared read-only store for the files (assets) required by the Zgoubi runs, typically field maps.
+
+Field map commands (e.g. `Tosca`) refer to their data files by name (`FNAME`); Zgoubi opens them from its working
+directory. Each run happening in its own directory, the files must be made available in every run directory. The
+`AssetStore` does so without duplicating the data: the files are registered once (identified by a hash of their
+content, so that identical files are stored once whatever their name or location) and are then hard-linked (or
+symbolically linked, if the run directory is on another filesystem, e.g. in RAM) in each run directory.
+
+The content hash of a file is computed once and cached as long as the file is unchanged (same inode, size and
+modification time).
+
+Examples:
+    >>> store = AssetStore()
+    >>> store.link('fieldmap.table', '/tmp/run_directory')  # doctest: +SKIP
+"""
+from __future__ import annotations
+from typing import Dict, Iterable, List, Optional, Tuple
+import hashlib
+import json
+import logging
+import os
+import shutil
+import tempfile
+import threading
+
+__all__ = ['AssetException', 'AssetStore', 'asset_store', 'file_hash', 'file_stamp', 'write_bytes', 'write_json']
+_logger = logging.getLogger(__name__)
+
+HASH_CHUNK_SIZE: int = 16 * 1024 ** 2
+"""Size of the chunks used to compute the hash of the files."""
+
+
+class AssetException(Exception):
+    """Exception raised for errors in the assets module."""
+
+    def __init__(self, m):
+        self.message = m
+
+
+def file_hash(filename: str) -> str:
+    """Hash (SHA-256) of the content of a file.
+
+    Args:
+        filename: the name of the file.
+
+    Returns:
+        the hexadecimal digest.
+    """
+    h = hashlib.sha256()
+    with open(filename, 'rb') as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b''):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def file_stamp(filename: str) -> str:
+    """Stamp identifying a version of a file without reading it: real path, size and modification time.
+
+    Args:
+        filename: the name of the file.
+
+    Returns:
+        the stamp.
+    """
+    stat = os.stat(filename)
+    return f"{os.path.realpath(filename)} {stat.st_size} {stat.st_mtime_ns}"
+
+
+def write_bytes(filename: str, data: bytes) -> None:
+    """Write data to a file atomically (to a temporary file, then renamed), creating its directory if needed.
+
+    Concurrent readers (e.g. other sessions sharing a cache directory) never see a partially written file.
+
+    Args:
+        filename: the name of the file.
+        data: the content of the file.
+    """
+    directory = os.path.dirname(os.path.abspath(filename))
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=directory, suffix=os.path.splitext(filename)[1])
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+        os.replace(tmp, filename)
+    except BaseException:
+        os.remove(tmp)
+        raise
+
+
+def write_json(filename: str, data) -> None:
+    """Write data to a JSON file atomically (see `write_bytes`).
+
+    Args:
+        filename: the name of the file.
+        data: the data (serializable to JSON).
+    """
+    write_bytes(filename, json.dumps(data).encode())
+
+
+class AssetStore:
+    """Store of the files required by the runs, linked (not copied) in the run directories.
+
+    Examples:
+        >>> store = AssetStore(path='/data/assets')
+        >>> store.register('fieldmap.table')  # doctest: +SKIP
+    """
+
+    def __init__(self, path: Optional[str] = None):
+        """
+        Args:
+            path: optional directory in which the registered files are stored (hard-linked if possible, copied
+                  otherwise), so that the runs remain independent of later modifications or deletions of the source
+                  files. By default, the source files are linked directly.
+        """
+        self._path: Optional[str] = path
+        if path is not None:
+            os.makedirs(path, exist_ok=True)
+        self._hashes: Dict[Tuple[int, int, int, int], str] = {}
+        self._assets: Dict[str, str] = {}
+        self._lock: threading.Lock = threading.Lock()
+
+    @property
+    def assets(self) -> Dict[str, str]:
+        """The registered assets (path of the stored file, indexed by content hash)."""
+        return dict(self._assets)
+
+    def register(self, filename: str) -> str:
+        """Register a file in the store.
+
+        Args:
+            filename: the name of the file.
+
+        Returns:
+            the path of the stored file (to be linked in the run directories).
+
+        Raises:
+            AssetException if the file does not exist.
+        """
+        try:
+            stat = os.stat(filename)
+        except OSError:
+            raise AssetException(f"Unable to register {filename} in the assets store (file not found).")
+        key = (stat.st_dev, stat.st_ino, stat.st_size, stat.st_mtime_ns)
+        with self._lock:
+            digest = self._hashes.get(key)
+        if digest is None:
+            digest = file_hash(filename)
+        with self._lock:
+            self._hashes[key] = digest
+            if digest not in self._assets:
+                self._assets[digest] = self._store(filename, digest)
+            return self._assets[digest]
+
+    def _store(self, filename: str, digest: str) -> str:
+        if self._path is None:
+            return os.path.realpath(filename)
+        stored = os.path.join(self._path, digest)
+        if not os.path.exists(stored):
+            try:
+                os.link(filename, stored)
+            except OSError:
+                shutil.copyfile(filename, stored)
+        return stored
+
+    def link(self, filename: str, path: str, name: Optional[str] = None) -> str:
+        """Make a file available in a (run) directory.
+
+        The file is registered if needed, then hard-linked in the directory, or symbolically linked if a hard link
+        cannot be created (e.g. different filesystems).
+
+        Args:
+            filename: the name of the file.
+            path: the destination directory.
+            name: the name of the file in the destination directory (default to the name of the file).
+
+        Returns:
+            the path of the linked file.
+        """
+        source = self.register(filename)
+        destination = os.path.join(path, name or os.path.basename(filename))
+        os.makedirs(os.path.dirname(destination), exist_ok=True)
+        if os.path.lexists(destination):
+            os.unlink(destination)
+        try:
+            os.link(source, destination)
+        except OSError:
+            os.symlink(source, destination)
+        return destination
+
+    def link_all(self, filenames: Iterable[str], path: str, base_path: str = '.') -> List[str]:
+        """Make the files referenced (by relative names) by the commands available in a (run) directory.
+
+        Absolute file names are left untouched (the files are accessible from any directory), as well as names
+        pointing outside of the run directory. Relative names are resolved from `base_path` and linked with the same
+        relative name in the run directory.
+
+        Args:
+            filenames: the file names (as referenced in the Zgoubi input).
+            path: the destination directory.
+            base_path: the directory from which the relative names are resolved.
+
+        Returns:
+            the list of the linked files.
+        """
+        linked = []
+        for f in set(filenames):
+            if os.path.isabs(f) or os.path.normpath(f).startswith('..'):
+                continue
+            source = os.path.join(base_path, f)
+            if not os.path.isfile(source):
+                _logger.warning(f"Asset {f} not found in {os.path.abspath(base_path)}, not linked in {path}.")
+                continue
+            linked.append(self.link(source, path, name=os.path.normpath(f)))
+        return linked
+
+    def clear(self):
+        """Forget all the registered assets (the files in the store directory are removed)."""
+        with self._lock:
+            if self._path is not None:
+                for stored in self._assets.values():
+                    try:
+                        os.unlink(stored)
+                    except OSError:
+                        pass
+            self._assets = {}
+            self._hashes = {}
+
+
+asset_store: AssetStore = AssetStore(path=os.environ.get('ZGOUBIDOO_ASSETS_PATH'))
+"""Default (process-wide) asset store, used by `Input` to link the field maps in the run directories."""
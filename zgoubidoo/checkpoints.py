@@ -0,0 +1,231 @@
+"""Checkpointed multi-turn tracking: long `Rebelote` runs split in chunks of passes, with resume capability.
+
+A multi-turn tracking (a `Rebelote` with a large number of passes) runs as a single long Zgoubi process, which cannot
+be interrupted without losing everything. A `CheckpointedTracking` splits the passes in chunks, each chunk being a
+separate run:
+
+- the coordinates of the surviving particles at the end of each chunk are stored (using `FaiStore` at a marker
+  inserted before the `Rebelote`) and saved in a checkpoint directory, along with the outputs of the chunk;
+- the next chunk restarts from these coordinates (with an `Objet2`);
+- the tracking can be stopped after any number of chunks (e.g. to fit in the time limit of a batch queue) and resumed
+  later (possibly from another process) from the last checkpoint.
+
+The outputs of the chunks are stitched in a single turn-by-turn dataset, with the pass numbers (`IPASS`) and the
+particle numbers (`IT`) of the complete tracking.
+
+Examples:
+    >>> tracking = CheckpointedTracking(zi, chunk=1000, path='/scratch/run42')  # doctest: +SKIP
+    >>> tracking.run(max_chunks=10)  # doctest: +SKIP
+    >>> tracking.tracks()  # doctest: +SKIP
+"""
+from __future__ import annotations
+from typing import Any, Dict, Iterable, List, Optional
+import json
+import logging
+import os
+import shutil
+import numpy as _np
+import pandas as _pd
+from . import assets as _assets
+from .commands.beam import Beam as _Beam
+from .commands.commands import FaiStore as _FaiStore
+from .commands.commands import Marker as _Marker
+from .commands.commands import Rebelote as _Rebelote
+from .commands.mcobjet import MCObjet as _MCObjet
+from .commands.objet import Objet as _Objet
+from .commands.particules import Particule as _Particule
+from .input import Input as _Input
+from .mappings import MappedParametersType as _MappedParametersType
+from .outputs import read_fai_file as _read_fai_file
+from .segments import particles_from_fai as _particles_from_fai
+from .segments import restart_head as _restart_head
+from .zgoubi import OUTPUT_READERS as _OUTPUT_READERS
+from .zgoubi import Zgoubi as _Zgoubi
+
+__all__ = ['CheckpointException', 'CheckpointedTracking']
+_logger = logging.getLogger(__name__)
+
+CHECKPOINT_FILENAME: str = 'checkpoint.fai'
+"""Name of the file in which the coordinates at the end of each chunk are stored."""
+
+CHECKPOINT_LABEL: str = 'CHECKPOINT'
+"""LABEL1 of the marker (inserted before the `Rebelote`) at which the coordinates are stored."""
+
+
+class CheckpointException(Exception):
+    """Exception raised for errors in the checkpointed tracking."""
+
+    def __init__(self, m):
+        self.message = m
+
+
+class CheckpointedTracking:
+    """Multi-turn tracking split in chunks of passes, checkpointed in a directory."""
+
+    def __init__(self,
+                 zgoubi_input: _Input,
+                 chunk: int,
+                 path: str,
+                 mapping: Optional[_MappedParametersType] = None,
+                 outputs: Iterable[str] = ('plt', ),
+                 zgoubi: Optional[_Zgoubi] = None,
+                 ):
+        """
+        Args:
+            zgoubi_input: the input sequence, with a (single) `Rebelote` giving the total number of passes
+            chunk: the number of passes of each chunk
+            path: the checkpoint directory (an existing checkpoint is resumed)
+            mapping: the mapping of the runs
+            outputs: the outputs of the chunks which are kept and stitched ('plt' and/or 'fai')
+            zgoubi: the Zgoubi executable used for the runs (default: a new instance)
+
+        Raises:
+            CheckpointException if the input sequence cannot be split.
+        """
+        rebelotes = zgoubi_input.line.filter((_Rebelote, ))
+        if len(rebelotes) != 1:
+            raise CheckpointException("The input sequence must contain exactly one Rebelote.")
+        if len(zgoubi_input.beam_mappings) > 1:
+            raise CheckpointException("Beams with multiple slices are not supported.")
+        if chunk < 1:
+            raise CheckpointException("The chunks must contain at least one pass.")
+        self._input: _Input = zgoubi_input
+        self._rebelote: _Rebelote = rebelotes[0]
+        self._chunk: int = chunk
+        self._path: str = path
+        self._mapping: _MappedParametersType = dict(mapping or {})
+        self._outputs: List[str] = list(outputs)
+        for o in self._outputs:
+            if o not in ('plt', 'fai'):
+                raise CheckpointException(f"Output '{o}' cannot be stitched.")
+        self._zgoubi: _Zgoubi = zgoubi or _Zgoubi()
+        os.makedirs(path, exist_ok=True)
+        self._state: Dict[str, Any] = self._load()
+
+    @property
+    def passes_total(self) -> int:
+        """Total number of passes."""
+        return int(self._rebelote.NPASS) + 1
+
+    @property
+    def passes_done(self) -> int:
+        """Number of passes already tracked (and checkpointed)."""
+        return self._state['passes']
+
+    @property
+    def done(self) -> bool:
+        """True if all the passes have been tracked."""
+        return self.passes_done >= self.passes_total or self._state.get('lost', False)
+
+    def _file(self, name: str) -> str:
+        return os.path.join(self._path, name)
+
+    def _load(self) -> Dict[str, Any]:
+        try:
+            with open(self._file('state.json')) as f:
+                state = json.load(f)
+        except FileNotFoundError:
+            return {'passes': 0, 'chunks': []}
+        _logger.info(f"Resuming the tracking from {self._path} after {state['passes']} passes.")
+        return state
+
+    def _save(self):
+        _assets.write_json(self._file('state.json'), self._state)
+
+    def reset(self):
+        """Remove the checkpoint (the tracking restarts from the first pass)."""
+        shutil.rmtree(self._path, ignore_errors=True)
+        os.makedirs(self._path, exist_ok=True)
+        self._state = {'passes': 0, 'chunks': []}
+
+    def _chunk_input(self, passes: int) -> _Input:
+        """Input sequence of a chunk of passes, restarting from the last checkpoint."""
+        line = list(self._input.line)
+        index = line.index(self._rebelote)
+        if passes > 1:
+            line[index] = _Rebelote.from_attributes(self._rebelote.LABEL1, self._rebelote.LABEL2, **{
+                **self._rebelote.attributes, 'NPASS': passes - 1,
+            })
+        else:
+            del line[index]
+        line.insert(index, _Marker(CHECKPOINT_LABEL))
+        if self.passes_done > 0:
+            particles = _np.load(self._file(self._state['chunks'][-1]['particles']))
+            line = _restart_head(self._input, particles, label='RESTART') + [
+                e for e in line if not isinstance(e, (_Beam, _Objet, _MCObjet))
+            ]
+        head = max([i + 1 for i, e in enumerate(line) if isinstance(e, (_Beam, _Objet, _MCObjet, _Particule))] or [0])
+        line.insert(head, _FaiStore(FNAME=CHECKPOINT_FILENAME, LABELS=CHECKPOINT_LABEL, IP=passes))
+        return _Input(name=self._input.name, line=line)
+
+    def run(self, max_chunks: Optional[int] = None) -> bool:
+        """Track (and checkpoint) the remaining chunks of passes.
+
+        Args:
+            max_chunks: the maximum number of chunks to track in this call (default: all the remaining chunks).
+
+        Returns:
+            True if the tracking is complete.
+        """
+        n = 0
+        while not self.done and (max_chunks is None or n < max_chunks):
+            self._run_chunk(min(self._chunk, self.passes_total - self.passes_done))
+            n += 1
+        return self.done
+
+    def _run_chunk(self, passes: int):
+        i = len(self._state['chunks'])
+        zgoubi_input = self._chunk_input(passes)
+        self._zgoubi(zgoubi_input, mappings=[self._mapping])
+        results = self._zgoubi.collect(paths=[p[1] for p in zgoubi_input.paths])
+        r = results.results[0][1]
+        path = getattr(r['path'], 'name', r['path'])
+        fai = _read_fai_file(filename=CHECKPOINT_FILENAME, path=path)
+        last = fai[fai['IPASS'] == fai['IPASS'].max()].sort_values('IT')
+        if last['IPASS'].max() != passes:
+            raise CheckpointException(f"Coordinates of the last pass not stored for chunk {i} (see {path}).")
+        previous = self._state['chunks'][-1]['ids'] if i > 0 else None
+        ids = last['IT'].values.astype(int)
+        if previous is not None:
+            ids = _np.load(self._file(previous))[ids - 1]
+        alive = (last['# KEX' if '# KEX' in last.columns else 'KEX'] > 0).values
+        chunk = {
+            'first': self.passes_done,
+            'passes': passes,
+            'ids': f"chunk-{i:04d}.ids.npy",
+            'particles': f"chunk-{i:04d}.particles.npy",
+            'outputs': {},
+        }
+        _np.save(self._file(chunk['ids']), ids[alive])
+        _np.save(self._file(chunk['particles']), _particles_from_fai(last[alive]))
+        for o in self._outputs:
+            if os.path.isfile(os.path.join(path, f"zgoubi.{o}")):
+                chunk['outputs'][o] = f"chunk-{i:04d}.{o}"
+                shutil.copyfile(os.path.join(path, f"zgoubi.{o}"), self._file(chunk['outputs'][o]))
+        chunk['input_ids'] = previous
+        self._state['chunks'].append(chunk)
+        self._state['passes'] += passes
+        self._state['lost'] = not alive.any()
+        self._save()
+        zgoubi_input.cleanup()
+        _logger.info(f"Chunk {i} tracked ({self.passes_done}/{self.passes_total} passes, {alive.sum()} particles).")
+
+    def tracks(self, output: str = 'plt') -> _pd.DataFrame:
+        """Stitched turn-by-turn outputs of the chunks tracked so far.
+
+        Args:
+            output: the output ('plt' or 'fai').
+
+        Returns:
+            the concatenated outputs, with the pass (`IPASS`) and particle (`IT`) numbers of the complete tracking.
+        """
+        data = []
+        for chunk in self._state['chunks']:
+            if output not in chunk['outputs']:
+                continue
+            df = _OUTPUT_READERS[output](filename=chunk['outputs'][output], path=self._path)
+            df['IPASS'] += chunk['first']
+            if chunk['input_ids'] is not None:
+                df['IT'] = _np.load(self._file(chunk['input_ids']))[df['IT'].values.astype(int) - 1]
+            data.append(df)
+        return _pd.concat(data, ignore_index=True) if data else _pd.DataFrame()
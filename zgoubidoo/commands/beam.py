@@ -2,9 +2,11 @@
 
 """
 from __future__ import annotations
-from typing import TYPE_CHECKING, Optional, Union
+from typing import TYPE_CHECKING, List, Optional, Sequence, Tuple, Union
+from concurrent.futures import ProcessPoolExecutor as _ProcessPoolExecutor
+import functools
 import os
-from random import randint
+import threading
 import numpy as np
 import pandas as pd
 from zgoubidoo import Q_ as _Q
@@ -37,6 +39,271 @@ class ZgoubidooBeamException(Exception):
         self.message = m
 
 
+BEAM_SHARD_SIZE: int = 2 ** 16
+"""Number of particles of each shard of a generated beam (each shard uses an independent random stream)."""
+
+
+@functools.lru_cache(maxsize=32)
+def _sigma_factor(matrix: Tuple[Tuple[float, ...], ...]) -> np.ndarray:
+    """Cached factor L of a covariance matrix (L L^T = matrix), by Cholesky decomposition.
+
+    Semi-definite matrices (e.g. without momentum spread) are factorized from their eigen decomposition.
+    """
+    m = np.array(matrix)
+    try:
+        return np.linalg.cholesky(m)
+    except np.linalg.LinAlgError:
+        w, v = np.linalg.eigh(m)
+        if w.min() < -1e-12 * max(abs(w.max()), 1e-300):
+            raise ZgoubidooBeamException("The sigma matrix is not positive semi-definite.")
+        return v * np.sqrt(np.clip(w, 0, None))
+
+
+def _generate_shard(mean: np.ndarray, factor: np.ndarray, seed: np.random.SeedSequence, n: int) -> np.ndarray:
+    """Generate a shard of a multivariate normal distribution from its own random stream."""
+    return mean + np.random.default_rng(seed).standard_normal((n, len(mean))) @ factor.T
+
+
+def generate_multivariate_normal(n: int,
+                                 mean: Sequence[float],
+                                 matrix: np.ndarray,
+                                 seed: Optional[Union[int, np.random.SeedSequence]] = None,
+                                 n_procs: int = 1,
+                                 shard_size: int = BEAM_SHARD_SIZE,
+                                 ) -> np.ndarray:
+    """Generate a multivariate normal distribution, reproducibly and in parallel.
+
+    The distribution is generated by shards of `shard_size` particles, each with an independent random stream spawned
+    from a `numpy.random.SeedSequence`, from the (cached) factor of the covariance matrix. The result depends only on
+    the seed (and on the shard size), not on the number of processes.
+
+    Args:
+        n: the number of particles
+        mean: the mean values of the coordinates
+        matrix: the covariance matrix
+        seed: the seed (or seed sequence) of the random streams (default: fresh entropy)
+        n_procs: number of processes generating the shards
+        shard_size: the number of particles of each shard
+
+    Returns:
+        the particles coordinates (array of shape (n, len(mean))).
+    """
+    n = int(n)
+    mean = np.asarray(mean, dtype=float)
+    factor = _sigma_factor(tuple(map(tuple, np.asarray(matrix, dtype=float))))
+    seed = seed if isinstance(seed, np.random.SeedSequence) else np.random.SeedSequence(seed)
+    sizes = [min(shard_size, n - i) for i in range(0, n, shard_size)]
+    seeds = seed.spawn(len(sizes))
+    if n_procs > 1 and len(sizes) > 1:
+        with _ProcessPoolExecutor(max_workers=min(n_procs, len(sizes))) as pool:
+            shards = list(pool.map(_generate_shard, [mean] * len(sizes), [factor] * len(sizes), seeds, sizes))
+    else:
+        shards = [_generate_shard(mean, factor, s, size) for s, size in zip(seeds, sizes)]
+    return np.concatenate(shards, axis=0) if shards else np.empty((0, len(mean)))
+
+
+CSV_INDEX_STRIDE: int = 2 ** 16
+"""Number of lines between two entries of the (sparse) index of the lines of a CSV distribution file."""
+
+CSV_BLOCK_SIZE: int = 16 * 1024 ** 2
+"""Size of the blocks read to index the lines of a CSV distribution file."""
+
+
+class DistributionSource:
+    """Source of a beam distribution, from which ranges of particles are read on demand."""
+
+    def __len__(self) -> int:
+        raise NotImplementedError
+
+    def read(self, start: int, stop: int) -> np.ndarray:
+        """Read a range of particles.
+
+        Args:
+            start: the index of the first particle
+            stop: the index following the last particle
+
+        Returns:
+            the coordinates of the particles (one row per particle).
+        """
+        raise NotImplementedError
+
+
+class ArraySource(DistributionSource):
+    """Beam distribution held in memory."""
+
+    def __init__(self, data: Union[pd.DataFrame, np.ndarray]):
+        """
+        Args:
+            data: the particles coordinates (one row per particle).
+        """
+        self._data: np.ndarray = data.values if isinstance(data, pd.DataFrame) else data
+
+    def __len__(self) -> int:
+        return self._data.shape[0]
+
+    def read(self, start: int, stop: int) -> np.ndarray:
+        return self._data[start:stop]
+
+
+class NpySource(DistributionSource):
+    """Beam distribution memory-mapped from a `.npy` file (only the particles read are loaded)."""
+
+    def __init__(self, filename: str, n: Optional[int] = None):
+        """
+        Args:
+            filename: the name of the file
+            n: the maximum number of particles
+        """
+        self._data: np.ndarray = np.load(filename, mmap_mode='r')[:n]
+
+    def __len__(self) -> int:
+        return self._data.shape[0]
+
+    def read(self, start: int, stop: int) -> np.ndarray:
+        return np.array(self._data[start:stop])
+
+
+class CsvSource(DistributionSource):
+    """Beam distribution read from a CSV file (with a header line) by ranges of lines.
+
+    The file is indexed once (a scan of the newlines, without parsing) with the offset of every `CSV_INDEX_STRIDE`-th
+    line, so that a range of particles is parsed without parsing the preceding lines. The source can be sent to other
+    processes (pickled): the index is sent along, the lock is re-created.
+    """
+
+    def __init__(self, filename: str, n: Optional[int] = None):
+        """
+        Args:
+            filename: the name of the file
+            n: the maximum number of particles
+        """
+        self._filename: str = filename
+        self._n: Optional[int] = n
+        self._offsets: Optional[List[int]] = None
+        self._length: Optional[int] = None
+        self._lock: threading.Lock = threading.Lock()
+        with open(filename) as f:
+            self._columns: List[str] = f.readline().strip().split(',')
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        del state['_lock']
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+
+    def _index(self):
+        with self._lock:
+            if self._offsets is not None:
+                return
+            with open(self._filename, 'rb') as f:
+                f.readline()
+                offsets, count, position = [f.tell()], 0, f.tell()
+                last = b'\n'
+                for block in iter(lambda: f.read(CSV_BLOCK_SIZE), b''):
+                    newlines = np.flatnonzero(np.frombuffer(block, dtype=np.uint8) == ord('\n'))
+                    lines = np.arange(count + 1, count + len(newlines) + 1)
+                    offsets.extend((position + newlines + 1)[lines % CSV_INDEX_STRIDE == 0].tolist())
+                    count += len(newlines)
+                    position += len(block)
+                    last = block[-1:]
+                    if self._n is not None and count >= self._n:
+                        break
+                if last != b'\n':
+                    count += 1
+            self._length = count if self._n is None else min(count, self._n)
+            self._offsets = offsets
+
+    def __len__(self) -> int:
+        self._index()
+        return self._length
+
+    def read(self, start: int, stop: int) -> np.ndarray:
+        stop = min(stop, len(self))
+        if stop <= start:
+            return np.empty((0, len(self._columns)))
+        entry = start // CSV_INDEX_STRIDE
+        with open(self._filename, 'rb') as f:
+            f.seek(self._offsets[entry])
+            return pd.read_csv(f,
+                               header=None,
+                               names=self._columns,
+                               skiprows=start - entry * CSV_INDEX_STRIDE,
+                               nrows=stop - start,
+                               ).values
+
+
+class ParquetSource(DistributionSource):
+    """Beam distribution read from a Parquet file (only the row groups containing the particles read are loaded).
+
+    The file is opened lazily: a source sent to another process (pickled) re-opens the file on its first read.
+    """
+
+    def __init__(self, filename: str, n: Optional[int] = None):
+        """
+        Args:
+            filename: the name of the file
+            n: the maximum number of particles
+        """
+        self._filename: str = filename
+        self._file = None
+        self._lock: threading.Lock = threading.Lock()
+        metadata = self._open().metadata
+        rows = [metadata.row_group(i).num_rows for i in range(metadata.num_row_groups)]
+        self._starts: np.ndarray = np.concatenate([[0], np.cumsum(rows)]).astype(int)
+        self._length: int = int(self._starts[-1]) if n is None else min(int(self._starts[-1]), n)
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        del state['_lock']
+        state['_file'] = None
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+
+    def _open(self):
+        if self._file is None:
+            import pyarrow.parquet as pq
+            self._file = pq.ParquetFile(self._filename)
+        return self._file
+
+    def __len__(self) -> int:
+        return self._length
+
+    def read(self, start: int, stop: int) -> np.ndarray:
+        stop = min(stop, len(self))
+        first = int(np.searchsorted(self._starts, start, side='right')) - 1
+        last = int(np.searchsorted(self._starts, stop, side='left'))
+        with self._lock:
+            table = self._open().read_row_groups(list(range(first, max(last, first + 1))))
+        offset = start - self._starts[first]
+        return table.to_pandas().values[offset:offset + max(stop - start, 0)]
+
+
+def open_distribution(file: str, path: str = '.', n: Optional[int] = None) -> DistributionSource:
+    """Open a beam distribution file, according to its extension ('.npy', '.parquet' or '.pq', CSV otherwise).
+
+    Args:
+        file: the name of the file
+        path: path to the file
+        n: the maximum number of particles
+
+    Returns:
+        a distribution source reading the particles from the file on demand.
+    """
+    filename = os.path.join(path, file)
+    extension = os.path.splitext(file)[1].lower()
+    if extension == '.npy':
+        return NpySource(filename, n)
+    if extension in ('.parquet', '.pq'):
+        return ParquetSource(filename, n)
+    return CsvSource(filename, n)
+
+
 class BeamType(_CommandType):
     """Type system for Objet types."""
     pass
@@ -147,6 +414,7 @@ class BeamZgoubiDistribution(Beam):
         'EMIT_X': (1e-9 * _ureg.m * _ureg.radian, 'Longitudinal (X) normalized emittance'),
         'N_CUTOFF_X': (10, 'Cut-off value for the longitudinal distribution'),
         'N_CUTOFF2_X': (0, 'Secondary cut-off value for the longitudinal distribution'),
+        'SEED': (None, 'Seed of the random generation (the seeds of each slice are derived from it).'),
     }
     """Parameters of the command, with their default value, their description and optinally an index used by other 
     commands (e.g. fit)."""
@@ -199,9 +467,13 @@ class BeamZgoubiDistribution(Beam):
         """
         TODO
 
+        The random sequence seeds of each slice are drawn from an independent stream derived from `SEED` (see
+        `numpy.random.SeedSequence`): the slices are reproducible if `SEED` is set.
+
         Return:
 
         """
+        seeds = np.random.SeedSequence(self.SEED, spawn_key=(int(self.SLICE), )).generate_state(3) % 1000000
         return self._objet_type(self.LABEL1,
                                 BORO=self._kinematics.brho,
                                 IMAX=self.IMAX / self.slices,
@@ -222,9 +494,9 @@ class BeamZgoubiDistribution(Beam):
                                 ALPHA_X=self.ALPHA_X,
                                 BETA_X=self.BETA_X,
                                 EMIT_X=self.EMIT_X,
-                                I1=randint(0, 1e6),
-                                I2=randint(0, 1e6),
-                                I3=randint(0, 1e6),
+                                I1=int(seeds[0]),
+                                I2=int(seeds[1]),
+                                I3=int(seeds[2]),
                                 )
 
     @classmethod
@@ -285,46 +557,46 @@ class BeamInputDistribution(Beam):
         """
         super().post_init(objet_type=objet_type, **kwargs)
         self._slices: int = slices
-        self._distribution: Optional[np.array] = None
+        self._sources: List[DistributionSource] = []
         self.initialize_distribution(distribution, **kwargs)
 
-    def initialize_distribution(self, distribution: Optional[Union[pd.DataFrame, np.ndarray, str]] = None, **kwargs):
+    def initialize_distribution(self,
+                                distribution: Optional[Union[pd.DataFrame, np.ndarray, str, DistributionSource]] = None,
+                                **kwargs):
         """Try setting the internal pandas.DataFrame with a distribution.
 
         Args:
             distribution:
         """
-        if isinstance(distribution, str):
-            self.add(
-                BeamInputDistribution.generate_from_file(
-                    distribution,
-                    path=kwargs.get('path', '.')
-                )
-            )
-        elif isinstance(distribution, (np.ndarray, pd.DataFrame)):
-            self.add(distribution)
+        if isinstance(distribution, (str, np.ndarray, pd.DataFrame, DistributionSource)):
+            self.add(distribution, **kwargs)
         return self
 
-    def add(self, distribution: Union[pd.DataFrame, np.ndarray, str], **kwargs):
+    def add(self, distribution: Union[pd.DataFrame, np.ndarray, str, DistributionSource], **kwargs):
         """
+        Append particles to the distribution.
+
+        Files (and distribution sources) are not loaded: the particles are read when needed, slice by slice (see
+        `open_distribution`).
 
         Args:
-            distribution:
+            distribution: the particles, a distribution file or a distribution source
 
         Returns:
 
         """
-        distr = None
         if isinstance(distribution, str):
-            distr = BeamInputDistribution.generate_from_file(
-                distribution,
-                path=kwargs.get('path', '.')
-            )
-        elif isinstance(distribution, pd.DataFrame):
-            distr = distribution.values
-        elif isinstance(distribution, np.ndarray):
-            distr = distribution
+            self._sources.append(open_distribution(distribution, path=kwargs.get('path', '.'), n=kwargs.get('n')))
+        elif isinstance(distribution, DistributionSource):
+            self._sources.append(distribution)
+        elif isinstance(distribution, (pd.DataFrame, np.ndarray)):
+            data = distribution.values if isinstance(distribution, pd.DataFrame) else distribution
+            self._sources.append(ArraySource(BeamInputDistribution._complete(data)))
+        return self
 
+    @staticmethod
+    def _complete(distr: np.ndarray) -> np.ndarray:
+        """Complete the particles coordinates (Y T Z P X D IEX) with the default values of the missing columns."""
         if distr is not None:
             assert isinstance(distr, np.ndarray), "The distribution container must be a numpy array."
             assert distr.ndim == 2, "Invalid dimensions for the array of particles (must be 2)."
@@ -344,11 +616,33 @@ class BeamInputDistribution(Beam):
                 pass
             else:
                 raise _ZgoubidooException("Invalid dimensions for particles vectors.")
-            if self._distribution is None:
-                self._distribution = distr
-            else:
-                self._distribution = np.append(self._distribution, distr, axis=0)
-        return self
+        return distr
+
+    @property
+    def n_particles(self) -> int:
+        """Number of particles of the distribution."""
+        return sum(len(source) for source in self._sources)
+
+    def read(self, start: int, stop: int) -> Optional[np.ndarray]:
+        """Read a range of particles of the distribution (only these particles are loaded from the sources).
+
+        Args:
+            start: the index of the first particle
+            stop: the index following the last particle
+
+        Returns:
+            the particles coordinates (Y T Z P X D IEX), None if the distribution is empty.
+        """
+        if not self._sources:
+            return None
+        data = []
+        offset = 0
+        for source in self._sources:
+            n = len(source)
+            if start < offset + n and stop > offset:
+                data.append(self._complete(source.read(max(start - offset, 0), min(stop - offset, n))))
+            offset += n
+        return np.concatenate(data, axis=0) if data else np.empty((0, 7))
 
     @property
     def slices(self):
@@ -363,12 +657,10 @@ class BeamInputDistribution(Beam):
     @property
     def active_slice(self):
         """The index of the active (current) slice."""
-        try:
-            n_tot = self._distribution.shape[0]
-        except TypeError:
+        if not self._sources:
             return None
-        n_per_slices = int(np.floor(n_tot / self._slices))
-        d = self._distribution[self.SLICE * n_per_slices:(self.SLICE + 1) * n_per_slices]
+        n_per_slices = int(np.floor(self.n_particles / self._slices))
+        d = self.read(self.SLICE * n_per_slices, (self.SLICE + 1) * n_per_slices)
         if len(d) == 0:
             return None
         else:
@@ -405,8 +697,8 @@ class BeamInputDistribution(Beam):
 
     @property
     def distribution(self) -> pd.DataFrame:
-        """The beam distribution."""
-        return self._distribution
+        """The beam distribution (all the particles are loaded, see `active_slice` and `read`)."""
+        return self.read(0, self.n_particles)
 
     def create_reference_statistics(self, n: int = 1):
         """
@@ -418,7 +710,7 @@ class BeamInputDistribution(Beam):
 
         """
         o = self.generate_object().clear().add_references(n)
-        self._distribution = np.array(o.PARTICULES)
+        self._sources = [ArraySource(np.array(o.PARTICULES))]
         return self
 
     def clear(self) -> Beam:
@@ -427,7 +719,7 @@ class BeamInputDistribution(Beam):
         Returns:
 
         """
-        self._distribution = None
+        self._sources = []
         self._slices = 1
         return self
 
@@ -442,7 +734,7 @@ class BeamInputDistribution(Beam):
         Returns:
 
         """
-        self.initialize_distribution(BeamInputDistribution.generate_from_file(file, path, n))
+        self.initialize_distribution(open_distribution(file, path, n))
         return self
 
     def from_5d_sigma_matrix(self, n, **kwargs) -> Beam:
@@ -460,12 +752,14 @@ class BeamInputDistribution(Beam):
         self.initialize_distribution(distribution)
         return self
 
-    def from_twiss_parameters(self, n, **kwargs) -> Beam:
+    def from_twiss_parameters(self, n, seed=None, n_procs: int = 1, **kwargs) -> Beam:
         """
         Initialize a beam with a 5D particle distribution from Twiss parameters.
 
         Args:
             n:
+            seed: the seed of the random generation (see `generate_multivariate_normal`)
+            n_procs: number of processes generating the distribution
             **kwargs:
 
         Returns:
@@ -493,7 +787,9 @@ class BeamInputDistribution(Beam):
                                   s22=gammax * kwargs['EMITX'],
                                   s33=betay * kwargs['EMITY'],
                                   s34=-alphay * kwargs['EMITY'],
-                                  s44=gammay * kwargs['EMITY']
+                                  s44=gammay * kwargs['EMITY'],
+                                  seed=seed,
+                                  n_procs=n_procs,
                                   )
         return self
 
@@ -527,7 +823,8 @@ class BeamInputDistribution(Beam):
         Returns:
 
         """
-        return pd.read_csv(os.path.join(path, file))[:n].values
+        source = open_distribution(file, path, n)
+        return source.read(0, len(source))
 
     @staticmethod
     def generate_from_5d_sigma_matrix(n: int,
@@ -552,6 +849,8 @@ class BeamInputDistribution(Beam):
                                       s45: float = 0,
                                       dpprms: float = 0,
                                       matrix=None,
+                                      seed=None,
+                                      n_procs: int = 1,
                                       ):
         """
 
@@ -578,18 +877,14 @@ class BeamInputDistribution(Beam):
             s45:
             dpprms:
             matrix:
+            seed: the seed of the random generation (see `generate_multivariate_normal`)
+            n_procs: number of processes generating the distribution
 
         Returns:
 
         """
-        # For performance considerations, see
-        # https://software.intel.com/en-us/blogs/2016/06/15/faster-random-number-generation-in-intel-distribution-for-python
-        try:
-            import numpy.random_intel
-            generator = numpy.random_intel.multivariate_normal
-        except ModuleNotFoundError:
-            import numpy.random
-            generator = numpy.random.multivariate_normal
+        def generator(mean, cov, size):
+            return generate_multivariate_normal(size, mean, cov, seed=seed, n_procs=n_procs)
 
         s21 = s12
         s31 = s13
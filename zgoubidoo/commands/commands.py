@@ -4,7 +4,7 @@ Commands controlling Zgoubi's control flow, geometry, tracking options, etc.
 TODO
 """
 from __future__ import annotations
-from typing import Any, Tuple, Dict, Mapping, List, Union
+from typing import Any, Tuple, Dict, Mapping, List, Optional, Union
 import inspect
 import uuid
 import numpy as _np
@@ -17,6 +17,8 @@ from .. import Q_ as _Q
 from georges_core.frame import Frame as _Frame
 from ..units import _radian, _degree, _m, _cm
 from ..constants import ZGOUBI_LABEL_LENGTH as _ZGOUBI_LABEL_LENGTH
+from ..retention import OutputRetention as _OutputRetention
+from .. import retention as _retention
 import zgoubidoo
 
 
@@ -50,25 +52,94 @@ class Comment:
         return str(self)
 
 
+COMMANDS_REGISTRY: Dict[str, CommandType] = {}
+"""Registry of all the commands, indexed by their (lower-case) class name or alias."""
+
+KEYWORDS_REGISTRY: Dict[str, CommandType] = {}
+"""Registry of all the commands, indexed by their Zgoubi keyword (the class defining the keyword is registered)."""
+
+
+def find_command(name: str) -> CommandType:
+    """Find a command class from its class name (case insensitive) or one of its aliases.
+
+    The lookup is done in the commands registry, which is filled automatically when the command classes are created.
+    The aliases defined in the `zgoubidoo.commands` module (e.g. `Chambr`) are resolved once and then cached in the
+    registry.
+
+    Examples:
+        >>> find_command('Quadrupole')
+        <class 'zgoubidoo.commands.magnetique.Quadrupole'>
+        >>> find_command('changeref')
+        <class 'zgoubidoo.commands.commands.ChangRef'>
+
+    Args:
+        name: the class name or alias of the command.
+
+    Returns:
+        the command class.
+
+    Raises:
+        KeyError if no command can be found with that name.
+    """
+    try:
+        return COMMANDS_REGISTRY[name.lower()]
+    except KeyError:
+        for k, v in vars(zgoubidoo.commands).items():
+            if k.lower() == name.lower() and isinstance(v, CommandType):
+                COMMANDS_REGISTRY[name.lower()] = v
+                return v
+    raise KeyError(f"No command named '{name}'.")
+
+
+def find_command_by_keyword(keyword: str) -> CommandType:
+    """Find a command class from its Zgoubi keyword.
+
+    The class registered for a keyword is the one defining it (e.g. `Objet` for 'OBJET' and not one of its subclasses).
+    The lookup falls back on the class names (see `find_command`) for keywords unknown to the registry.
+
+    Examples:
+        >>> find_command_by_keyword('QUADRUPO')
+        <class 'zgoubidoo.commands.magnetique.Quadrupole'>
+
+    Args:
+        keyword: the Zgoubi keyword of the command.
+
+    Returns:
+        the command class.
+
+    Raises:
+        KeyError if no command can be found with that keyword.
+    """
+    try:
+        return KEYWORDS_REGISTRY[keyword.upper()]
+    except KeyError:
+        return find_command(keyword)
+
+
 class CommandType(type):
     """
     Dark magic.
     Be careful.
 
+    All classes created with this metaclass are registered in the commands registries (see `find_command` and
+    `find_command_by_keyword`).
+
     TODO
     """
     def __new__(mcs, name: str, bases: Tuple[CommandType, type, ...], dct: Dict[str, Any]):
         # Insert a default initializer (constructor) in case one is not present
         if '__init__' not in dct:
+            # The defaults of the post_init arguments are collected once and for all (not at each instanciation)
+            defaults = {}
+            if 'post_init' in dct:
+                defaults = {
+                    _: __.default
+                    for _, __ in inspect.signature(dct['post_init']).parameters.items()
+                    if __.default is not inspect.Parameter.empty
+                }
+
             def default_init(self, label1: str = '', label2: str = '', *params, **kwargs):
                 """Default initializer for all Commands."""
-                defaults = {}
-                if 'post_init' in dct:
-                    defaults = {
-                        _: __.default
-                        for _, __ in inspect.signature(dct['post_init']).parameters.items()
-                        if __.default is not inspect.Parameter.empty
-                    }
                 bases[0].__init__(self, label1, label2, dct.get('PARAMETERS', {}), *params, **{**defaults, **kwargs})
                 if 'post_init' in dct:
                     dct['post_init'](self, **kwargs)
@@ -107,6 +178,9 @@ class CommandType(type):
 
     def __init__(cls, name: str, bases: Tuple[type, ...], dct: Dict[str, Any]):
         super().__init__(name, bases, dct)
+        COMMANDS_REGISTRY.setdefault(name.lower(), cls)
+        if getattr(cls, 'KEYWORD', None):
+            KEYWORDS_REGISTRY.setdefault(cls.KEYWORD.upper(), cls)
         if cls.__doc__ is not None:
             cls.__doc__ = cls.__doc__.rstrip()
             cls.__doc__ += """
@@ -350,10 +424,27 @@ class Command(metaclass=CommandType):
         """Object (instance) deep copy operation."""
         return self.__copy__()
 
+    def __getstate__(self) -> Dict[str, Any]:
+        """State used for serialization (the outputs and results of the command are not serialized)."""
+        return {**self.__dict__, '_output': list(), '_results': list()}
+
+    def __setstate__(self, state: Dict[str, Any]):
+        """Restore the state of a serialized command (bypasses the attributes setter)."""
+        self.__dict__.update(state)
+
     def __eq__(self, other):
         """Comparison based on string representation in the Zgoubi format."""
         return str(self) == str(other)
 
+    @property
+    def assets(self) -> List[str]:
+        """Files (e.g. field maps) read by Zgoubi for this command, to be made available in the run directories.
+
+        Returns:
+            the list of file names (as written in the Zgoubi input).
+        """
+        return []
+
     @property
     def attributes(self) -> Dict[str, _ureg.Quantity]:
         """All attributes.
@@ -416,21 +507,46 @@ class Command(metaclass=CommandType):
         self._results = list()
         return self
 
+    def release_outputs(self, results: bool = False):
+        """
+        Release the raw outputs attached to the command (and optionally the parsed results), to free memory.
+
+        Args:
+            results: also release the parsed results.
+
+        Returns:
+            the command itself (for method chaining, etc.)
+        """
+        self._output = list()
+        if results:
+            self._results = list()
+        return self
+
     def attach_output(self,
                       outputs: List[str],
                       parameters: Mapping[str, Union[_Q, float]],
                       zgoubi_input: zgoubidoo.Input,
+                      retention: Optional[_OutputRetention] = None,
                       ):  # -> NoReturn:
         """
         Attach the ouput that an command has generated during a Zgoubi run.
 
+        The outputs and results kept attached to the command are bounded by the retention policy (see
+        `zgoubidoo.retention`).
+
         Args:
             outputs: the outputs from a Zgoubi run to be attached to the command.
             parameters: TODO
             zgoubi_input: the Input sequence (required for output processing).
+            retention: the retention policy (default to the process-wide policy).
         """
-        self._output.append((parameters, outputs))
+        retention = retention or _retention.output_retention
+        retained = retention.retain(outputs)
+        if retained is not None:
+            self._output.append((parameters, retained))
         self.process_output(outputs, parameters, zgoubi_input)
+        retention.trim(self._output)
+        retention.trim(self._results)
 
     def process_output(self,
                        output: List[str],
@@ -449,6 +565,33 @@ class Command(metaclass=CommandType):
         """
         return True
 
+    @classmethod
+    def from_attributes(cls, label1: str = '', label2: str = '', **attributes) -> Command:
+        """Fast construction path for commands whose attributes are already known and valid.
+
+        The command is created with its default attributes and the given attributes are then assigned directly,
+        bypassing the attributes setter (no unit inference nor dimension validation). This is intended for bulk
+        construction of commands from trusted sources (e.g. parsing of Zgoubi input files), with the attributes
+        expressed in the units of the default values (Zgoubi units). Note that the adjustments done in ``post_init``
+        are computed with the default attributes.
+
+        Examples:
+            >>> Command.from_attributes('FOO', 'BAR').LABEL2
+            'BAR'
+
+        Args:
+            label1: the primary label of the command.
+            label2: the secondary label of the command.
+            **attributes: the attributes of the command.
+
+        Returns:
+            the new command.
+        """
+        c = cls(label1)
+        c._attributes.update(attributes)
+        c._attributes['LABEL2'] = label2
+        return c
+
     @classmethod
     def build(cls, stream: str, debug: bool = False) -> Command:
         """
@@ -753,7 +896,7 @@ class FaiStore(Command):
     def __str__(self):
         return f"""
         {super().__str__().rstrip()}
-        {self.FNAME}
+        {self.FNAME} {self.LABELS}
         {self.IP}
         """
 
@@ -3,7 +3,11 @@
 More details here.
 """
 from __future__ import annotations
-from typing import TYPE_CHECKING, Optional, List, Mapping, Union
+from typing import TYPE_CHECKING, Any, Dict, Optional, List, Mapping, Union
+import hashlib
+import json
+import logging
+import os
 import numpy as _np
 import pandas as _pd
 from .commands import Command as _Command
@@ -14,12 +18,24 @@ from .. import Q_ as _Q
 from ..units import _cm, _radian
 from ..zgoubi import Zgoubi as _Zgoubi
 from ..zgoubi import ZgoubiException as _ZgoubiException
+from ..fieldmaps.fieldmap import ZGOUBI_BINARY_PREFIX as _ZGOUBI_BINARY_PREFIX
+from ..fieldmaps.fieldmap import ZGOUBI_HEADER_LINES as _ZGOUBI_HEADER_LINES
+from ..assets import file_stamp as _file_stamp
+from ..assets import write_json as _write_json
 import zgoubidoo
 import plotly.graph_objects as _go
 from georges_core.frame import Frame as _Frame
 if TYPE_CHECKING:
     from ..input import Input as _Input
 
+_logger = logging.getLogger(__name__)
+
+TOSCA_CACHE_PATH: str = os.environ.get(
+    'ZGOUBIDOO_TOSCA_CACHE',
+    os.path.join(os.path.expanduser('~'), '.cache', 'zgoubidoo', 'tosca'),
+)
+"""Default directory of the cache of the field map metadata (see `Tosca.load`)."""
+
 
 class Brevol(_Command):
     """1-D uniform mesh magnetic field map.
@@ -79,6 +95,11 @@ class CartesianMesh(_Command):
         {s.KPOS} {_cm(s.XCE)} {_cm(s.YCE)} {_radian(s.ALE)}
         """
 
+    @property
+    def assets(self) -> List[str]:
+        """Field map file."""
+        return [self.FNAME]
+
 
 class Map2D(_Command):
     """2-D Cartesian uniform mesh field map - arbitrary magnetic field.
@@ -163,6 +184,10 @@ class Tosca(_CartesianMagnet):
 
     .. rubric:: Zgoubidoo usage and example
 
+    If a binary version of a field map file exists (same name, prefixed with `b_`, see `FieldMap.to_zgoubi`), it is
+    used instead of the text file (unless `BINARY` is False, or the binary file is older than the text file): Zgoubi
+    reads binary files much faster, which reduces the fixed cost of every run using a large field map.
+
     """
     KEYWORD = 'TOSCA'
     """Keyword of the command used for the Zgoubi input data."""
@@ -181,6 +206,7 @@ class Tosca(_CartesianMagnet):
         'MOD': (0, 'Format reading mode.'),
         'MOD2': (0, 'Format reading sub-mode.'),
         'FNAME': ('TOSCA', 'File names.'),
+        'BINARY': (True, 'Use the binary versions of the field map files (`b_` prefix) when available.'),
         'ID': (0, 'Integration boundary.'),
         'A': (1,),
         'B': (1,),
@@ -200,38 +226,133 @@ class Tosca(_CartesianMagnet):
         commands (e.g. fit)."""
 
     def __str__(s) -> str:
+        files = '\n'.join(s.files)  # One file name per line
         return f"""
         {super().__str__().rstrip()}
         {s.IC:d} {s.IL:d}
         {s.BNORM:.12e} {s.XN:.12e} {s.YN:.12e} {s.ZN:.12e}
         {s.TITL}
         {s.IX:d} {s.IY:d} {s.IZ:d} {s.MOD:d}.{s.MOD2:d}
-        {s.FNAME}
+        {files}
         {s.ID:d} {s.A:.12e} {s.B:.12e} {s.C:.12e}
         {s.IORDRE:d}
         {_cm(s.XPAS):.12e}
         {s.KPOS:d} {s.XCE.m_as('cm'):.12e} {s.YCE.m_as('cm'):.12e} {s.ALE.m_as('radian'):.12e}
         """
 
+    @property
+    def files(self) -> List[str]:
+        """Field map files read by Zgoubi.
+
+        The binary versions of the files are used when available, unless they are older than the text files (in which
+        case a warning is issued and the text files are used).
+        """
+        files = []
+        for f in self.FNAME.split():
+            binary = os.path.join(os.path.dirname(f), _ZGOUBI_BINARY_PREFIX + os.path.basename(f))
+            if self.BINARY and not os.path.basename(f).lower().startswith(_ZGOUBI_BINARY_PREFIX) \
+                    and os.path.isfile(binary):
+                if os.path.isfile(f) and os.path.getmtime(binary) < os.path.getmtime(f):
+                    _logger.warning(f"The binary field map {binary} is older than {f}, the text file is used.")
+                else:
+                    files.append(binary)
+                    continue
+            files.append(f)
+        return files
+
+    @property
+    def assets(self) -> List[str]:
+        """Field map files (one or more file names, one per line)."""
+        return self.files
+
     def adjust_tracks_variables(self, tracks: _pd.DataFrame):
         super().adjust_tracks_variables(tracks)
         t = tracks[tracks.LABEL1 == self.LABEL1]
         tracks.loc[tracks.LABEL1 == self.LABEL1, 'SREF'] = t['X'] - t['X'].min() + self.entry_s.m_as('m')
         tracks.loc[tracks.LABEL1 == self.LABEL1, 'X'] = t['X'] - t['X'].min()
 
-    def load(self, zgoubi: Optional[_Zgoubi] = None):
-        z = zgoubi or _Zgoubi()
-        zi = zgoubidoo.Input(f"TOSCA_{self.LABEL1}")
-        zi += self
+    @property
+    def metadata_key(self) -> str:
+        """Key (hash) identifying the field map: path, size and modification time of the field map files (see
+        `zgoubidoo.assets.file_stamp`) and parameters of the mesh.
+
+        The files are identified by their stamps rather than by a hash of their content: hashing large field maps
+        would cost as much as reading them, which the cache is meant to avoid. As with `AssetStore`, a file modified
+        without any change of size or modification time is not detected.
+        """
+        h = hashlib.sha256(' '.join(_file_stamp(f) for f in self.files).encode())
+        h.update(' '.join(str(getattr(self, p)) for p in ('IX', 'IY', 'IZ', 'MOD', 'MOD2', 'XN', 'YN', 'ZN')).encode())
+        return h.hexdigest()
 
-        def cb(f):
-            """Post execution callback."""
-            if not self.results[0][1].success:
-                raise _ZgoubiException(f"Unable to load field map for keyword {self.__class__.__name__}.")
-            self._length = self.results[0][1].results.iloc[-1]['LENGTH'] * _ureg.cm
+    def read_metadata(self) -> Optional[Dict[str, Any]]:
+        """Read the metadata of a (Cartesian) field map directly from the beginning of its file.
 
-        z(zi, identifier={'TOSCA_LOAD': self.LABEL1}, cb=cb)
-        z.wait()
+        Only single file 3-D maps (`MOD=12`, as written by `FieldMap.to_zgoubi`) are supported: the longitudinal
+        coordinate (third column) varies fastest, so that the extent of the map along the X axis (and thus the length of
+        the element) is given by the first `IX` nodes of the file.
+
+        Returns:
+            the metadata ('LENGTH', 'X_MIN' and 'X_MAX', in centimeters) or None if the field map cannot be read
+            (other modes, e.g. multiple files or cylindrical meshes, are not supported).
+        """
+        if self.MOD != 12 or self.IX < 2 or len(self.files) != 1:
+            return None
+        filename = self.files[0]
+        try:
+            if os.path.basename(filename).lower().startswith(_ZGOUBI_BINARY_PREFIX):
+                records = _np.fromfile(filename, count=self.IX,
+                                       dtype=[('head', '<i4'), ('values', '<f8', 6), ('tail', '<i4')])
+                x = records['values'][:, 2]
+            else:
+                x = _np.loadtxt(filename, skiprows=_ZGOUBI_HEADER_LINES, max_rows=self.IX, usecols=(2, ))
+        except (OSError, ValueError) as e:
+            _logger.warning(f"Unable to read the field map file {filename} ({e}).")
+            return None
+        if len(x) != self.IX:
+            return None
+        x = x * self.XN
+        return {'LENGTH': float(x.max() - x.min()), 'X_MIN': float(x.min()), 'X_MAX': float(x.max())}
+
+    def load(self, zgoubi: Optional[_Zgoubi] = None, cache: bool = False, cache_path: Optional[str] = None):
+        """Determine the length of the element from its field map.
+
+        The metadata of the field map are read directly from the field map file (see `read_metadata`) or, if this is
+        not possible, obtained by running Zgoubi. In the latter case, the metadata can be cached on disk (opt-in,
+        shared across sessions), keyed by the field map files and the parameters of the mesh (see `metadata_key`).
+
+        Args:
+            zgoubi: the Zgoubi executable used to load the field map if needed (default: a new instance)
+            cache: use the cache of the field map metadata obtained by running Zgoubi (opt-in)
+            cache_path: the cache directory (default: `TOSCA_CACHE_PATH`)
+
+        Returns:
+            the element itself (allows method chaining).
+        """
+        metadata = self.read_metadata()
+        filename = None
+        if metadata is None and cache:
+            filename = os.path.join(cache_path or TOSCA_CACHE_PATH, f"{self.metadata_key}.json")
+            try:
+                with open(filename) as f:
+                    metadata = {'LENGTH': float(json.load(f)['LENGTH'])}
+            except (OSError, ValueError, KeyError, TypeError):
+                pass
+        if metadata is None:
+            z = zgoubi or _Zgoubi()
+            zi = zgoubidoo.Input(f"TOSCA_{self.LABEL1}")
+            zi += self
+
+            def cb(f):
+                """Post execution callback."""
+                if not self.results[0][1].success:
+                    raise _ZgoubiException(f"Unable to load field map for keyword {self.__class__.__name__}.")
+
+            z(zi, identifier={'TOSCA_LOAD': self.LABEL1}, cb=cb)
+            z.wait()
+            metadata = {'LENGTH': float(self.results[0][1].results.iloc[-1]['LENGTH'])}
+            if filename is not None:
+                _write_json(filename, metadata)
+        self._length = metadata['LENGTH'] * _ureg.cm
         return self
 
     def process_output(self, output: List[str],
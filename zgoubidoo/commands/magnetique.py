@@ -1520,7 +1520,8 @@ class Drift(CartesianMagnet):
 
 class ESL(Drift):
     """Field free drift space ("espace libre")."""
-    pass
+    KEYWORD = 'ESL'
+    """Keyword of the command used for the Zgoubi input data."""
 
 
 class Emma(CartesianMagnet):
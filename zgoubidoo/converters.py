@@ -14,12 +14,19 @@ encourage the development of converters even for exotic cases, no specific confi
 The MAD-X converters and converters are to be considered as typical examples and conventions that other modules should
 follow.
 
+The converters operate element by element. For the most common element types, *vectorized* converters (suffixed
+with *to_zgoubi_vectorized*, see `VECTORIZED_CONVERTERS`) convert all the elements of a given type at once, from the
+corresponding rows of the sequence dataframe; the commands are then created directly in Zgoubi units (see
+`Command.from_attributes`). A vectorized converter returns `None` if it does not support the conversion options, the
+element-by-element converter is then used.
+
 Examples:
     TODO
 """
 from __future__ import annotations
-from typing import TYPE_CHECKING, Dict, List, Union
+from typing import TYPE_CHECKING, Callable, Dict, List, Optional, Union
 import numpy as _np
+import pandas as _pd
 from zgoubidoo import ureg as _ureg
 from zgoubidoo.commands import Quadrupole, Sextupole, Octupole, Command, Marker, Drift, Bend, ChangeRef, Multipole, \
     Cavite, Dipole
@@ -29,6 +36,25 @@ if TYPE_CHECKING:
     from georges_core.sequences import Element as _Element
 
 
+def _magnitudes(elements: _pd.DataFrame, column: str, units: str) -> Optional[_np.ndarray]:
+    """Magnitudes (in the given units) of a column of quantities (plain floats are assumed to be in the given units).
+
+    Args:
+        elements: the elements dataframe.
+        column: the name of the column.
+        units: the units of the resulting magnitudes.
+
+    Returns:
+        an array of magnitudes or None if the column is not present.
+    """
+    if column not in elements.columns:
+        return None
+    return _np.array([
+        _np.nan if v is None else (v.m_as(units) if isinstance(v, _ureg.Quantity) else float(v))
+        for v in elements[column].values
+    ])
+
+
 def marker_to_zgoubi(element: _Element, kinematics: _Kinematics, options: Dict) -> List[Command]:
     """
     Create a Marker command from the equivalent MAD-X marker keyword.
@@ -263,3 +289,112 @@ def twcavity_to_zgoubi(element: _Element, kinematics: _Kinematics, options: Dict
         Drift(XL=1 * _ureg.mm),
         cavity,
     ]
+
+
+def marker_to_zgoubi_vectorized(elements: _pd.DataFrame,
+                                kinematics: _Kinematics,
+                                options: Dict) -> Optional[List[List[Command]]]:
+    """
+    Create the Marker commands for all the MAD-X markers of a sequence at once.
+
+    Args:
+        elements: the markers of the sequence (rows of the sequence dataframe)
+        kinematics: kinematic quantities (used for field normalization)
+        options: options for the creation of the commands
+
+    Returns:
+        the list of commands for each element (None if the options are not supported).
+    """
+    if options.get('command', Marker) is not Marker:
+        return None
+    return [[Marker(name)] for name in elements.index]
+
+
+def drift_to_zgoubi_vectorized(elements: _pd.DataFrame,
+                               kinematics: _Kinematics,
+                               options: Dict) -> Optional[List[List[Command]]]:
+    """
+    Create the Drift commands for all the MAD-X drifts of a sequence at once.
+
+    Args:
+        elements: the drifts of the sequence (rows of the sequence dataframe)
+        kinematics: kinematic quantities (used for field normalization)
+        options: options for the creation of the commands
+
+    Returns:
+        the list of commands for each element (None if the options are not supported).
+    """
+    if options.get('command', Drift) is not Drift:
+        return None
+    lengths = _magnitudes(elements, 'L', 'cm')
+    return [[Drift.from_attributes(name, XL=length * _ureg.cm)] for name, length in zip(elements.index, lengths)]
+
+
+def quadrupole_to_zgoubi_vectorized(elements: _pd.DataFrame,
+                                    kinematics: _Kinematics,
+                                    options: Dict) -> Optional[List[List[Command]]]:
+    """
+    Create the Quadrupole commands for all the MAD-X quadrupoles of a sequence at once.
+
+    Follows the same conventions as `quadrupole_to_zgoubi`.
+
+    Args:
+        elements: the quadrupoles of the sequence (rows of the sequence dataframe)
+        kinematics: kinematic quantities (used for field normalization)
+        options: options for the creation of the commands
+
+    Returns:
+        the list of commands for each element (None if the options are not supported).
+    """
+    if options.get('command', Quadrupole) is not Quadrupole:
+        return None
+    lengths = _magnitudes(elements, 'L', 'm')
+    if _np.any(lengths == 0):
+        raise ValueError("Quadrupole length cannot be zero.")
+    brho = kinematics.brho.m_as('T * m')
+    bore_radius = options.get('R0', 10 * _ureg.cm).m_as('m')
+    k1 = _magnitudes(elements, 'K1', 'm**-2')
+    k1l = _magnitudes(elements, 'K1L', 'm**-1')
+    k1brho = _magnitudes(elements, 'K1BRHO', 'T / m')
+    b1 = _magnitudes(elements, 'B1', 'T')
+    r = _magnitudes(elements, 'R', 'm')
+    if b1 is not None and r is not None:
+        explicit = ~_np.isnan(b1) & ~_np.isnan(r)
+    else:
+        explicit = _np.zeros(lengths.shape, dtype=bool)
+    if k1 is None and k1l is None and k1brho is None:
+        gradients = _np.zeros(lengths.shape)
+    elif k1 is not None and k1l is not None:
+        if _np.any((k1 != 0) & (k1l != 0) & ~explicit):
+            raise KeyError("K1 and K1L cannot be non zero at the same time.")
+        gradients = _np.where(k1 == 0, k1l / lengths, k1)
+    elif k1l is not None:
+        gradients = k1l / lengths
+    elif k1 is not None:
+        gradients = k1
+    else:
+        gradients = k1brho / brho
+    b_fields = gradients * brho * bore_radius
+    bore_radii = _np.full(lengths.shape, bore_radius)
+    if explicit.any():
+        b_fields = _np.where(explicit, b1, b_fields)
+        bore_radii = _np.where(explicit, r, bore_radii)
+    lengths = _ureg.Quantity(lengths, 'm').m_as('cm')
+    bore_radii = _ureg.Quantity(bore_radii, 'm').m_as('cm')
+    b_fields = _ureg.Quantity(b_fields, 'T').m_as('kilogauss')
+    return [
+        [Quadrupole.from_attributes(name[0:_ZGOUBI_LABEL_LENGTH],
+                                    XL=length * _ureg.cm,
+                                    R0=radius * _ureg.cm,
+                                    B0=field * _ureg.kilogauss,
+                                    )]
+        for name, length, radius, field in zip(elements.index, lengths, bore_radii, b_fields)
+    ]
+
+
+VECTORIZED_CONVERTERS: Dict[str, Callable[[_pd.DataFrame, _Kinematics, Dict], Optional[List[List[Command]]]]] = {
+    'MARKER': marker_to_zgoubi_vectorized,
+    'DRIFT': drift_to_zgoubi_vectorized,
+    'QUADRUPOLE': quadrupole_to_zgoubi_vectorized,
+}
+"""Vectorized converters, indexed by (MAD-X) keyword."""
@@ -0,0 +1,260 @@
+"""Results of parametric scans indexed by the values of the scan parameters.
+
+A `ResultsCube` arranges the runs of a scan (one run per mapping, see `zgoubidoo.mappings`) on a N-dimensional grid,
+with one axis per scan parameter. Scalar observables (e.g. the CPU time, or values reduced by the workers after each
+run) are stored in dense arrays of the shape of the grid, so that they can be sliced along the parameter axes and
+compared between scan points with vectorized (numpy) operations. A hash index provides the position (and the run) of
+a given mapping in constant time.
+
+Quantities are stored by their magnitude in base units (see `zgoubidoo.mappings.parameter_value`); missing scan
+points are indicated by a run index of -1 and by NaN values of the observables.
+
+Examples:
+    >>> cube = ResultsCube.from_mappings([{'Q1.K1': 1.0, 'Q2.K1': 2.0}, {'Q1.K1': 1.5, 'Q2.K1': 2.0}],
+    ...                                  observables={'TUNE': [0.31, 0.32]})
+    >>> cube.shape
+    (2, 1)
+    >>> cube.value('TUNE', {'Q1.K1': 1.5, 'Q2.K1': 2.0})
+    0.32
+"""
+from __future__ import annotations
+from typing import Any, Dict, Hashable, List, Mapping, Optional, Sequence, Tuple
+import copy
+import logging
+import numpy as _np
+import pandas as _pd
+from .mappings import MappedParametersType as _MappedParametersType
+from .mappings import mapping_key as _mapping_key
+from .mappings import parameter_value as _parameter_value
+
+__all__ = ['ResultsCubeException', 'ResultsCube']
+_logger = logging.getLogger(__name__)
+
+
+class ResultsCubeException(Exception):
+    """Exception raised for errors in the results cube."""
+
+    def __init__(self, m):
+        self.message = m
+
+
+def _axis(values: Sequence[Hashable]) -> List[Hashable]:
+    values = list(dict.fromkeys(values))
+    try:
+        return sorted(values)
+    except TypeError:
+        return values
+
+
+class ResultsCube:
+    """Scalar observables of a parametric scan arranged on the grid of the scan parameters."""
+
+    def __init__(self,
+                 axes: Mapping[str, Sequence[Hashable]],
+                 runs: _np.ndarray,
+                 data: Optional[Mapping[str, _np.ndarray]] = None,
+                 ):
+        """
+        Args:
+            axes: the (normalized) values of each scan parameter, indexed by parameter
+            runs: the (dense) array of the run indices (-1 for missing scan points)
+            data: the (dense) arrays of the observables, indexed by name
+        """
+        self._parameters: List[str] = list(axes.keys())
+        self._axes: Dict[str, _np.ndarray] = {p: _np.array(list(v)) for p, v in axes.items()}
+        self._runs: _np.ndarray = runs
+        self._data: Dict[str, _np.ndarray] = dict(data or {})
+        if self._runs.shape != self.shape:
+            raise ResultsCubeException("The shape of the runs array does not match the axes.")
+        for k, v in self._data.items():
+            if v.shape != self.shape:
+                raise ResultsCubeException(f"The shape of the observable {k} does not match the axes.")
+        values = {p: a.tolist() for p, a in self._axes.items()}
+        self._positions: Dict[str, Dict[Hashable, int]] = {p: {v: i for i, v in enumerate(values[p])} for p in values}
+        self._index: Dict[Tuple, Tuple[int, ...]] = {}
+        for position in zip(*_np.nonzero(self._runs >= 0)):
+            position = tuple(map(int, position))
+            mapping = {p: values[p][i] for p, i in zip(self._parameters, position) if values[p][i] is not None}
+            self._index[_mapping_key(mapping)] = position
+
+    @classmethod
+    def from_mappings(cls,
+                      mappings: Sequence[_MappedParametersType],
+                      observables: Optional[Mapping[str, Sequence[float]]] = None,
+                      ) -> ResultsCube:
+        """Build a cube from the mappings of the runs and the values of the observables for each run.
+
+        Args:
+            mappings: the mappings of the runs (the run index is the position in the list)
+            observables: the values of the observables for each run, indexed by name
+
+        Returns:
+            the results cube.
+        """
+        parameters = list(dict.fromkeys(p for m in mappings for p in m.keys()))
+        axes = {p: _axis([_parameter_value(m.get(p)) for m in mappings]) for p in parameters}
+        positions = {p: {v: i for i, v in enumerate(a)} for p, a in axes.items()}
+        shape = tuple(len(a) for a in axes.values())
+        runs = _np.full(shape, -1, dtype=int)
+        coordinates = [
+            tuple(positions[p][_parameter_value(m.get(p))] for p in parameters) for m in mappings
+        ]
+        for i, c in enumerate(coordinates):
+            if runs[c] >= 0:
+                _logger.warning(f"Duplicated scan point {mappings[i]}, run {runs[c]} replaced by run {i}.")
+            runs[c] = i
+        data = {}
+        for name, values in (observables or {}).items():
+            data[name] = _np.full(shape, _np.nan)
+            for c, v in zip(coordinates, values):
+                data[name][c] = _np.nan if v is None else v
+        return cls(axes, runs, data)
+
+    def assign(self, observables: Mapping[str, Sequence[float]]) -> ResultsCube:
+        """New cube on the same grid (sharing the axes and the hash index), with additional observables.
+
+        Args:
+            observables: the values of the observables for each run (in the order of the run indices), indexed by name
+
+        Returns:
+            the new results cube.
+        """
+        cube = copy.copy(self)
+        cube._data = dict(self._data)
+        present = self._runs >= 0
+        for name, values in observables.items():
+            v = _np.array([_np.nan if _ is None else _ for _ in values], dtype=float)
+            cube._data[name] = _np.full(self.shape, _np.nan)
+            cube._data[name][present] = v[self._runs[present]]
+        return cube
+
+    @property
+    def parameters(self) -> List[str]:
+        """The scan parameters (one per axis)."""
+        return list(self._parameters)
+
+    @property
+    def axes(self) -> Dict[str, _np.ndarray]:
+        """The (normalized) values of the scan parameters along each axis."""
+        return dict(self._axes)
+
+    @property
+    def shape(self) -> Tuple[int, ...]:
+        """The shape of the grid."""
+        return tuple(len(a) for a in self._axes.values())
+
+    @property
+    def runs(self) -> _np.ndarray:
+        """The dense array of the run indices (-1 for the missing scan points)."""
+        return self._runs
+
+    @property
+    def observables(self) -> List[str]:
+        """The names of the observables."""
+        return list(self._data.keys())
+
+    def __getitem__(self, observable: str) -> _np.ndarray:
+        """Dense array of an observable."""
+        return self._data[observable]
+
+    def __contains__(self, mapping: _MappedParametersType) -> bool:
+        return _mapping_key(mapping) in self._index
+
+    def __len__(self) -> int:
+        return len(self._index)
+
+    def position(self, mapping: _MappedParametersType) -> Tuple[int, ...]:
+        """Position of a scan point on the grid.
+
+        Args:
+            mapping: the mapping of the scan point.
+
+        Returns:
+            the indices along each axis.
+
+        Raises:
+            KeyError if the scan point is not in the cube.
+        """
+        return self._index[_mapping_key(mapping)]
+
+    def run(self, mapping: _MappedParametersType) -> int:
+        """Index of the run of a scan point."""
+        return int(self._runs[self.position(mapping)])
+
+    def value(self, observable: str, mapping: _MappedParametersType) -> float:
+        """Value of an observable at a scan point."""
+        return float(self._data[observable][self.position(mapping)])
+
+    def sel(self, selection: Mapping[str, Any]) -> ResultsCube:
+        """Slice the cube along parameter axes.
+
+        Examples:
+            >>> cube.sel({'Q1.K1': 1.5})  # doctest: +SKIP
+            >>> cube.sel({'Q2.K1': [2.0, 2.5]})  # doctest: +SKIP
+
+        Args:
+            selection: the selected value(s) of the parameters; the axis of a parameter selected by a single value is
+                       removed, the axis of a parameter selected by a list of values is restricted to these values.
+
+        Returns:
+            a new (sliced) cube.
+        """
+        indices = []
+        squeeze = []
+        axes = {}
+        for i, p in enumerate(self._parameters):
+            if p not in selection:
+                indices.append(_np.arange(len(self._axes[p])))
+                axes[p] = self._axes[p]
+            elif isinstance(selection[p], (list, tuple, _np.ndarray)):
+                indices.append(_np.array([self._positions[p][_parameter_value(v)] for v in selection[p]], dtype=int))
+                axes[p] = self._axes[p][indices[-1]]
+            else:
+                indices.append(_np.array([self._positions[p][_parameter_value(selection[p])]]))
+                squeeze.append(i)
+        index = _np.ix_(*indices)
+        return self.__class__(
+            axes,
+            self._runs[index].squeeze(axis=tuple(squeeze)),
+            {k: v[index].squeeze(axis=tuple(squeeze)) for k, v in self._data.items()},
+        )
+
+    def compare(self, observable: str, reference: _MappedParametersType) -> _np.ndarray:
+        """Difference of an observable with respect to its value at a reference scan point, for all scan points.
+
+        Args:
+            observable: the name of the observable
+            reference: the mapping of the reference scan point
+
+        Returns:
+            a dense array of the differences.
+        """
+        return self._data[observable] - self._data[observable][self.position(reference)]
+
+    def diff(self, observable: str, parameter: str) -> _np.ndarray:
+        """Differences of an observable between consecutive scan points along a parameter axis.
+
+        Args:
+            observable: the name of the observable
+            parameter: the scan parameter
+
+        Returns:
+            a dense array of the differences (one element shorter along the parameter axis).
+        """
+        return _np.diff(self._data[observable], axis=self._parameters.index(parameter))
+
+    def to_df(self) -> _pd.DataFrame:
+        """Flat representation of the cube (one row per available scan point).
+
+        Returns:
+            a dataframe indexed by the parameters, with the run index and the observables as columns.
+        """
+        available = self._runs >= 0
+        index = _pd.MultiIndex.from_arrays(
+            [a[i] for a, i in zip(self._axes.values(), _np.nonzero(available))],
+            names=self._parameters,
+        )
+        return _pd.DataFrame({
+            'RUN': self._runs[available],
+            **{k: v[available] for k, v in self._data.items()},
+        }, index=index)
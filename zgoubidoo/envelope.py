@@ -0,0 +1,186 @@
+"""Linear propagation of beam envelopes (sigma matrices) with the step-by-step transfer matrices.
+
+A single Zgoubi run with the 11 particles of `Objet5` (e.g. a `BeamTwiss`) provides the step-by-step (first-order)
+transfer matrices from the origin of the line, R(s) (see `ZgoubiResults.step_by_step_transfer_matrix`). The beam
+(sigma) matrix at any step then follows from the initial beam matrix:
+
+    Σ(s) = R(s) Σ0 R(s)^T
+
+`LinearEnvelope` evaluates this relation for all the steps at once, and for arbitrary families of initial beam
+matrices (batched matrix products), which gives the beam sizes along the line without tracking any particle
+distribution. For instance, an optimization of the beam sizes over the initial conditions requires a single Zgoubi
+run instead of one (tracking) run per candidate.
+
+The coordinates are those of the transfer matrices (see `zgoubidoo.twiss.compute_transfer_matrix`), in the order of
+`zgoubidoo.statistics.COORDINATES`.
+
+Examples:
+    >>> envelope = LinearEnvelope.from_results(zgoubi.collect())  # doctest: +SKIP
+    >>> sigma = sigma_from_twiss(beta_y=[5.0, 10.0], emit_y=1e-6, beta_z=5.0, emit_z=1e-6)  # doctest: +SKIP
+    >>> envelope.sizes(sigma)  # doctest: +SKIP
+"""
+from __future__ import annotations
+from typing import TYPE_CHECKING, List, Optional, Union
+import logging
+import numpy as _np
+import pandas as _pd
+from .statistics import COORDINATES as _COORDINATES
+from .statistics import _name
+if TYPE_CHECKING:
+    from .zgoubi import ZgoubiResults as _ZgoubiResults
+
+__all__ = ['LinearEnvelope', 'sigma_from_twiss']
+_logger = logging.getLogger(__name__)
+
+ArrayLike = Union[float, _np.ndarray, List[float]]
+"""Type alias for a scalar or an array of values (one per member of a family of initial conditions)."""
+
+
+def sigma_from_twiss(beta_y: ArrayLike = 1.0,
+                     alpha_y: ArrayLike = 0.0,
+                     emit_y: ArrayLike = 0.0,
+                     beta_z: ArrayLike = 1.0,
+                     alpha_z: ArrayLike = 0.0,
+                     emit_z: ArrayLike = 0.0,
+                     dpp_rms: ArrayLike = 0.0,
+                     disp_y: ArrayLike = 0.0,
+                     disp_yp: ArrayLike = 0.0,
+                     disp_z: ArrayLike = 0.0,
+                     disp_zp: ArrayLike = 0.0,
+                     ) -> _np.ndarray:
+    """Beam (sigma) matrices of uncoupled beams defined by their Twiss parameters, emittances and momentum spread.
+
+    The arguments can be arrays (broadcast together), to define a family of beam matrices.
+
+    Args:
+        beta_y: horizontal beta function
+        alpha_y: horizontal alpha function
+        emit_y: horizontal (geometrical) emittance
+        beta_z: vertical beta function
+        alpha_z: vertical alpha function
+        emit_z: vertical (geometrical) emittance
+        dpp_rms: rms momentum spread
+        disp_y: horizontal dispersion
+        disp_yp: horizontal dispersion prime
+        disp_z: vertical dispersion
+        disp_zp: vertical dispersion prime
+
+    Returns:
+        the beam matrices (array of shape (..., 5, 5), following the broadcast shape of the arguments).
+    """
+    beta_y, alpha_y, emit_y, beta_z, alpha_z, emit_z, dpp_rms, disp_y, disp_yp, disp_z, disp_zp = _np.broadcast_arrays(
+        *[_np.asarray(_, dtype=float) for _ in (beta_y, alpha_y, emit_y, beta_z, alpha_z, emit_z,
+                                                 dpp_rms, disp_y, disp_yp, disp_z, disp_zp)]
+    )
+    sigma = _np.zeros(beta_y.shape + (5, 5))
+    for i, (beta, alpha, emit) in ((0, (beta_y, alpha_y, emit_y)), (2, (beta_z, alpha_z, emit_z))):
+        sigma[..., i, i] = beta * emit
+        sigma[..., i, i + 1] = sigma[..., i + 1, i] = -alpha * emit
+        sigma[..., i + 1, i + 1] = (1 + alpha ** 2) / beta * emit
+    dispersion = _np.stack([disp_y, disp_yp, disp_z, disp_zp, _np.ones_like(disp_y)], axis=-1)
+    return sigma + dpp_rms[..., None, None] ** 2 * dispersion[..., :, None] * dispersion[..., None, :]
+
+
+class LinearEnvelope:
+    """Linear propagation of beam matrices with the step-by-step transfer matrices."""
+
+    def __init__(self, transfer_matrix: _pd.DataFrame):
+        """
+        Args:
+            transfer_matrix: the step-by-step transfer matrices (see `zgoubidoo.twiss.compute_transfer_matrix`)
+        """
+        n = len(_COORDINATES)
+        self._steps: _pd.DataFrame = transfer_matrix[
+            [c for c in ('S', 'LABEL1', 'KEYWORD') if c in transfer_matrix.columns]
+        ].reset_index(drop=True)
+        self._matrices: _np.ndarray = _np.stack([
+            transfer_matrix[[f"R{i + 1}{j + 1}" for j in range(n)]].values for i in range(n)
+        ], axis=1)
+
+    @classmethod
+    def from_results(cls, results: _ZgoubiResults) -> LinearEnvelope:
+        """Linear envelope from the results of a Zgoubi run with the 11 particles of `Objet5` (e.g. `BeamTwiss`).
+
+        Args:
+            results: the results of the run
+
+        Returns:
+            the linear envelope.
+        """
+        return cls(results.step_by_step_transfer_matrix)
+
+    @property
+    def matrices(self) -> _np.ndarray:
+        """The transfer matrices from the origin to each step (array of shape (n_steps, 5, 5))."""
+        return self._matrices
+
+    @property
+    def steps(self) -> _pd.DataFrame:
+        """The position (`S`) and element (`LABEL1`, `KEYWORD`) of each step."""
+        return self._steps
+
+    def __len__(self) -> int:
+        return self._matrices.shape[0]
+
+    def propagate(self, sigma: _np.ndarray, steps: Optional[_np.ndarray] = None) -> _np.ndarray:
+        """Beam matrices along the line.
+
+        Args:
+            sigma: the initial beam matrix, or a family of initial beam matrices (array of shape (..., 5, 5))
+            steps: the indices (or a boolean mask) of the steps (default: all the steps)
+
+        Returns:
+            the beam matrices (array of shape (..., n_steps, 5, 5)).
+        """
+        r = self._matrices if steps is None else self._matrices[steps]
+        sigma = _np.asarray(sigma, dtype=float)[..., None, :, :]
+        return r @ sigma @ r.transpose(0, 2, 1)
+
+    def propagate_centroid(self, centroid: _np.ndarray, steps: Optional[_np.ndarray] = None) -> _np.ndarray:
+        """Beam centroids along the line.
+
+        Args:
+            centroid: the initial centroid, or a family of initial centroids (array of shape (..., 5))
+            steps: the indices (or a boolean mask) of the steps (default: all the steps)
+
+        Returns:
+            the centroids (array of shape (..., n_steps, 5)).
+        """
+        r = self._matrices if steps is None else self._matrices[steps]
+        return _np.einsum('nij,...j->...ni', r, _np.asarray(centroid, dtype=float))
+
+    def sizes(self, sigma: _np.ndarray, steps: Optional[_np.ndarray] = None) -> _np.ndarray:
+        """Rms beam sizes (square roots of the diagonal of the beam matrices) along the line.
+
+        Only the diagonal of the beam matrices is computed, which is much cheaper for large families of initial beam
+        matrices than `propagate`.
+
+        Args:
+            sigma: the initial beam matrix, or a family of initial beam matrices (array of shape (..., 5, 5))
+            steps: the indices (or a boolean mask) of the steps (default: all the steps)
+
+        Returns:
+            the rms sizes in each coordinate (array of shape (..., n_steps, 5)).
+        """
+        r = self._matrices if steps is None else self._matrices[steps]
+        diagonal = _np.einsum('nij,...jk,nik->...ni', r, _np.asarray(sigma, dtype=float), r, optimize=True)
+        return _np.sqrt(_np.clip(diagonal, 0, None))
+
+    def to_df(self, sigma: _np.ndarray) -> _pd.DataFrame:
+        """Beam matrix elements and rms sizes along the line, for a single initial beam matrix.
+
+        Args:
+            sigma: the initial beam matrix (array of shape (5, 5))
+
+        Returns:
+            a dataframe with the position and element of each step, the elements of the beam matrix (`SIGMA_Y_Y`,
+            `SIGMA_Y_T`, ..., `SIGMA_D_D`, as in `zgoubidoo.statistics`) and the rms sizes (`SIZE_Y`, ..., `SIZE_D`).
+        """
+        s = self.propagate(sigma)
+        df = self._steps.copy()
+        for i, a in enumerate(_COORDINATES):
+            for j, b in enumerate(_COORDINATES[i:], start=i):
+                df[f"SIGMA_{_name(a)}_{_name(b)}"] = s[:, i, j]
+        for i, a in enumerate(_COORDINATES):
+            df[f"SIZE_{_name(a)}"] = _np.sqrt(_np.clip(s[:, i, i], 0, None))
+        return df
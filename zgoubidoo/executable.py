@@ -1,9 +1,18 @@
 """Provides an interface to run Zgoubi from Python; supports multiprocessing and concurrent programming.
 
+All the executables share a process-wide `ExecutionGovernor` (see `governor`), which caps the total number of
+subprocesses running concurrently, whatever the number of `Executable` instances (e.g. nested workflows creating their
+own `Zgoubi` instances).
 """
 from __future__ import annotations
-from typing import TYPE_CHECKING, Dict, List, Optional, Callable, Union
+from typing import TYPE_CHECKING, Dict, List, Mapping, Optional, Callable, Pattern, Union
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+import heapq
+import itertools
 import logging
+import threading
+import time
 import shutil
 import tempfile
 import os
@@ -14,12 +23,15 @@ import multiprocessing
 from concurrent.futures import ThreadPoolExecutor as _ThreadPoolExecutor
 from concurrent.futures import Future as _Future
 import subprocess as sub
+from .retention import OutputRetention as _OutputRetention
+from . import retention as _retention
+from .workspaces import Workspace as _Workspace
 if TYPE_CHECKING:
     from .input import Input
     from .mappings import MappedParametersType as _MappedParametersType
     from .mappings import MappedParametersListType as _MappedParametersListType
 
-__all__ = ['Executable', 'ResultsType']
+__all__ = ['Executable', 'ResultsType', 'ExecutionGovernor', 'governor', 'RunProgress', 'PROGRESS_PATTERNS']
 _logger = logging.getLogger(__name__)
 
 
@@ -30,6 +42,118 @@ class ExecutableException(Exception):
         self.message = m
 
 
+class ExecutionGovernor:
+    """Process-wide pool of execution tokens.
+
+    Each subprocess run by an `Executable` holds a token from the governor for the duration of its execution; the total
+    number of concurrent subprocesses is thus capped, whatever the number of `Executable` instances and of their
+    workers. Waiting requests are served by order of priority (highest first), then in order of arrival: a high
+    priority run (e.g. an interactive fit) gets the next free token before any queued low priority run (e.g. a
+    background scan). Running subprocesses are never interrupted.
+
+    Examples:
+        >>> g = ExecutionGovernor(max_concurrency=2)
+        >>> with g.token(priority=10):
+        ...     g.running
+        1
+    """
+
+    def __init__(self, max_concurrency: Optional[int] = None):
+        """
+        Args:
+            max_concurrency: maximum number of concurrent subprocesses (default to `multiprocessing.cpu_count`).
+        """
+        self._max_concurrency: int = max_concurrency or multiprocessing.cpu_count()
+        self._running: int = 0
+        self._waiting: List = []
+        self._counter = itertools.count()
+        self._condition: threading.Condition = threading.Condition()
+
+    @property
+    def max_concurrency(self) -> int:
+        """Maximum number of concurrent subprocesses."""
+        return self._max_concurrency
+
+    @max_concurrency.setter
+    def max_concurrency(self, n: int):
+        if n < 1:
+            raise ExecutableException("The maximum concurrency must be at least 1.")
+        with self._condition:
+            self._max_concurrency = n
+            self._condition.notify_all()
+
+    @property
+    def running(self) -> int:
+        """Number of tokens currently in use."""
+        return self._running
+
+    @property
+    def waiting(self) -> int:
+        """Number of requests waiting for a token."""
+        return len(self._waiting)
+
+    def acquire(self, priority: int = 0, timeout: Optional[float] = None) -> bool:
+        """Wait for a token (blocking).
+
+        A request whose wait is interrupted (timeout or exception, e.g. `KeyboardInterrupt`) is withdrawn from the
+        queue, so that it does not block the following requests.
+
+        Args:
+            priority: priority of the request (higher values are served first).
+            timeout: maximum waiting time in seconds (default: no limit).
+
+        Returns:
+            True if the token is acquired, False if the timeout expired.
+        """
+        with self._condition:
+            request = (-priority, next(self._counter))
+            heapq.heappush(self._waiting, request)
+            deadline = None if timeout is None else time.monotonic() + timeout
+            try:
+                while self._waiting[0] != request or self._running >= self._max_concurrency:
+                    remaining = None if deadline is None else deadline - time.monotonic()
+                    if remaining is not None and remaining <= 0:
+                        self._withdraw(request)
+                        return False
+                    self._condition.wait(remaining)
+            except BaseException:
+                self._withdraw(request)
+                raise
+            heapq.heappop(self._waiting)
+            self._running += 1
+            self._condition.notify_all()
+            return True
+
+    def _withdraw(self, request):
+        """Remove a waiting request from the queue (the condition lock must be held)."""
+        self._waiting.remove(request)
+        heapq.heapify(self._waiting)
+        self._condition.notify_all()
+
+    def release(self):
+        """Release a token."""
+        with self._condition:
+            self._running -= 1
+            self._condition.notify_all()
+
+    @contextmanager
+    def token(self, priority: int = 0):
+        """Context manager holding a token for the duration of the context.
+
+        Args:
+            priority: priority of the request (higher values are served first).
+        """
+        self.acquire(priority)
+        try:
+            yield self
+        finally:
+            self.release()
+
+
+governor: ExecutionGovernor = ExecutionGovernor()
+"""Process-wide execution governor shared by all the executables."""
+
+
 class ResultsType(type):
     """TODO"""
     pass
@@ -42,6 +166,65 @@ class ExecutableResults(metaclass=ResultsType):
         return
 
 
+PROGRESS_PATTERNS: Dict[str, Pattern] = {
+    'pass': re.compile(r"pass\s*#[^\d]*(\d+)(?:\s*/\s*(\d+))?", re.IGNORECASE),
+    'iteration': re.compile(r"iteration\s*#?\s*[:=]?\s*(\d+)(?:\s*/\s*(\d+))?", re.IGNORECASE),
+}
+"""Patterns of the progress lines printed by Zgoubi on the standard output: current pass (and requested number of
+passes) of a `Rebelote` loop and current iteration (and maximum number of iterations) of a `Fit`."""
+
+
+@dataclass
+class RunProgress:
+    """Progress of a run, updated live from the standard output of the subprocess."""
+    mapping: Mapping
+    path: str
+    started: float = field(default_factory=time.monotonic)
+    updated: float = field(default_factory=time.monotonic)
+    lines: int = 0
+    ipass: Optional[int] = None
+    npass: Optional[int] = None
+    iteration: Optional[int] = None
+    max_iterations: Optional[int] = None
+    last_line: str = ''
+    finished: bool = False
+    process: Optional[sub.Popen] = field(default=None, repr=False, compare=False)
+
+    @property
+    def elapsed(self) -> float:
+        """Time (in seconds) since the start of the run."""
+        return time.monotonic() - self.started
+
+    @property
+    def idle(self) -> float:
+        """Time (in seconds) since the last line printed by the run."""
+        return time.monotonic() - self.updated
+
+    def update(self, line: str) -> bool:
+        """Update the progress from a line of the standard output.
+
+        Args:
+            line: the line printed by the run.
+
+        Returns:
+            True if the line reports a progress (new pass or iteration).
+        """
+        self.lines += 1
+        self.updated = time.monotonic()
+        self.last_line = line
+        m = PROGRESS_PATTERNS['pass'].search(line)
+        if m is not None:
+            self.ipass = int(m.group(1))
+            self.npass = int(m.group(2)) if m.group(2) else self.npass
+            return True
+        m = PROGRESS_PATTERNS['iteration'].search(line)
+        if m is not None:
+            self.iteration = int(m.group(1))
+            self.max_iterations = int(m.group(2)) if m.group(2) else self.max_iterations
+            return True
+        return False
+
+
 class Executable:
     """High level interface to run Zgoubi from Python."""
     INPUT_FILENAME: str = ''
@@ -50,21 +233,57 @@ class Executable:
     COMMAND_ARGUMENT: bool = False
     """A flag to indicate if the input file name must be used as an argument to the command."""
 
-    def __init__(self, executable: str, results_type: ResultsType, path: str = None, n_procs: Optional[int] = None):
+    UNBUFFERED_ENVIRONMENT: Dict[str, str] = {'GFORTRAN_UNBUFFERED_PRECONNECTED': 'y'}
+    """Environment variables making the standard output of the subprocess unbuffered (gfortran runtime)."""
+
+    def __init__(self,
+                 executable: str,
+                 results_type: ResultsType,
+                 path: str = None,
+                 n_procs: Optional[int] = None,
+                 priority: int = 0,
+                 execution_governor: Optional[ExecutionGovernor] = None,
+                 retention: Optional[_OutputRetention] = None,
+                 progress_callback: Optional[Callable[[RunProgress], None]] = None,
+                 unbuffered: bool = True,
+                 ):
         """
+        The standard output of the runs is streamed line by line during the execution: the progress of the running
+        runs (current pass of a `Rebelote` loop, iteration of a `Fit`) is available with `progress`, and reported to
+        the progress callback (called from the worker threads), while runs which have not printed anything for a given
+        time can be found with `stalled` (and terminated with `terminate`).
 
+        The gfortran runtime buffers the standard output by blocks when it is written to a pipe, in which case the
+        lines would only be received by bursts (or at the end of the run). The runs are therefore started with an
+        unbuffered standard output (see `UNBUFFERED_ENVIRONMENT`); `stalled` is only available in that case, as a
+        buffered run can be silent for a long time while being healthy.
 
         Args:
             - executable: name of the executable
             - results_type:
             - path: path to the Zgoubi executable
-            - n_procs: maximum number of Zgoubi simulations to be started in parallel
+            - n_procs: maximum number of Zgoubi simulations to be started in parallel by this instance (the total number
+              of concurrent simulations is capped by the execution governor)
+            - priority: default priority of the runs with respect to the runs of the other instances
+            - execution_governor: the execution governor (default to the process-wide governor)
+            - retention: retention policy for the raw outputs (default to the process-wide policy, see
+              `zgoubidoo.retention`)
+            - progress_callback: callable called with the `RunProgress` of a run at its start, at each new pass or
+              iteration and at its end
+            - unbuffered: run the subprocesses with an unbuffered standard output (see `UNBUFFERED_ENVIRONMENT`)
 
         """
         self._executable: str = executable
         self._results_type: ResultsType = results_type
         self._n_procs: int = n_procs or multiprocessing.cpu_count()
         self._path: Optional[str] = path
+        self._priority: int = priority
+        self._governor: ExecutionGovernor = execution_governor or governor
+        self._retention: _OutputRetention = retention or _retention.output_retention
+        self._progress_callback: Optional[Callable[[RunProgress], None]] = progress_callback
+        self._unbuffered: bool = unbuffered
+        self._progress: Dict[str, RunProgress] = dict()
+        self._progress_lock: threading.Lock = threading.Lock()
         self._futures: Dict[str, _Future] = dict()
         self._pool: _ThreadPoolExecutor = _ThreadPoolExecutor(max_workers=self._n_procs)
 
@@ -88,6 +307,7 @@ class Executable:
                  cb: Callable = None,
                  filename: str = None,
                  path: Optional[str] = None,
+                 priority: Optional[int] = None,
                  ) -> Executable:
         """
         Execute up to `n_procs` Zgoubi runs.
@@ -98,6 +318,7 @@ class Executable:
             mappings: TODO
             debug: verbose parent
             (default to `multiprocessing.cpu_count`)
+            priority: priority of the runs (default to the priority of the instance)
 
         Returns:
             a ZgoubiResults object holding the simulation results.
@@ -120,6 +341,7 @@ class Executable:
                 code_input,
                 path[1],
                 debug,
+                self._priority if priority is None else priority,
             )
             if cb is not None:
                 future.add_done_callback(cb)
@@ -127,6 +349,65 @@ class Executable:
             paths[i] = (path[0], path[1], True)  # Mark that path as already executed
         return self
 
+    @property
+    def progress(self) -> List[RunProgress]:
+        """Progress of the runs currently executing."""
+        with self._progress_lock:
+            return list(self._progress.values())
+
+    def stalled(self, timeout: float) -> List[RunProgress]:
+        """Runs currently executing which have not printed anything on their standard output for a given time.
+
+        Args:
+            timeout: the time (in seconds) after which a silent run is considered as stalled.
+
+        Returns:
+            the progress of the stalled runs.
+
+        Raises:
+            ExecutableException if the standard output of the runs is buffered (see the `unbuffered` option).
+        """
+        if not self._unbuffered:
+            raise ExecutableException("Stalled runs cannot be detected when the standard output is buffered.")
+        return [p for p in self.progress if p.idle > timeout]
+
+    def terminate(self, progress: RunProgress):
+        """Terminate a running subprocess (e.g. a stalled run); its results will be incomplete.
+
+        Args:
+            progress: the progress of the run.
+        """
+        if progress.process is not None and progress.process.poll() is None:
+            _logger.warning(f"Terminating the process in {progress.path} for mapping {progress.mapping}.")
+            progress.process.terminate()
+
+    def _notify(self, progress: RunProgress):
+        if self._progress_callback is not None:
+            try:
+                self._progress_callback(progress)
+            except Exception as e:
+                _logger.warning(f"Progress callback failed: {e}")
+
+    def _stream(self, proc: sub.Popen, progress: RunProgress) -> bytes:
+        """Read the standard output of a subprocess line by line, updating the progress of the run."""
+        with self._progress_lock:
+            self._progress[progress.path] = progress
+        self._notify(progress)
+        proc.stdin.close()
+        lines = []
+        try:
+            for line in iter(proc.stdout.readline, b''):
+                lines.append(line)
+                if progress.update(line.decode(errors='replace').strip()):
+                    self._notify(progress)
+            proc.wait()
+        finally:
+            with self._progress_lock:
+                self._progress.pop(progress.path, None)
+        progress.finished = True
+        self._notify(progress)
+        return b''.join(lines)
+
     def wait(self):
         """
         TODO
@@ -160,17 +441,20 @@ class Executable:
                  mapping: _MappedParametersType,
                  code_input: Input,
                  path: Union[str, tempfile.TemporaryDirectory] = '.',
-                 debug=False
+                 debug=False,
+                 priority: int = 0,
                  ) -> dict:
         """Run Zgoubi as a subprocess.
 
-        Zgoubi is run as a subprocess; the standard IOs are piped to the Python process and retrieved.
+        Zgoubi is run as a subprocess; the standard IOs are piped to the Python process and the standard output is
+        read line by line during the run (see `RunProgress`).
 
         Args:
             code_input: Zgoubi input physics (used after the run to process the parent of each element).
             path: path to the input file.
             mapping: TODO
             debug: verbose parent.
+            priority: priority of the run for the execution governor.
 
         Returns:
             a dictionary holding the results of the run.
@@ -183,18 +467,24 @@ class Executable:
             p = path.name  # Path from a TemporaryDirectory
         except AttributeError:
             p = path  # p is a string
-        proc = sub.Popen([x for x in
-                          [self.executable, self.INPUT_FILENAME if self.COMMAND_ARGUMENT else None] if x is not None
-                          ],
-                         stdin=sub.PIPE,
-                         stdout=sub.PIPE,
-                         stderr=sub.STDOUT,
-                         cwd=p,
-                         )
-
-        # Run
-        _logger.info(f"Zgoubi process in {path} has started for mapping {mapping}.")
-        output = proc.communicate()
+        with self._governor.token(priority):
+            proc = sub.Popen([x for x in
+                              [self.executable, self.INPUT_FILENAME if self.COMMAND_ARGUMENT else None] if x is not None
+                              ],
+                             stdin=sub.PIPE,
+                             stdout=sub.PIPE,
+                             stderr=sub.STDOUT,
+                             cwd=p,
+                             env={**os.environ, **self.UNBUFFERED_ENVIRONMENT} if self._unbuffered else None,
+                             )
+
+            # Run
+            _logger.info(f"Zgoubi process in {path} has started for mapping {mapping}.")
+            output = (self._stream(proc, RunProgress(mapping=mapping, path=p, process=proc)), None)
+
+        # Account for the outputs of a RAM workspace (moved to disk if the RAM budget is exceeded)
+        if isinstance(path, _Workspace):
+            p = path.settle()
 
         # Collect STDERR
         if output[1] is not None:
@@ -203,6 +493,9 @@ class Executable:
         # Extract element by element parent
         result = self._extract_output(path=p, code_input=code_input, mapping=mapping)
 
+        # Parse (and reduce) the other outputs while the other runs are still executing
+        processed = self._process_outputs(path=p, mapping=mapping)
+
         # Extract CPU time
         cputime = -1.0
         if stderr is None:
@@ -214,18 +507,23 @@ class Executable:
             print(output[0].decode())
         _logger.info(f"Zgoubi process in {path} for mapping {mapping} finished in {cputime} s.")
         return {
-            'stdout': output[0].decode().split('\n'),
+            'stdout': self._retention.retain(output[0].decode().split('\n')),
             'stderr': stderr,
             'cputime': cputime,
-            'result': result,
+            'result': self._retention.retain(result),
             'input': code_input,
             'path': path,
             'mapping': mapping,
+            **processed,
         }
 
     def _extract_output(self, path, code_input: Input, mapping) -> Optional[_IOBase]:
         return None
 
+    def _process_outputs(self, path: str, mapping: _MappedParametersType) -> dict:
+        """Post-processing of the outputs, done by the worker after the run (to be overridden, nothing by default)."""
+        return {}
+
     def _get_exec(self, path: Optional[str] = None) -> str:
         """Retrive the path to the Zgoubi executable.
 
@@ -1,2 +1,3 @@
 """Field map manipulations module."""
 from .fieldmap import FieldMap, EngeModel
+from .profiles import FieldProfile, EngeFit, fit_field_profiles
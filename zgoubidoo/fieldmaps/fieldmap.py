@@ -1,11 +1,54 @@
 """Field map module."""
-from typing import Optional, Union, Tuple
+from typing import Callable, Dict, List, Mapping, Optional, Sequence, Union, Tuple
+import hashlib
+import multiprocessing
 import os
+import tempfile
 import lmfit
 import numpy as _np
 import pandas as _pd
 from scipy import interpolate
+from concurrent.futures import ProcessPoolExecutor as _ProcessPoolExecutor
 from lmfit import Model as _Model
+from ..assets import file_stamp as _file_stamp
+
+FIELDMAP_COLUMNS: List[str] = ['X', 'Y', 'Z', 'BX', 'BY', 'BZ', 'MATCODE']
+"""Columns of the field map data."""
+
+FIELDMAP_CACHE_PATH: str = os.environ.get(
+    'ZGOUBIDOO_FIELDMAP_CACHE',
+    os.path.join(os.path.expanduser('~'), '.cache', 'zgoubidoo', 'fieldmaps'),
+)
+"""Default directory of the binary cache of the field maps."""
+
+FIELDMAP_AXES: Dict[str, int] = {'X': 0, 'Y': 1, 'Z': 2}
+"""Index of the axes (and of the field components along the axes) in the field map data."""
+
+FIELDMAP_SYMMETRIES: Dict[str, Tuple[int, int]] = {
+    'mirror': (1, -1),
+    'antimirror': (-1, 1),
+}
+"""Parity of the field components (normal to, tangential to the symmetry plane) for the supported symmetries.
+
+With a 'mirror' symmetry (e.g. mid-plane symmetry with respect to the vertical axis, or left-right symmetry of a
+quadrupole) the normal component is even and the tangential components are odd; the parities are reversed with an
+'antimirror' symmetry (e.g. left-right symmetry of a dipole).
+"""
+
+ZGOUBI_BINARY_PREFIX: str = 'b_'
+"""Prefix of the names of the binary field map files (Zgoubi reads such files as unformatted binary files)."""
+
+ZGOUBI_HEADER_LINES: int = 8
+"""Number of header lines of the (text) field map files read by Zgoubi (TOSCA format)."""
+
+EXPORT_SLAB_POINTS: int = 2 ** 20
+"""Approximate number of mesh points sampled (and written) at once by the streaming export (see `FieldMap.export`)."""
+
+EXPORT_FORMATS: List[str] = ['bdsim', 'zgoubi']
+"""Formats supported by the streaming export."""
+
+_export_field_map: Optional['FieldMap'] = None
+"""Field map sampled by the processes of the streaming export (set once per process by `_export_init`)."""
 
 
 def load_mesh_data(file: str, path: str = '.'):
@@ -21,7 +64,7 @@ def load_mesh_data(file: str, path: str = '.'):
     """
     with open(os.path.join(path, file)) as f:
         _, x_dim, y_dim, z_dim, _, _ = tuple(map(int, f.readline().split()))
-        data = _np.array(list(map(float, ' '.join(f.readlines()).split())))
+        data = _np.fromstring(f.read(), sep=' ')
     x = data[0:x_dim]
     y = data[x_dim:x_dim + y_dim]
     z = data[x_dim + y_dim:x_dim + y_dim + z_dim]
@@ -75,6 +118,82 @@ def load_opera_fieldmap(file: str, path: str = '.') -> _pd.DataFrame:
     ])
 
 
+def load_cached_fieldmap(files: Sequence[str],
+                         loader: Callable[[], _pd.DataFrame],
+                         path: str = '.',
+                         cache_path: Optional[str] = None,
+                         ) -> _pd.DataFrame:
+    """Load a field map through a binary cache keyed by the path, size and modification time of its source files.
+
+    On the first load the field map is parsed (using `loader`) and stored as a binary `.npy` file in the cache
+    directory; subsequent loads memory-map the binary file (copy-on-write: the pages are shared between the processes
+    loading the same field map, while modifications of the data remain private to each process). The source files are
+    not read on subsequent loads. The cache is not bounded: entries of modified source files are not removed.
+
+    Args:
+        files: the source files of the field map
+        loader: the function parsing the source files (called if the field map is not in the cache)
+        path: path to the source files
+        cache_path: the cache directory (default: `FIELDMAP_CACHE_PATH`)
+
+    Returns:
+        A DataFrame containing the mesh points and the associated field values.
+    """
+    cache_path = cache_path or FIELDMAP_CACHE_PATH
+    key = hashlib.sha256(' '.join(
+        [getattr(loader, '__qualname__', repr(loader))] + [_file_stamp(os.path.join(path, f)) for f in files]
+    ).encode()).hexdigest()
+    filename = os.path.join(cache_path, f"{key}.npy")
+    if not os.path.isfile(filename):
+        data = loader()[FIELDMAP_COLUMNS].values.astype(_np.float64)
+        os.makedirs(cache_path, exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=cache_path, suffix='.npy')
+        with os.fdopen(fd, 'wb') as f:
+            _np.save(f, data)
+        os.replace(tmp, filename)
+    return _pd.DataFrame(_np.load(filename, mmap_mode='c'), columns=FIELDMAP_COLUMNS, copy=False)
+
+
+def _zgoubi_header(nx: int, ny: int, nz: int) -> str:
+    """Header of a (text) field map file read by Zgoubi."""
+    header = [f"{nx} {ny} {nz} 2"]
+    header += [f"{i + 1} {c}" for i, c in enumerate(FIELDMAP_COLUMNS[:6])]
+    header += ['0']
+    return '\n'.join(header) + '\n'
+
+
+def _write_nodes(f, data: _np.array, binary: bool = False):
+    """Write field map nodes (X, Y, Z, BX, BY, BZ), as text lines or as FORTRAN unformatted records."""
+    if binary:
+        records = _np.empty(len(data), dtype=[('head', '<i4'), ('values', '<f8', 6), ('tail', '<i4')])
+        records['head'] = records['tail'] = 6 * 8
+        records['values'] = data
+        records.tofile(f)
+    else:
+        _np.savetxt(f, data, fmt='%.10e')
+
+
+def _export_init(field_map: 'FieldMap'):
+    """Initialize a process of the streaming export (the field map is sent once per process)."""
+    global _export_field_map
+    _export_field_map = field_map
+
+
+def _export_slab(axes: Tuple[_np.array, _np.array, _np.array], order: Tuple[int, int, int], method: str) -> _np.array:
+    """Sample a slab of the export mesh (the first axis of `order` varies slowest, the last one fastest)."""
+    mesh = _np.meshgrid(*[axes[i] for i in order], indexing='ij')
+    points = _np.empty((mesh[0].size, 6))
+    for i, m in zip(order, mesh):
+        points[:, i] = m.ravel()
+    field_map = _export_field_map
+    if field_map.grid is not None:
+        points[:, 3:] = field_map._sample_grid(points[:, :3], ('BX', 'BY', 'BZ'), method)
+    else:
+        for i, c in enumerate(('BX', 'BY', 'BZ')):
+            points[:, 3 + i] = field_map.sample(points[:, :3], field_component=c, method=method)
+    return points
+
+
 def enge(s: Union[float, _np.array],
          ce_0: float = 0.0,
          ce_1: float = 1.0,
@@ -149,35 +268,56 @@ class FieldMap:
     """
     TODO
     """
-    def __init__(self, field_map: _pd.DataFrame):
+    def __init__(self, field_map: _pd.DataFrame, symmetries: Optional[Mapping[str, str]] = None):
         """
 
         Args:
             field_map:
+            symmetries: the symmetries of a compact field map (see `compact`), indexed by axis ('X', 'Y' or 'Z')
         """
         self._data = field_map
+        self._symmetries: Dict[str, str] = dict(symmetries or {})
+        for axis, symmetry in self._symmetries.items():
+            if axis not in FIELDMAP_AXES or symmetry not in FIELDMAP_SYMMETRIES:
+                raise ValueError(f"Invalid symmetry '{symmetry}' along axis '{axis}'.")
         self._reference_trajectory: Optional[_np.array] = None
         self._field_profile_fit: Optional[_np.array] = None
+        self._grid: Union[None, bool, Tuple[Tuple[_np.array, ...], _np.array]] = None  # False if not regular
+        self._interpolators: Dict[Tuple[Tuple[str, ...], str],
+                                  Tuple[List[int], interpolate.RegularGridInterpolator]] = {}
+        self._hash: Optional[str] = None
 
     def __repr__(self):
         return self._data.__repr__()
 
     @classmethod
-    def load_from_opera(cls, file: str, path: str = '.'):
+    def load_from_opera(cls, file: str, path: str = '.', cache: bool = False, cache_path: Optional[str] = None):
         """
         Factory method to load a field map from a Opera parent file.
 
         Args:
             file: the file containing the field map data
             path: path to the field mpa data file
+            cache: use the binary cache of the field maps (opt-in, see `load_cached_fieldmap`)
+            cache_path: the cache directory (default: `FIELDMAP_CACHE_PATH`)
 
         Returns:
             A FieldMap loaded from file.
         """
-        return cls(field_map=load_opera_fieldmap(file=file, path=path))
+        def _load():
+            return load_opera_fieldmap(file=file, path=path)
+        if cache:
+            return cls(field_map=load_cached_fieldmap([file], _load, path=path, cache_path=cache_path))
+        return cls(field_map=_load())
 
     @classmethod
-    def load_from_opera_with_mesh(cls, field_file: str, mesh_file: str, path: str = '.'):
+    def load_from_opera_with_mesh(cls,
+                                  field_file: str,
+                                  mesh_file: str,
+                                  path: str = '.',
+                                  cache: bool = False,
+                                  cache_path: Optional[str] = None,
+                                  ):
         """
         Factory method to load a field map from Opera parent files (field map and mesh definition).
 
@@ -185,17 +325,109 @@ class FieldMap:
             field_file: the file containing the field map data
             mesh_file: the file containing the mesh data
             path: path to the field mpa data files
+            cache: use the binary cache of the field maps (opt-in, see `load_cached_fieldmap`)
+            cache_path: the cache directory (default: `FIELDMAP_CACHE_PATH`)
 
         Returns:
             A FieldMap loaded from files.
         """
-        return cls(field_map=load_opera_fieldmap_with_mesh(field_file=field_file, mesh_file=mesh_file, path=path))
+        def _load():
+            return load_opera_fieldmap_with_mesh(field_file=field_file, mesh_file=mesh_file, path=path)
+        if cache:
+            return cls(field_map=load_cached_fieldmap([field_file, mesh_file], _load, path=path, cache_path=cache_path))
+        return cls(field_map=_load())
 
     @property
     def df(self):
-        """Field map dataframe."""
+        """Field map dataframe (only the fundamental domain for a compact field map, see `expand`)."""
         return self._data
 
+    @property
+    def symmetries(self) -> Dict[str, str]:
+        """The symmetries of the field map (empty if the field map is not compact)."""
+        return dict(self._symmetries)
+
+    def compact(self,
+                symmetries: Mapping[str, str],
+                dtype: Optional[_np.dtype] = _np.float32,
+                tolerance: Optional[float] = None,
+                ) -> 'FieldMap':
+        """
+        Compact representation of the field map, storing only its fundamental domain.
+
+        Only the points with non-negative coordinates along the symmetry axes are kept; the full field is
+        reconstructed on the fly when sampling or exporting the field map. The symmetry planes are the planes of zero
+        coordinate along the symmetry axes (see `translate`). The memory usage is divided by 2 (one symmetry) or 4 (two
+        symmetries), and further reduced by storing the field components in single precision.
+
+        Examples:
+            >>> fm = FieldMap.load_from_opera('quadrupole.table')  # doctest: +SKIP
+            >>> compact = fm.compact({'X': 'mirror', 'Y': 'mirror'})  # doctest: +SKIP
+
+        Args:
+            symmetries: the symmetries ('mirror' or 'antimirror', see `FIELDMAP_SYMMETRIES`), indexed by axis
+            dtype: the data type used to store the field components (None to keep the data type); the coordinates
+                   are kept unchanged, so that `expand` restores the original mesh
+            tolerance: maximum deviation of the field from the symmetries, checked on regular meshes (no check if None)
+
+        Returns:
+            a new (compact) field map.
+        """
+        symmetries = {**self._symmetries, **symmetries}
+        if tolerance is not None and self.grid is not None:
+            axes, values = self.grid
+            for axis, symmetry in symmetries.items():
+                a = FIELDMAP_AXES[axis]
+                if not _np.allclose(axes[a], -axes[a][::-1]):
+                    raise ValueError(f"The mesh is not symmetric along axis '{axis}'.")
+                signs = self._symmetry_signs(a, symmetry)
+                if _np.abs(_np.flip(values, axis=a) * signs - values).max() > tolerance:
+                    raise ValueError(f"The field map does not have a '{symmetry}' symmetry along axis '{axis}'.")
+        domain = self._data[(self._data[list(symmetries.keys())] >= 0).all(axis=1)]
+        if dtype is not None:
+            domain = domain.astype({c: dtype for c in ('BX', 'BY', 'BZ')})
+        return self.__class__(domain.reset_index(drop=True), symmetries=symmetries)
+
+    def expand(self, dtype: Optional[_np.dtype] = _np.float64) -> 'FieldMap':
+        """
+        Full field map reconstructed from a compact field map (see `compact`).
+
+        Args:
+            dtype: the data type of the full field map (None to keep the data type)
+
+        Returns:
+            a new field map.
+        """
+        df = self._data
+        for axis, symmetry in self._symmetries.items():
+            a = FIELDMAP_AXES[axis]
+            mirrored = df[df[axis] != 0].copy()
+            mirrored[axis] *= -1
+            mirrored[['BX', 'BY', 'BZ']] *= self._symmetry_signs(a, symmetry).astype(mirrored['BX'].dtype)
+            df = _pd.concat([mirrored, df], ignore_index=True)
+        if dtype is not None:
+            df = df.astype(dtype)
+        return self.__class__(df.sort_values(['X', 'Y', 'Z']).reset_index(drop=True))
+
+    @staticmethod
+    def _symmetry_signs(axis: int, symmetry: str) -> _np.array:
+        """Signs of the field components (BX, BY, BZ) of the points mirrored with respect to a symmetry plane."""
+        normal, tangential = FIELDMAP_SYMMETRIES[symmetry]
+        signs = _np.full(3, tangential)
+        signs[axis] = normal
+        return signs
+
+    def _fold(self, points) -> Tuple[_np.array, _np.array]:
+        """Points folded in the fundamental domain of a compact field map, and the signs of the field components."""
+        points = _np.array(points, dtype=float)
+        signs = _np.ones((len(points), 3))
+        for axis, symmetry in self._symmetries.items():
+            a = FIELDMAP_AXES[axis]
+            mirrored = points[:, a] < 0
+            points[mirrored, a] *= -1
+            signs[mirrored] *= self._symmetry_signs(a, symmetry)
+        return points, signs
+
     @property
     def data(self):
         """Field map raw data in a numpy array."""
@@ -237,6 +469,8 @@ class FieldMap:
             A numpy array containing the data points of the field map sampling.
         """
         _ = _np.unique(self.data[:, axis])
+        if 'XYZ'[axis] in self._symmetries:
+            _ = _np.unique(_np.concatenate([-_, _]))
         return _, len(_)
 
     def translate(self, x: float = 0, y: float = 0, z: float = 0):
@@ -250,9 +484,13 @@ class FieldMap:
         Returns:
 
         """
+        for axis, offset in zip('XYZ', (x, y, z)):
+            if offset != 0 and axis in self._symmetries:
+                raise ValueError(f"A compact field map cannot be translated along its symmetry axis '{axis}'.")
         self._data['X'] -= x
         self._data['Y'] -= y
         self._data['Z'] -= z
+        self.clear_cache()
         return self
 
     def rotate(self):
@@ -270,21 +508,117 @@ class FieldMap:
             The object itself (allows method chaining).
         """
         self._data.query(slicing, inplace=True)
+        self.clear_cache()
         return self
 
+    def clear_cache(self):
+        """Clear the cached regular grid, interpolators and hash (to be called if the field map data are modified)."""
+        self._grid = None
+        self._interpolators = {}
+        self._hash = None
+        return self
+
+    @property
+    def hash(self) -> str:
+        """Hash (SHA-256) of the field map data and symmetries (cached until the field map data are modified)."""
+        if self._hash is None:
+            h = hashlib.sha256(repr(sorted(self._symmetries.items())).encode())
+            h.update(_np.ascontiguousarray(self._data[FIELDMAP_COLUMNS[:6]].values, dtype=_np.float64).tobytes())
+            self._hash = h.hexdigest()
+        return self._hash
+
+    @property
+    def grid(self) -> Optional[Tuple[Tuple[_np.array, ...], _np.array]]:
+        """The field map as a structured (regular) grid, if the mesh is regular.
+
+        The mesh is regular if it contains exactly one point for each combination of the sampling points along the
+        axes (see `mesh_sampling_along_axis`), which is the case of OPERA field maps.
+
+        Returns:
+            the sampling points along each axis and the field values (BX, BY, BZ) reshaped on the grid (array of shape
+            (nx, ny, nz, 3)), None if the mesh is not regular.
+        """
+        if self._grid is None:
+            self._grid = self._regular_grid() or False  # The outcome of the check is cached, irregular meshes included
+        return self._grid or None
+
+    def _regular_grid(self) -> Optional[Tuple[Tuple[_np.array, ...], _np.array]]:
+        axes = [_np.unique(self.data[:, axis]) for axis in range(3)]
+        if _np.prod([len(a) for a in axes]) != len(self.data):
+            return None
+        indices = tuple(_np.searchsorted(a, self.data[:, i]) for i, a in enumerate(axes))
+        occupied = _np.zeros([len(a) for a in axes], dtype=bool)
+        occupied[indices] = True
+        if not occupied.all():
+            return None
+        values = _np.empty([len(a) for a in axes] + [3], dtype=self.data.dtype)
+        values[indices] = self.data[:, 3:6]
+        return tuple(axes), values
+
+    def _interpolator(self,
+                      field_components: Tuple[str, ...],
+                      method: str,
+                      ) -> Tuple[List[int], interpolate.RegularGridInterpolator]:
+        """Cached regular grid interpolator of field components (the axes with a single sampling point are dropped)."""
+        if (field_components, method) not in self._interpolators:
+            axes, values = self.grid
+            field = {
+                'BX': lambda: values[..., 0],
+                'BY': lambda: values[..., 1],
+                'BZ': lambda: values[..., 2],
+                'MOD': lambda: _np.sqrt((values * values).sum(axis=-1)),
+            }
+            v = _np.stack([field[c]() for c in field_components], axis=-1)
+            kept = [i for i, a in enumerate(axes) if len(a) > 1]
+            v = v.reshape([len(axes[i]) for i in kept] + [len(field_components)])
+            self._interpolators[(field_components, method)] = (kept, interpolate.RegularGridInterpolator(
+                tuple(axes[i] for i in kept),
+                v,
+                method=method,
+                bounds_error=False,
+                fill_value=None if method == 'nearest' else _np.nan,
+            ))
+        return self._interpolators[(field_components, method)]
+
+    def _sample_grid(self, points, field_components: Tuple[str, ...], method: str) -> _np.array:
+        kept, interpolator = self._interpolator(field_components, method)
+        if not self._symmetries:
+            return interpolator(_np.asarray(points)[:, kept])
+        points, signs = self._fold(points)
+        return interpolator(points[:, kept]) * self._component_signs(signs, field_components)
+
+    @staticmethod
+    def _component_signs(signs: _np.array, field_components: Tuple[str, ...]) -> _np.array:
+        """Signs of the sampled field components (the modulus is unchanged by the symmetries)."""
+        return _np.stack([
+            signs[:, FIELDMAP_AXES[c[1]]] if c != 'MOD' else _np.ones(len(signs)) for c in field_components
+        ], axis=-1)
+
     def sample(self, points, field_component: str = 'MOD', method: str = 'nearest'):
         """
+        Sample the field map at given points.
+
+        If the mesh is regular (see `grid`), a cached regular grid interpolator is used; otherwise the field map is
+        interpolated from the point cloud (`scipy.interpolate.griddata`). The points are folded in the fundamental
+        domain of a compact field map (see `compact`).
+
+        Both interpolations coincide on the nodes of the mesh. In between, the 'linear' method is trilinear on the
+        cells of a regular mesh, whereas `griddata` interpolates linearly on a Delaunay triangulation of the point
+        cloud: for non-linear fields, the values sampled between the nodes of a regular mesh differ from the values
+        previously obtained with `griddata` (by the order of the variation of the field gradient over a cell).
 
         Args:
-            points:
+            points: the sampling points (array of shape (n, 3))
             field_component: field component to be sampled ('BX', 'BY', 'BZ' or 'MOD')
-            method: method used for the grid interpolation ('nearest' or 'linear')
+            method: method used for the grid interpolation ('nearest' or 'linear'; 'cubic' for regular meshes)
 
         Returns:
-
+            the sampled field component.
         """
         if points is None:
             raise ValueError("The sampling points are not defined (`points is None`).")
+        if self.grid is not None:
+            return self._sample_grid(points, (field_component, ), method)[:, 0]
         # The lambda trick is used so that the modulus is only computed if needed
         field_components = {
             'BX': lambda: self.data[:, 3],
@@ -292,7 +626,10 @@ class FieldMap:
             'BZ': lambda: self.data[:, 5],
             'MOD': lambda: _np.sqrt((self.data[:, 3:6] * self.data[:, 3:6]).sum(axis=1)),
         }
-        return interpolate.griddata(self.data[:, 0:3], field_components[field_component](), points, method=method)
+        points, signs = self._fold(points)
+        return interpolate.griddata(
+            self.data[:, 0:3], field_components[field_component](), points, method=method
+        ) * self._component_signs(signs, (field_component, ))[:, 0]
 
     def attach_cartesian_trajectory(self,
                                     axis: int = 0,
@@ -450,6 +787,7 @@ class FieldMap:
 
     def export_for_bdsim(self, method: str = 'nearest'):
         """
+        Resample the field map on a 100x100x100 mesh for BDSIM, in memory (see `export` for a streaming export).
 
         Args:
             method: method used for the grid interpolation ('nearest' or 'linear')
@@ -463,7 +801,152 @@ class FieldMap:
                    self.mesh_sampling_z[0].min():self.mesh_sampling_z[0].max():100j
                    ].T.reshape(100 ** 3, 3)
 
+        if self.grid is not None:
+            return _np.concatenate([new_mesh, -self._sample_grid(new_mesh, ('BX', 'BY', 'BZ'), method)], axis=1)
         fx = -self.sample(new_mesh, field_component='BX', method=method)
         fy = -self.sample(new_mesh, field_component='BY', method=method)
         fz = -self.sample(new_mesh, field_component='BZ', method=method)
         return _np.concatenate([new_mesh, _np.stack([fx, fy, fz]).T], axis=1)
+
+    def to_zgoubi(self, filename: str, path: str = '.', binary: bool = False) -> Dict[str, Union[int, str]]:
+        """
+        Write the field map in the TOSCA format read by Zgoubi (single file, `MOD=12`).
+
+        The field map is written on its regular mesh (see `grid`) with one node per line (or per record), the Z axis
+        (longitudinal axis of the Zgoubi frame) varying fastest, then the X axis, then the Y axis, which is the
+        reading sequence of Zgoubi for the `TOSCA` keyword. The text file starts with a header of
+        `ZGOUBI_HEADER_LINES` lines. The binary file is a FORTRAN unformatted sequential file (one record of 6 double
+        precision values per node, no header); its name is prefixed with `ZGOUBI_BINARY_PREFIX` so that Zgoubi reads
+        it as such, which is much faster than parsing the text file at every run.
+
+        Examples:
+            >>> fm = FieldMap.load_from_opera('fieldmap.table')  # doctest: +SKIP
+            >>> t = Tosca('T1', **fm.to_zgoubi('fieldmap.table', binary=True))  # doctest: +SKIP
+
+        Args:
+            filename: the name of the field map file (prefixed with `ZGOUBI_BINARY_PREFIX` for a binary file)
+            path: path to the field map file
+            binary: write a binary file instead of a text file
+
+        Returns:
+            the parameters of the `Tosca` command using the field map file (`IX`, `IY`, `IZ`, `MOD`, `MOD2` and
+            `FNAME`).
+        """
+        if self._symmetries:
+            return self.expand().to_zgoubi(filename, path=path, binary=binary)
+        if self.grid is None:
+            raise ValueError("The field map must be defined on a regular mesh.")
+        (x, y, z), values = self.grid
+        if binary and not os.path.basename(filename).lower().startswith(ZGOUBI_BINARY_PREFIX):
+            filename = os.path.join(os.path.dirname(filename), ZGOUBI_BINARY_PREFIX + os.path.basename(filename))
+        yy, xx, zz = _np.meshgrid(y, x, z, indexing='ij')
+        data = _np.empty((xx.size, 6))
+        data[:, 0] = xx.ravel()
+        data[:, 1] = yy.ravel()
+        data[:, 2] = zz.ravel()
+        data[:, 3:] = values.transpose(1, 0, 2, 3).reshape(-1, 3)
+        with open(os.path.join(path, filename), 'wb') as f:
+            if not binary:
+                f.write(_zgoubi_header(len(x), len(y), len(z)).encode())
+            _write_nodes(f, data, binary=binary)
+        return {
+            'IX': len(z),
+            'IY': len(x),
+            'IZ': len(y),
+            'MOD': 12,
+            'MOD2': 0,
+            'FNAME': filename,
+        }
+
+    def export(self,
+               filename: str,
+               fmt: str = 'bdsim',
+               path: str = '.',
+               resolution: Union[int, Tuple[int, int, int]] = 100,
+               method: str = 'nearest',
+               binary: bool = False,
+               n_procs: Optional[int] = None,
+               slab_points: int = EXPORT_SLAB_POINTS,
+               ) -> Dict[str, Union[int, str]]:
+        """
+        Streaming export of the field map, resampled on a regular mesh, to an external format.
+
+        The mesh spans the extent of the field map with the given number of points along each axis. It is sampled
+        and written slab by slab (a few planes along the slowest varying axis at a time), so that the memory usage
+        is bounded whatever the resolution; the slabs are sampled in parallel by a pool of processes (the field map is
+        sent once to each process) and written in order as they complete.
+
+        Supported formats:
+            - 'bdsim': BDSIM 3D field map (X varying fastest), with the field reversed as in `export_for_bdsim`;
+            - 'zgoubi': TOSCA field map read by Zgoubi (see `to_zgoubi`), in text or binary form.
+
+        Examples:
+            >>> fm.export('fieldmap.dat', fmt='bdsim', resolution=500, n_procs=8)  # doctest: +SKIP
+
+        Args:
+            filename: the name of the exported file (prefixed with `ZGOUBI_BINARY_PREFIX` for a binary Zgoubi file)
+            fmt: the format (see `EXPORT_FORMATS`)
+            path: path to the exported file
+            resolution: the number of points of the mesh along each axis (one value for all the axes, or a value per
+                        axis); the axes along which the field map has a single point keep a single point
+            method: method used for the interpolation ('nearest' or 'linear')
+            binary: write a binary file (Zgoubi format only)
+            n_procs: number of processes (default to `multiprocessing.cpu_count`, 1 to sample in the current process)
+            slab_points: the approximate number of mesh points of each slab
+
+        Returns:
+            the parameters of the `Tosca` command using the exported file (Zgoubi format), or the mesh size (`NX`,
+            `NY`, `NZ`) and the file name (BDSIM format).
+        """
+        if fmt not in EXPORT_FORMATS:
+            raise ValueError(f"Invalid export format '{fmt}'.")
+        if isinstance(resolution, int):
+            resolution = (resolution, ) * 3
+        axes = []
+        for i, n in enumerate(resolution):
+            sampling, points = self.mesh_sampling_along_axis(i)
+            axes.append(_np.linspace(sampling.min(), sampling.max(), n if points > 1 else 1))
+        nx, ny, nz = [len(a) for a in axes]
+        if fmt == 'bdsim':
+            order = (2, 1, 0)
+            header = ''.join(f"{c.lower()}min> {a[0]}\n{c.lower()}max> {a[-1]}\nn{c.lower()}> {len(a)}\n"
+                             for c, a in zip('XYZ', axes)) + '! X Y Z Fx Fy Fz\n'
+            parameters = {'NX': nx, 'NY': ny, 'NZ': nz, 'FNAME': filename}
+            binary = False
+        else:
+            order = (1, 0, 2)
+            if binary and not os.path.basename(filename).lower().startswith(ZGOUBI_BINARY_PREFIX):
+                filename = os.path.join(os.path.dirname(filename), ZGOUBI_BINARY_PREFIX + os.path.basename(filename))
+            header = '' if binary else _zgoubi_header(nx, ny, nz)
+            parameters = {'IX': nz, 'IY': nx, 'IZ': ny, 'MOD': 12, 'MOD2': 0, 'FNAME': filename}
+        slowest = axes[order[0]]
+        planes = max(1, slab_points // (len(axes[order[1]]) * len(axes[order[2]])))
+        slabs = [
+            tuple(slowest[i:i + planes] if j == order[0] else axes[j] for j in range(3))
+            for i in range(0, len(slowest), planes)
+        ]
+        n_procs = min(n_procs or multiprocessing.cpu_count(), len(slabs))
+
+        def _write(f, data: _np.array):
+            if fmt == 'bdsim':
+                data[:, 3:] *= -1
+            _write_nodes(f, data, binary=binary)
+
+        with open(os.path.join(path, filename), 'wb') as f:
+            f.write(header.encode())
+            if n_procs <= 1:
+                _export_init(self)
+                for slab in slabs:
+                    _write(f, _export_slab(slab, order, method))
+                _export_init(None)
+            else:
+                self.grid  # Computed once, before the field map is sent to the processes
+                with _ProcessPoolExecutor(max_workers=n_procs, initializer=_export_init, initargs=(self, )) as pool:
+                    pending = []
+                    for slab in slabs:
+                        pending.append(pool.submit(_export_slab, slab, order, method))
+                        if len(pending) >= 2 * n_procs:
+                            _write(f, pending.pop(0).result())
+                    for future in pending:
+                        _write(f, future.result())
+        return parameters
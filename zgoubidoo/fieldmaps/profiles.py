@@ -0,0 +1,247 @@
+"""Batch fitting of Enge fringe field profiles.
+
+The calibration of the fringe fields of a beamline from its field maps requires many fits of the Enge model (see
+`EngeModel`): one per magnet, per field component, and possibly per trajectory offset (e.g. to study the variation of
+the fringe field across the aperture). `fit_field_profiles` fits such a batch of field profiles:
+
+- the field profiles are sampled in the current process (the field maps are not sent to other processes), then the
+  fits run in parallel over a pool of processes;
+- the fits are warm-started: from previous fits of the same profiles (matched by label), and, within a batch, from the
+  fit of the first profile of the same field map and field component (the remaining profiles being fitted once this
+  first fit is available);
+- the converged fits are cached on disk, keyed by the hash of the field map, the trajectory, the field component and
+  the sampling method, so that an unchanged profile is never fitted twice (the fits that did not converge are not
+  cached: they are attempted again, e.g. from better starting values).
+
+Examples:
+    >>> profiles = [FieldProfile.from_magnet(m) for m in magnets]  # doctest: +SKIP
+    >>> profiles += [profiles[0].offset(y=dy) for dy in (-1.0, 1.0)]  # doctest: +SKIP
+    >>> fits = fit_field_profiles(profiles, n_procs=8)  # doctest: +SKIP
+"""
+from __future__ import annotations
+from typing import Any, Dict, Hashable, Iterable, List, Mapping, Optional, Sequence, Tuple
+from dataclasses import dataclass, field, replace
+from concurrent.futures import ProcessPoolExecutor as _ProcessPoolExecutor
+import hashlib
+import json
+import logging
+import multiprocessing
+import os
+import numpy as _np
+from ..assets import write_json as _write_json
+from .fieldmap import FieldMap as _FieldMap
+from .fieldmap import EngeModel as _EngeModel
+from .fieldmap import enge as _enge
+
+__all__ = ['FieldProfile', 'EngeFit', 'fit_field_profiles']
+_logger = logging.getLogger(__name__)
+
+FIELD_PROFILE_CACHE_PATH: str = os.environ.get(
+    'ZGOUBIDOO_FIELD_PROFILE_CACHE',
+    os.path.join(os.path.expanduser('~'), '.cache', 'zgoubidoo', 'profiles'),
+)
+"""Default directory of the cache of the fits of the field profiles."""
+
+
+@dataclass
+class FieldProfile:
+    """Field profile to be fitted: a field component of a field map sampled along a trajectory."""
+    field_map: _FieldMap
+    trajectory: _np.array
+    field_component: str = 'MOD'
+    sampling_method: str = 'nearest'
+    label: Hashable = None
+
+    @classmethod
+    def from_magnet(cls,
+                    magnet,
+                    field_component: Optional[str] = None,
+                    sampling_method: str = 'nearest',
+                    ) -> FieldProfile:
+        """Field profile of a magnet, sampled along the reference trajectory attached to its field map.
+
+        Args:
+            magnet: the magnet (with a field map with a reference trajectory)
+            field_component: the field component (default: the reference field component of the magnet)
+            sampling_method: method used for the sampling of the field map
+
+        Returns:
+            the field profile, labelled with the magnet's label.
+        """
+        if magnet.field_map is None or magnet.field_map.reference_trajectory is None:
+            raise ValueError(f"No field map (or no reference trajectory) attached to {magnet.LABEL1}.")
+        return cls(
+            field_map=magnet.field_map,
+            trajectory=magnet.field_map.reference_trajectory,
+            field_component=field_component or magnet.REFERENCE_FIELD_COMPONENT,
+            sampling_method=sampling_method,
+            label=magnet.LABEL1,
+        )
+
+    def offset(self, x: float = 0.0, y: float = 0.0, z: float = 0.0, label: Hashable = None) -> FieldProfile:
+        """Field profile along the trajectory offset by a constant vector.
+
+        Args:
+            x: offset along the X axis
+            y: offset along the Y axis
+            z: offset along the Z axis
+            label: the label of the new profile (default: the label of the profile and the offsets)
+
+        Returns:
+            a new field profile.
+        """
+        return replace(
+            self,
+            trajectory=self.trajectory + _np.array([x, y, z]),
+            label=label if label is not None else (self.label, x, y, z),
+        )
+
+    @property
+    def s(self) -> _np.array:
+        """Curvilinear coordinate along the trajectory (distance to the first point, as in `fit_field_profile`)."""
+        return _np.linalg.norm(self.trajectory - self.trajectory[0], axis=1)
+
+    def sample(self) -> _np.array:
+        """Field component sampled along the trajectory."""
+        return self.field_map.sample(self.trajectory, field_component=self.field_component, method=self.sampling_method)
+
+    @property
+    def key(self) -> str:
+        """Key (hash) identifying the profile (field map, trajectory, field component and sampling method)."""
+        h = hashlib.sha256(f"{self.field_map.hash} {self.field_component} {self.sampling_method}".encode())
+        h.update(_np.ascontiguousarray(self.trajectory, dtype=_np.float64).tobytes())
+        return h.hexdigest()
+
+
+@dataclass
+class EngeFit:
+    """Result of the fit of a field profile with the Enge model."""
+    label: Hashable
+    key: str
+    values: Dict[str, float]
+    success: bool
+    chisqr: float
+    nfev: int
+    s: _np.array = field(repr=False)
+    data: _np.array = field(repr=False)
+
+    @property
+    def best_values(self) -> Dict[str, float]:
+        """The fitted parameters of the Enge model (same interface as `lmfit.model.ModelResult`)."""
+        return dict(self.values)
+
+    @property
+    def best_fit(self) -> _np.array:
+        """The Enge model evaluated with the fitted parameters along the profile."""
+        return _enge(self.s, **self.values)
+
+    @property
+    def residual(self) -> _np.array:
+        """The residuals of the fit."""
+        return self.best_fit - self.data
+
+
+def _fit(s: _np.array, data: _np.array, values: Optional[Mapping[str, float]] = None) -> Dict[str, Any]:
+    """Fit of a field profile (runs in the processes of the pool)."""
+    model = _EngeModel()
+    params = model.make_params()
+    for k, v in (values or {}).items():
+        if k in params:
+            params[k].set(value=v)
+    fit = model.fit(data, params, s=s)
+    return {
+        'values': {k: float(v) for k, v in fit.best_values.items()},
+        'success': bool(fit.success),
+        'chisqr': float(fit.chisqr),
+        'nfev': int(fit.nfev),
+    }
+
+
+def _load(key: str, cache_path: str) -> Optional[Dict[str, Any]]:
+    try:
+        with open(os.path.join(cache_path, f"{key}.json")) as f:
+            result = json.load(f)
+    except (OSError, ValueError):
+        return None
+    return result if result.get('success') else None
+
+
+def _save(key: str, cache_path: str, result: Dict[str, Any]):
+    _write_json(os.path.join(cache_path, f"{key}.json"), result)
+
+
+def fit_field_profiles(profiles: Sequence[FieldProfile],
+                       previous: Optional[Iterable[EngeFit]] = None,
+                       warm_start: bool = True,
+                       n_procs: Optional[int] = None,
+                       cache: bool = True,
+                       cache_path: Optional[str] = None,
+                       ) -> List[EngeFit]:
+    """Fit a batch of field profiles with the Enge model, in parallel.
+
+    Args:
+        profiles: the field profiles
+        previous: previous fits, used as starting values for the profiles with the same label
+        warm_start: within the batch, start the fits from the fit of the first profile of the same field map and field
+                    component (if no previous fit is available)
+        n_procs: number of processes (default to `multiprocessing.cpu_count`, 1 to fit in the current process)
+        cache: use the cache of the fits (only the converged fits are cached)
+        cache_path: the cache directory (default: `FIELD_PROFILE_CACHE_PATH`)
+
+    Returns:
+        the fits, in the order of the profiles.
+    """
+    cache_path = cache_path or FIELD_PROFILE_CACHE_PATH
+    starts: Dict[Hashable, Dict[str, float]] = {f.label: f.values for f in (previous or []) if f.label is not None}
+    samples: List[Tuple[_np.array, _np.array]] = [(p.s, p.sample()) for p in profiles]
+    keys: List[str] = [p.key for p in profiles]
+    results: List[Optional[Dict[str, Any]]] = [_load(k, cache_path) if cache else None for k in keys]
+    _logger.info(f"{sum(r is not None for r in results)}/{len(profiles)} field profile fits found in the cache.")
+
+    groups: Dict[Tuple[str, str], List[int]] = {}
+    for i, p in enumerate(profiles):
+        groups.setdefault((p.field_map.hash, p.field_component), []).append(i)
+    first, others = [], []
+    for indices in groups.values():
+        pending = [i for i in indices if results[i] is None]
+        if warm_start and pending and not any(profiles[i].label in starts for i in pending):
+            first.append(pending[0])
+            others.extend(pending[1:])
+        else:
+            others.extend(pending)
+
+    def _start(i: int) -> Optional[Dict[str, float]]:
+        if profiles[i].label in starts:
+            return starts[profiles[i].label]
+        if warm_start:
+            fitted = [results[j] for j in groups[(profiles[i].field_map.hash, profiles[i].field_component)]
+                      if results[j] is not None]
+            if fitted:
+                return fitted[0]['values']
+        return None
+
+    n_procs = min(n_procs or multiprocessing.cpu_count(), max(len(first), len(others), 1))
+    pool = _ProcessPoolExecutor(max_workers=n_procs) if n_procs > 1 else None
+    try:
+        for wave in (first, others):
+            if not wave:
+                continue
+            starting_values = [_start(i) for i in wave]
+            if pool is None:
+                fits = [_fit(*samples[i], v) for i, v in zip(wave, starting_values)]
+            else:
+                fits = list(pool.map(_fit, *zip(*[(*samples[i], v) for i, v in zip(wave, starting_values)])))
+            for i, r in zip(wave, fits):
+                results[i] = r
+                if not r['success']:
+                    _logger.warning(f"The fit of the field profile {profiles[i].label} did not converge.")
+                elif cache:
+                    _save(keys[i], cache_path, r)
+    finally:
+        if pool is not None:
+            pool.shutdown()
+
+    return [
+        EngeFit(label=p.label, key=k, s=s, data=d, **r)
+        for p, k, (s, d), r in zip(profiles, keys, samples, results)
+    ]
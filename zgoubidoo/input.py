@@ -9,21 +9,29 @@ to provide a parametric mapping (combinations of the variations of one or more p
 input files.
 """
 from __future__ import annotations
-from typing import TYPE_CHECKING, Optional, Callable, Sequence, Union, List, Tuple, Iterable, Any, Deque, Mapping
-from collections import deque
+from typing import TYPE_CHECKING, Optional, Callable, Sequence, Union, List, Tuple, Iterable, Any, Deque, Dict, Mapping
+from collections import deque, OrderedDict
+import heapq
+import hashlib
+import io
+import copyreg
+import pickle
 import itertools
 from inspect import getmembers, isfunction
-from functools import partial, reduce
+from functools import partial
 import tempfile
 import logging
 import shutil
 import os
 import numpy as _np
 import pandas as _pd
-import parse as _parse
 from georges_core.frame import Frame as _Frame
 import zgoubidoo.converters as _zgoubi_converters
 import zgoubidoo.commands
+from . import parser as _parser
+from . import assets as _assets
+from . import workspaces as _workspaces
+from .workspaces import Workspace as _Workspace
 from .zgoubi import Zgoubi as _Zgoubi
 from .commands.commands import ZgoubidooException as _ZgoubidooException
 from zgoubidoo.commands import Command as _Command
@@ -34,6 +42,7 @@ from .commands import particules as _particules
 from .commands.particules import Particule as _Particule
 from .commands.particules import ParticuleType as _ParticuleType
 from .constants import ZGOUBI_IMAX, ZGOUBI_INPUT_FILENAME
+from . import ureg as _ureg
 from .mappings import MappedParametersType as _MappedParametersType
 from .mappings import MappedParametersListType as _MappedParametersListType
 from .mappings import flatten as _flatten
@@ -45,9 +54,97 @@ if TYPE_CHECKING:
 
 _logger = logging.getLogger(__name__)
 
-PathsListType = List[Tuple[_MappedParametersType, Union[str, tempfile.TemporaryDirectory], bool]]
+PathsListType = List[Tuple[_MappedParametersType, Union[str, tempfile.TemporaryDirectory, _Workspace], bool]]
 """Type alias for a list of parametric keys and paths values."""
 
+ZGOUBIDOO_BINARY_FORMAT: str = 'zgoubidoo-input-1'
+"""Header (format identifier and version) of the binary input files (see `Input.save_binary`)."""
+
+
+def _quantity(magnitude: Any, units: str) -> _ureg.Quantity:
+    return _ureg.Quantity(magnitude, units)
+
+
+def _unit(units: str) -> _ureg.Unit:
+    return _ureg.Unit(units)
+
+
+def _reduce_quantity(q: _ureg.Quantity):
+    return _quantity, (q.magnitude, str(q.units))
+
+
+def _reduce_unit(u: _ureg.Unit):
+    return _unit, (str(u), )
+
+
+def _dump(obj: Any, f):
+    pickler = pickle.Pickler(f, protocol=pickle.HIGHEST_PROTOCOL)
+    pickler.dispatch_table = {
+        **copyreg.dispatch_table,
+        _ureg.Quantity: _reduce_quantity,
+        _ureg.Unit: _reduce_unit,
+    }
+    pickler.dump((ZGOUBIDOO_BINARY_FORMAT, obj))
+
+
+SEQUENCE_CACHE_SIZE: int = 16
+"""Maximum number of converted sequences kept in memory by `Input.from_sequence`."""
+
+_sequence_cache: OrderedDict = OrderedDict()
+
+
+def _cache_sequence(key: str, data: bytes):
+    _sequence_cache[key] = data
+    _sequence_cache.move_to_end(key)
+    while len(_sequence_cache) > SEQUENCE_CACHE_SIZE:
+        _sequence_cache.popitem(last=False)
+
+
+def _sequence_cache_key(sequence: georges_core.sequences.Sequence, df: _pd.DataFrame, *args) -> Optional[str]:
+    """Key identifying a sequence (content, kinematics and particle) and its conversion options.
+
+    Functions and classes are identified by their qualified name. Lambdas and local functions (closures) cannot be
+    identified that way (their behavior depends on the captured values): no key is provided and the conversion is not
+    cached.
+
+    Args:
+        sequence: the sequence
+        df: the dataframe of the sequence elements
+        *args: the conversion options
+
+    Returns:
+        a hash of the sequence and its conversion options (None if the options cannot be identified).
+    """
+    class _Anonymous(Exception):
+        pass
+
+    def _identify(o: Any) -> Any:
+        if callable(o) and hasattr(o, '__qualname__'):
+            if '<lambda>' in o.__qualname__ or '<locals>' in o.__qualname__:
+                raise _Anonymous
+            return f"{getattr(o, '__module__', '')}.{o.__qualname__}"
+        if isinstance(o, Mapping):
+            return sorted([(str(k), _identify(v)) for k, v in o.items()])
+        if isinstance(o, (list, tuple)):
+            return [_identify(_) for _ in o]
+        return str(o)
+
+    kinematics = sequence.kinematics
+    try:
+        identifiers = repr((
+            sequence.name,
+            list(df.columns),
+            None if kinematics is None else kinematics.brho.m_as('T * m'),
+            _identify(sequence.particle),
+            _identify(args),
+        ))
+    except _Anonymous:
+        return None
+    h = hashlib.sha1()
+    h.update(identifiers.encode())
+    h.update(_pd.util.hash_pandas_object(df.astype(str), index=True).values.tobytes())
+    return h.hexdigest()
+
 
 class ZgoubiInputException(Exception):
     """Exception raised for errors within Zgoubi Input."""
@@ -56,6 +153,103 @@ class ZgoubiInputException(Exception):
         self.message = m
 
 
+class _IndexedLine(deque):
+    """Sequence of commands maintaining an index of its elements by type.
+
+    The index (buckets of elements grouped by their exact class) is built lazily in a single pass and the results of
+    the type lookups are cached, so that repeated lookups (e.g. `Input.beam`) are O(1) and a new lookup only touches
+    the matching elements. Any modification of the sequence invalidates the index.
+    """
+    def __init__(self, iterable: Iterable = (), maxlen: Optional[int] = None):
+        super().__init__(iterable, maxlen)
+        self._buckets: Optional[Dict[type, List[Tuple[int, _Command]]]] = None
+        self._lookups: Dict[Tuple[type, ...], List[_Command]] = {}
+
+    def _invalidate(self):
+        self._buckets = None
+        self._lookups = {}
+
+    def filter(self, types: Tuple[type, ...]) -> List[_Command]:
+        """Elements of the sequence which are instances of (at least) one of the given types, in sequence order.
+
+        Args:
+            types: a tuple of types (classes).
+
+        Returns:
+            the list of the matching elements.
+        """
+        if types not in self._lookups:
+            if self._buckets is None:
+                self._buckets = {}
+                for i, e in enumerate(self):
+                    self._buckets.setdefault(e.__class__, []).append((i, e))
+            matching = [b for t, b in self._buckets.items() if issubclass(t, types)]
+            if len(matching) == 1:
+                self._lookups[types] = [e for _, e in matching[0]]
+            else:
+                self._lookups[types] = [e for _, e in heapq.merge(*matching, key=lambda _: _[0])]
+        return list(self._lookups[types])
+
+    def append(self, x):
+        self._invalidate()
+        super().append(x)
+
+    def appendleft(self, x):
+        self._invalidate()
+        super().appendleft(x)
+
+    def extend(self, iterable):
+        self._invalidate()
+        super().extend(iterable)
+
+    def extendleft(self, iterable):
+        self._invalidate()
+        super().extendleft(iterable)
+
+    def insert(self, i, x):
+        self._invalidate()
+        super().insert(i, x)
+
+    def pop(self):
+        self._invalidate()
+        return super().pop()
+
+    def popleft(self):
+        self._invalidate()
+        return super().popleft()
+
+    def remove(self, value):
+        self._invalidate()
+        super().remove(value)
+
+    def clear(self):
+        self._invalidate()
+        super().clear()
+
+    def reverse(self):
+        self._invalidate()
+        super().reverse()
+
+    def rotate(self, n=1):
+        self._invalidate()
+        super().rotate(n)
+
+    def __setitem__(self, i, x):
+        self._invalidate()
+        super().__setitem__(i, x)
+
+    def __delitem__(self, i):
+        self._invalidate()
+        super().__delitem__(i)
+
+    def __iadd__(self, other):
+        self._invalidate()
+        return super().__iadd__(other)
+
+    def __reduce__(self):
+        return self.__class__, (list(self), self.maxlen)
+
+
 class Input:
     """Main class interfacing Zgoubi input files data structure.
 
@@ -83,7 +277,7 @@ class Input:
                  ):
         self._name: str = name
         line = line or list()
-        self._line: Deque[_Command] = deque(line)
+        self._line: Deque[_Command] = _IndexedLine(line)
         self._paths: PathsListType = list()
         self._reference_frame: Optional[_Frame] = None
         self._survey_is_valid: bool = False
@@ -105,6 +299,14 @@ class Input:
     def __repr__(self) -> str:
         return str(self)
 
+    def __getstate__(self) -> Dict[str, Any]:
+        """State used for serialization (the paths of the generated inputs are not serialized)."""
+        return {**self.__dict__, '_paths': list()}
+
+    def __setstate__(self, state: Dict[str, Any]):
+        """Restore the state of a serialized input."""
+        self.__dict__.update(state)
+
     def __call__(self,
                  *,
                  mappings: Optional[_MappedParametersListType] = None,
@@ -134,7 +336,7 @@ class Input:
             mappings: TODO
             filename: the Zgoubi input file name (default: zgoubi.dat)
             path: an optional path for the temporary directories that will be created for the input files (default:
-            uses temporary paths)
+            uses pooled workspaces, in RAM if enabled, see `zgoubidoo.workspaces`)
 
         Return:
 
@@ -155,9 +357,12 @@ class Input:
                 initial_state = previous_state
             if path is not None:
                 path = path.rstrip('/') + '/'
-            target_dir = tempfile.TemporaryDirectory(prefix=path)
+                target_dir = tempfile.TemporaryDirectory(prefix=path)
+            else:
+                target_dir = _workspaces.workspace_manager.acquire()
             paths.append((mapping, target_dir, False))
             Input.write(self, filename, path=target_dir.name)
+            _assets.asset_store.link_all(itertools.chain.from_iterable(e.assets for e in self._line), target_dir.name)
         self.adjust(initial_state)
         return paths
 
@@ -191,9 +396,9 @@ class Input:
             the `Input` itself (in-place operation).
         """
         if isinstance(other, str):
-            self._line = [c for c in self._line if c.LABEL1 != other]
+            self._line = _IndexedLine([c for c in self._line if c.LABEL1 != other])
         else:
-            self._line = [c for c in self._line if c != other]
+            self._line = _IndexedLine([c for c in self._line if c != other])
         return self
 
     def __getitem__(self,
@@ -310,21 +515,25 @@ class Input:
         return len(l)
 
     def _filter(self, items: Union[str, CommandType, Tuple[Union[str, CommandType]]]) -> tuple:
-        """
+        """Filter the input sequence by element types.
+
+        The element types are given as classes or as strings (class names or aliases, see
+        `zgoubidoo.commands.find_command`). The lookup uses the type index of the sequence and is thus proportional
+        to the number of matching elements.
 
         Args:
-            items:
+            items: a tuple of element types (classes or strings).
 
         Returns:
-
+            a tuple with the list of matching elements and the tuple of the resolved types.
         """
         try:
             items = tuple(map(
-                lambda x: getattr(zgoubidoo.commands, x.capitalize()) if isinstance(x, str) else x, items
+                lambda x: zgoubidoo.commands.find_command(x) if isinstance(x, str) else x, items
             ))
-        except AttributeError:
+        except KeyError:
             return list(), tuple()
-        return list(filter(lambda x: reduce(lambda u, v: u or v, [isinstance(x, i) for i in items]), self._line)), items
+        return self._line.filter(items), items
 
     def apply(self, f: Callable[[_Command], _Command]) -> Input:
         """Apply (map) a function on each command of the input sequence.
@@ -337,7 +546,7 @@ class Input:
         Returns:
             the input sequence (in place operation).
         """
-        self._line = list(map(f, self._line))
+        self._line = _IndexedLine(map(f, self._line))
         return self
 
     def cleanup(self):
@@ -361,6 +570,19 @@ class Input:
         self.apply(lambda _: _.clean_output_and_results())
         self._paths = []
 
+    def release_outputs(self, results: bool = False) -> Input:
+        """Release the raw outputs attached to the commands of the input sequence (see `Command.release_outputs`).
+
+        Args:
+            results: also release the parsed results attached to the commands.
+
+        Returns:
+            the input sequence (in place operation).
+        """
+        for e in self._line:
+            e.release_outputs(results=results)
+        return self
+
     def validate(self, validators: Optional[List[Callable]]) -> bool:
         """
 
@@ -503,7 +725,9 @@ class Input:
         Returns:
 
         """
-        self._line = list(filter(lambda _: not (_.LABEL1 == prefix or _.LABEL1.startswith(prefix + '_')), self.line))
+        self._line = _IndexedLine(
+            filter(lambda _: not (_.LABEL1 == prefix or _.LABEL1.startswith(prefix + '_')), self.line)
+        )
         return self
 
     def get_attributes(self, attribute: str = "LABEL1") -> List[str]:
@@ -581,15 +805,15 @@ class Input:
 
     @property
     def beam(self) -> Optional[_Beam]:
-        """
+        """The beam of the input sequence (looked-up in the type index of the sequence, hence O(1) for repeated calls).
 
         Returns:
+            the `Beam` present in the input sequence or None.
 
         Raises:
-            TODO
-
+            ZgoubiInputException if multiple beams are present in the input sequence.
         """
-        _ = self[_Beam]
+        _ = self._line.filter((_Beam, ))
         if len(_) > 1:
             raise ZgoubiInputException("Multiple beams found in input.")
         else:
@@ -715,36 +939,85 @@ class Input:
                       beam_options: Optional[Mapping] = None,
                       with_survey: bool = True,
                       with_survey_reference: bool = True,
+                      vectorized: bool = True,
+                      cache: bool = False,
+                      cache_path: Optional[str] = None,
                       ):
-        """
+        """Create an Input from a (MAD-X) sequence.
+
+        The elements are converted using the converters of `zgoubidoo.converters`; the most common element types are
+        converted all at once using the vectorized converters (see `zgoubidoo.converters.VECTORIZED_CONVERTERS`), the
+        other ones element by element.
+
+        The converted (and surveyed) inputs can be cached (opt-in, see `cache`), using a key computed from the sequence
+        content, its kinematics and all the conversion options: converting the same sequence again with the same
+        options returns a copy of the cached input. The cache is kept in memory (see `SEQUENCE_CACHE_SIZE`) and, if
+        `cache_path` is provided, on disk as binary input files (see `Input.save_binary`, written atomically), so that
+        it can be shared between processes. Conversions using lambdas or local functions (e.g. as converters) are not
+        cached.
 
         Args:
-            sequence:
-            options:
-            converters:
-            elements_database:
-            beam:
-            beam_options:
-            with_survey:
-            with_survey_reference:
+            sequence: the sequence to be converted
+            options: conversion options, indexed by keyword
+            converters: additional (or replacement) converters, indexed by keyword
+            elements_database: list of commands to be used for given elements, indexed by element name
+            beam: the type of beam to be added at the beginning of the input (None for no beam)
+            beam_options: options for the creation of the beam
+            with_survey: survey the resulting input
+            with_survey_reference: survey the reference trajectory (runs Zgoubi)
+            vectorized: use the vectorized converters when possible
+            cache: use the converted sequences cache (opt-in)
+            cache_path: path of a directory where the converted sequences are cached (in addition to the memory cache)
 
         Returns:
-
+            the Input corresponding to the sequence.
         """
+        options = options or {}
+        elements_database = elements_database or {}
+        df = sequence.df
+        key = None
+        if cache:
+            key = _sequence_cache_key(sequence, df, options, converters, elements_database, beam, beam_options,
+                                      with_survey, with_survey_reference)
+            if key is None:
+                _logger.info(f"Conversion of {sequence.name} with lambdas or closures: the conversion is not cached.")
+            elif key in _sequence_cache:
+                _sequence_cache.move_to_end(key)
+                return cls._load(io.BytesIO(_sequence_cache[key]), sequence.name)
+            elif cache_path is not None and os.path.isfile(os.path.join(cache_path, f"{key}.zgb")):
+                with open(os.path.join(cache_path, f"{key}.zgb"), 'rb') as f:
+                    _cache_sequence(key, f.read())
+                return cls._load(io.BytesIO(_sequence_cache[key]), sequence.name)
+
         zgoubi_converters = {k.split('_')[0].upper(): v
                              for k, v in getmembers(_zgoubi_converters, isfunction) if k.endswith('to_zgoubi')}
         conversion_functions = {**zgoubi_converters, **(converters or {})}
-        elements_database = elements_database or {}
-        options = options or {}
-        converted_sequence = deque(
-            sequence.apply(
+        converted: List[Optional[Sequence[_Command]]] = [None] * len(df)
+        if vectorized and len(df) > 0:
+            keywords = df['KEYWORD'].values
+            in_database = df.index.isin(list(elements_database.keys()))
+            for keyword, f in _zgoubi_converters.VECTORIZED_CONVERTERS.items():
+                if keyword in (converters or {}):
+                    continue
+                positions = _np.flatnonzero((keywords == keyword) & ~in_database)
+                if len(positions) == 0:
+                    continue
+                commands = f(df.iloc[positions], sequence.kinematics, options.get(keyword, {}))
+                if commands is not None:
+                    for i, c in zip(positions, commands):
+                        converted[i] = c
+        remaining = [i for i, c in enumerate(converted) if c is None]
+        if len(remaining) > 0:
+            commands = df.iloc[remaining].apply(
                 lambda _: elements_database.get(_.name,
                                                 conversion_functions.get(_['KEYWORD'], lambda _, __, ___: [])
                                                 (_, sequence.kinematics, options.get(_['KEYWORD'], {}))
                                                 ),
                 axis=1
             ).values
-        )
+            for i, c in zip(remaining, commands):
+                converted[i] = c
+        converted_sequence: Deque[Sequence[_Command]] = deque(converted)
         if beam is not None:
             converted_sequence.appendleft(
                 (beam.from_sequence(sequence,
@@ -760,8 +1033,19 @@ class Input:
                      reference_kinematics=sequence.kinematics,
                      reference_particle=getattr(_particules, sequence.particle.__name__)
                      )
+        if key is not None:
+            buffer = io.BytesIO()
+            _dump(_, buffer)
+            _cache_sequence(key, buffer.getvalue())
+            if cache_path is not None:
+                _assets.write_bytes(os.path.join(cache_path, f"{key}.zgb"), buffer.getvalue())
         return _
 
+    @staticmethod
+    def clear_sequence_cache():
+        """Clear the (memory) cache of the converted sequences (see `Input.from_sequence`)."""
+        _sequence_cache.clear()
+
     @staticmethod
     def write(_: Input,
               filename: str = ZGOUBI_INPUT_FILENAME,
@@ -800,21 +1084,89 @@ class Input:
             extra_end = [_End()]
         return ''.join(map(str, [name] + (list(line) or []) + (extra_end or [])))
 
+    def save_binary(self, filename: str):
+        """Save the input (commands and attributes, survey frames, beams and their distributions) in a binary file.
+
+        The snapshot can be reloaded with `Input.load_binary`, without running the converters, the attributes setters
+        of the commands or the survey again. The physical quantities are stored as magnitudes and units, the numpy
+        arrays (e.g. beam distributions) are stored as raw buffers.
+
+        Examples:
+            >>> import os, tempfile
+            >>> zi = Input(name='TEST')
+            >>> with tempfile.TemporaryDirectory() as d:
+            ...     zi.save_binary(os.path.join(d, 'test.zgb'))
+            ...     Input.load_binary(os.path.join(d, 'test.zgb')).name
+            'TEST'
+
+        Args:
+            filename: the name of the file.
+        """
+        with open(filename, 'wb') as f:
+            _dump(self, f)
+
     @classmethod
-    def parse(cls, stream: str, debug: bool = False) -> Input:
+    def load_binary(cls, filename: str) -> Input:
+        """Load an input saved with `Input.save_binary`.
+
+        ::note: the snapshot is loaded with `pickle`; only load files from trusted sources.
+
+        Args:
+            filename: the name of the file.
+
+        Returns:
+            the Input.
+
+        Raises:
+            ZgoubiInputException if the file is not a valid snapshot.
         """
+        with open(filename, 'rb') as f:
+            return cls._load(f, filename)
+
+    @classmethod
+    def _load(cls, f, name: str) -> Input:
+        try:
+            header, zi = pickle.load(f)
+        except (pickle.UnpicklingError, ValueError, TypeError, EOFError):
+            raise ZgoubiInputException(f"{name} is not a valid Zgoubidoo binary input file.")
+        if header != ZGOUBIDOO_BINARY_FORMAT or not isinstance(zi, Input):
+            raise ZgoubiInputException(f"{name} is not a valid Zgoubidoo binary input file (format {header}).")
+        return zi
+
+    @classmethod
+    def parse(cls, stream: str, debug: bool = False) -> Input:
+        """Create an Input from the content of a Zgoubi input file.
+
+        The stream is parsed in a single pass (see `zgoubidoo.parser`); the first line is used as the name of the input.
 
         Args:
-            stream:
-            debug:
+            stream: the content of the Zgoubi input file.
+            debug: if True, raise an exception for commands that cannot be parsed (instead of keeping them verbatim).
 
         Returns:
+            the Input.
+        """
+        name, line = _parser.parse(stream.splitlines(), strict=debug)
+        return cls(name=name or 'beamline', line=line)
 
+    @classmethod
+    def from_file(cls, filename: str = ZGOUBI_INPUT_FILENAME, path: str = '.', debug: bool = False) -> Input:
+        """Create an Input from a Zgoubi input file.
+
+        The file is streamed line by line, large input files (e.g. with large `OBJET` blocks) are thus never fully
+        loaded in memory as text.
+
+        Args:
+            filename: the name of the Zgoubi input file.
+            path: the path to the file.
+            debug: if True, raise an exception for commands that cannot be parsed (instead of keeping them verbatim).
+
+        Returns:
+            the Input.
         """
-        return cls(
-            line=[getattr(zgoubidoo.commands, _parse.search("'{KEYWORD}'", c)['KEYWORD'].capitalize()).build(c, debug)
-                  for c in "\n".join([_.strip() for _ in stream.split('\n')]).strip('\n').split('\n\n')]
-        )
+        with open(os.path.join(path, filename)) as f:
+            name, line = _parser.parse(f, strict=debug)
+        return cls(name=name or 'beamline', line=line)
 
 
 class ZgoubiInputValidator:
@@ -2,7 +2,7 @@
 TODO
 """
 from __future__ import annotations
-from typing import Mapping, List, Union, Sequence, Tuple
+from typing import Any, Hashable, Mapping, List, Union, Sequence, Tuple
 from dataclasses import dataclass, field
 import itertools
 from . import Q_ as _Q
@@ -23,6 +23,50 @@ flatten = itertools.chain.from_iterable
 """Helper function to flatten an iterable."""
 
 
+PARAMETER_VALUE_DIGITS: int = 12
+"""Number of significant digits of the normalized values of the mapped parameters (see `parameter_value`)."""
+
+
+def parameter_value(value: Any) -> Hashable:
+    """Normalized (hashable) value of a mapped parameter.
+
+    Quantities are converted to their magnitude in base units, and the numerical values are rounded (see
+    `PARAMETER_VALUE_DIGITS`), so that the same value given in different units (e.g. 2000 G and 0.2 T) is normalized to
+    the same magnitude despite the rounding errors of the unit conversions.
+
+    Examples:
+        >>> parameter_value(_Q(2000, 'gauss')) == parameter_value(_Q(0.2, 'tesla'))
+        True
+
+    Args:
+        value: the value of the parameter.
+
+    Returns:
+        the normalized value.
+    """
+    if isinstance(value, _Q):
+        value = value.to_base_units().magnitude
+    if isinstance(value, (int, float)) and not isinstance(value, bool):
+        return float(f"{value:.{PARAMETER_VALUE_DIGITS}g}")
+    return value
+
+
+def mapping_key(mapping: MappedParametersType) -> Tuple[Tuple[Any, Hashable], ...]:
+    """Hashable key identifying a mapping (independent of the order of the parameters and of the units used).
+
+    Examples:
+        >>> mapping_key({'Q1.K1': 1.0, 'B1.B1': _Q(1.0, 'T')}) == mapping_key({'B1.B1': _Q(1.0, 'T'), 'Q1.K1': 1.0})
+        True
+
+    Args:
+        mapping: the mapped parameters.
+
+    Returns:
+        a tuple of (parameter, normalized value) pairs.
+    """
+    return tuple(sorted(((k, parameter_value(v)) for k, v in mapping.items()), key=lambda _: str(_[0])))
+
+
 @dataclass
 class ParametricMapping:
     """Abstraction for multi-dimensional parametric mappings.
@@ -1,8 +1,12 @@
 """TODO
 
 """
-from typing import List
+from typing import Dict, List, Optional, Sequence, Tuple
 import os
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor as _ProcessPoolExecutor
+from concurrent.futures import as_completed as _as_completed
+import numpy as _np
 import pandas as _pd
 
 _ZGOUBI_PLT_HEADERS = ['# KEX',
@@ -163,6 +167,189 @@ def read_plt_file(filename: str = 'zgoubi.plt', path: str = '.') -> _pd.DataFram
     return df
 
 
+_PLT_CONVERSIONS: Dict[str, Tuple[str, Optional[float]]] = {
+    'KEX': ('# KEX', None),
+    'Do': ('Do-1', None),
+    'Yo': ('Yo', 1e-2),
+    'To': ('To', 1e-3),
+    'Zo': ('Zo', 1e-2),
+    'Po': ('Po', 1e-3),
+    'Y': ('Y-DY', 1e-2),
+    'T': ('T', 1e-3),
+    'Z': ('Z', 1e-2),
+    'P': ('P', 1e-3),
+    'X': ('X', 1e-2),
+    'S': ('S', 1e-2),
+    'KEYWORD': ('KLEY', None),
+}
+"""Columns of the .plt files (as returned by `read_plt_file`): raw column name and scaling factor to SI units."""
+
+
+def iter_plt_file(filename: str = 'zgoubi.plt',
+                  path: str = '.',
+                  columns: Optional[Sequence[str]] = None,
+                  chunksize: int = 100000):
+    """Iterate over a Zgoubi .plt file by chunks of rows.
+
+    Only the requested columns are parsed, with the same names and units as with `read_plt_file`; the file is never
+    fully loaded in memory.
+
+    Example:
+        >>> for chunk in iter_plt_file(columns=['LABEL1', 'Y', 'T']):
+        ...     print(chunk['Y'].mean())
+
+    Args:
+        filename: the name of the file
+        path: the path to the .plt file
+        columns: the columns to read (default: all)
+        chunksize: the number of rows of each chunk
+
+    Returns:
+        an iterator over Pandas DataFrames.
+
+    Raises:
+        a FileNotFoundError in case the file is not found.
+    """
+    columns = list(columns) if columns is not None else \
+        [c for c in _ZGOUBI_PLT_HEADERS if c not in ('# KEX', 'Do-1', 'Y-DY', 'KLEY')] + ['KEX', 'Do', 'Y', 'KEYWORD']
+    raw = {c: _PLT_CONVERSIONS.get(c, (c, None)) for c in columns}
+    reader = _pd.read_csv(os.path.join(path, filename),
+                          skiprows=4,
+                          names=_ZGOUBI_PLT_HEADERS,
+                          usecols=list({r for r, _ in raw.values()}),
+                          sep=r'\s+',
+                          skipinitialspace=True,
+                          quotechar='\'',
+                          chunksize=chunksize,
+                          )
+    for chunk in reader:
+        df = _pd.DataFrame(index=chunk.index)
+        for c, (r, factor) in raw.items():
+            if not _pd.api.types.is_numeric_dtype(chunk[r]):  # Fortran padded strings (object or str dtype)
+                df[c] = chunk[r].str.strip()
+            elif factor is not None:
+                df[c] = chunk[r] * factor
+            else:
+                df[c] = chunk[r]
+        yield df
+
+
+def _read_plt_file_or_none(filename: str, path: str) -> Optional[_pd.DataFrame]:
+    """Read a .plt file (runs in a worker process), None if the file is not found."""
+    try:
+        return read_plt_file(filename=filename, path=path)
+    except FileNotFoundError:
+        return None
+
+
+def _read_plt_file_to_shared_memory(filename: str, path: str) -> Optional[Tuple]:
+    """Read a .plt file and store its numeric columns in a shared memory block (runs in a worker process).
+
+    The numeric columns are stored contiguously, column after column, in a single block; the other columns (labels,
+    etc.) are returned as categorical codes and categories, which are small. The block is released (unlinked) by the
+    parent process; it remains registered with the resource tracker shared with the parent, which removes it should
+    the parent fail to do so.
+
+    Returns:
+        the name of the shared memory block, the number of rows, the numeric columns and their dtypes, the other
+        columns, and the order of the columns; None if the file is not found.
+    """
+    from multiprocessing import shared_memory
+    df = _read_plt_file_or_none(filename=filename, path=path)
+    if df is None:
+        return None
+    numeric = [(c, df[c].dtype.str) for c in df.columns if df[c].dtype.kind in 'iuf' and df[c].dtype.itemsize == 8]
+    others = {c: (df[c].astype('category').cat.codes.values, df[c].astype('category').cat.categories.values)
+              for c in df.columns if c not in dict(numeric)}
+    n = len(df)
+    shm = shared_memory.SharedMemory(create=True, size=max(1, 8 * n * len(numeric)))
+    for i, (c, dtype) in enumerate(numeric):
+        _np.ndarray((n, ), dtype=dtype, buffer=shm.buf, offset=8 * n * i)[:] = df[c].values
+    shm.close()
+    return shm.name, n, numeric, others, list(df.columns)
+
+
+def _release_shared_memory(name: str):
+    from multiprocessing import shared_memory
+    try:
+        shm = shared_memory.SharedMemory(name=name)
+    except FileNotFoundError:
+        return
+    shm.close()
+    shm.unlink()
+
+
+def _read_shared_memory(name: str, n: int, numeric: List[Tuple[str, str]], others: Dict, columns: List[str]
+                        ) -> _pd.DataFrame:
+    """Dataframe from a block filled by `_read_plt_file_to_shared_memory` (the data is copied from the block)."""
+    from multiprocessing import shared_memory
+    shm = shared_memory.SharedMemory(name=name)
+    try:
+        data: Dict[str, _np.ndarray] = {
+            c: _np.ndarray((n, ), dtype=dtype, buffer=shm.buf, offset=8 * n * i).copy()
+            for i, (c, dtype) in enumerate(numeric)
+        }
+    finally:
+        shm.close()
+    for c, (codes, categories) in others.items():
+        data[c] = _pd.Categorical.from_codes(codes, categories=categories).astype(categories.dtype)
+    return _pd.DataFrame(data, columns=columns)
+
+
+def read_plt_files(paths: Sequence[str],
+                   filename: str = 'zgoubi.plt',
+                   n_procs: Optional[int] = None) -> List[Optional[_pd.DataFrame]]:
+    """Read multiple Zgoubi .plt files in parallel, using a pool of processes.
+
+    Each file is parsed in a separate process (parsing is bound by the Python interpreter lock and does not benefit
+    from threads). The numeric columns are handed back through shared memory blocks (`multiprocessing.shared_memory`,
+    Python >= 3.8) instead of being pickled, which saves the serialization of the data. The files are consumed as soon
+    as they are parsed: the parent process copies each block into the resulting dataframe (which then owns its data)
+    and releases it right away, so that the blocks do not accumulate in shared memory (only the files parsed but not
+    yet consumed are held there). The blocks are also released when a worker fails. On older Python versions the
+    dataframes are pickled back to the parent process.
+
+    Example:
+        >>> read_plt_files(['run1', 'run2'], n_procs=2)
+
+    Args:
+        paths: the paths to the directories containing the .plt files
+        filename: the name of the files
+        n_procs: number of processes (default to `multiprocessing.cpu_count`)
+
+    Returns:
+        a list of Pandas DataFrames with the .plt files content (None for the files not found), in the order of the
+        paths.
+    """
+    if len(paths) == 0:
+        return []
+    n_procs = min(n_procs or multiprocessing.cpu_count(), len(paths))
+    try:
+        from multiprocessing import resource_tracker
+    except ImportError:  # Python < 3.8
+        with _ProcessPoolExecutor(max_workers=n_procs) as pool:
+            return list(pool.map(_read_plt_file_or_none, [filename] * len(paths), paths))
+    resource_tracker.ensure_running()  # Shared with the workers, which register the blocks they create
+    results: List[Optional[_pd.DataFrame]] = [None] * len(paths)
+    with _ProcessPoolExecutor(max_workers=n_procs) as pool:
+        futures = {pool.submit(_read_plt_file_to_shared_memory, filename, p): i for i, p in enumerate(paths)}
+        pending = set(futures)
+        try:
+            for future in _as_completed(futures):
+                pending.discard(future)
+                block = future.result()
+                if block is not None:
+                    try:
+                        results[futures[future]] = _read_shared_memory(*block)
+                    finally:
+                        _release_shared_memory(block[0])
+        finally:
+            for future in pending:  # After a failure, the blocks of the files still being parsed are released too
+                if not future.cancel() and future.exception() is None and future.result() is not None:
+                    _release_shared_memory(future.result()[0])
+    return results
+
+
 def read_srloss_file(filename: str = 'zgoubi.SRLOSS.out', path: str = '.') -> _pd.DataFrame:
     """Read Zgoubi SRLOSS files to a DataFrame.
 
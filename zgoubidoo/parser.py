@@ -0,0 +1,407 @@
+"""Parser for Zgoubi input files.
+
+This module provides a tokenizer and a parser for existing Zgoubi input files (`zgoubi.dat`). The input stream is
+processed in a single pass, line by line, so that large input files (including large `OBJET` blocks with thousands
+of particles) can be parsed without loading the complete file in memory.
+
+The tokenizer splits the stream in *blocks*: each block starts with a keyword line (e.g. ``'DRIFT' D1``) and contains
+the data lines following it, already split in tokens (comments starting with ``!`` are removed). The parser then
+converts each block into a Zgoubidoo `Command`, using the data parser registered for its keyword (see
+`DATA_PARSERS`). The commands are created using the fast construction path (`Command.from_attributes`) with the
+attributes expressed in the Zgoubi units.
+
+Commands for which no data parser is available (or for which the data do not follow the supported format) are kept
+verbatim in a `Fake` command, so that the parsed input always reproduces the original input file.
+
+Examples:
+    >>> blocks = list(tokenize(["'DRIFT' D1", "10.0"]))
+    >>> blocks[0]
+    ('DRIFT', 'D1', '', [['10.0']])
+"""
+from __future__ import annotations
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+import logging
+import re
+import numpy as _np
+from georges_core.utils import fortran_float
+from . import ureg as _ureg
+from .commands.commands import Command as _Command
+from .commands.commands import Fake as _Fake
+from .commands.commands import ZgoubidooException as _ZgoubidooException
+from .commands.commands import find_command as _find_command
+from .commands.commands import find_command_by_keyword as _find_command_by_keyword
+from .commands import commands as _commands
+from .commands import actions as _actions
+from .commands import magnetique as _magnetique
+from .commands import objet as _objet_module
+from .commands import particules as _particules
+
+__all__ = ['ZgoubiParserException', 'tokenize', 'parse', 'build', 'DATA_PARSERS']
+_logger = logging.getLogger(__name__)
+
+BlockType = Tuple[str, str, str, List[List[str]]]
+"""Type alias for a tokenized block (keyword, first label, second label and data lines)."""
+
+_KEYWORD_LINE = re.compile(r"^\s*'([^']+)'(.*)$")
+"""Regular expression matching a keyword line."""
+
+_END_KEYWORDS = ('END', 'FIN')
+"""Keywords ending the input (anything after them is ignored)."""
+
+
+class ZgoubiParserException(Exception):
+    """Exception raised for errors when parsing Zgoubi input files."""
+
+    def __init__(self, m):
+        self.message = m
+
+
+def _strip_comment(line: str) -> str:
+    return line.split('!', 1)[0].strip()
+
+
+def tokenize(lines: Iterable[str]) -> Iterator[BlockType]:
+    """Split a Zgoubi input stream in blocks of tokens (one block per command).
+
+    The stream is consumed lazily and can thus be an open file object. The title line (if any) is not part of the
+    blocks (see `parse`). The tokenization stops after the first `END` (or `FIN`) keyword.
+
+    Args:
+        lines: an iterable of lines (e.g. a file object).
+
+    Returns:
+        an iterator over the blocks, as tuples (keyword, label1, label2, data), the data being a list of lines, each of
+        them being a list of tokens.
+    """
+    block: Optional[BlockType] = None
+    for line in lines:
+        m = _KEYWORD_LINE.match(line)
+        if m is not None:
+            if block is not None:
+                yield block
+            labels = _strip_comment(m.group(2)).split()
+            block = (m.group(1).strip().upper(),
+                     labels[0] if len(labels) > 0 else '',
+                     labels[1] if len(labels) > 1 else '',
+                     [],
+                     )
+            if block[0] in _END_KEYWORDS:
+                break
+            continue
+        if block is None:
+            continue  # Title line or leading blank lines
+        tokens = _strip_comment(line).split()
+        if tokens:
+            block[3].append(tokens)
+    if block is not None:
+        yield block
+
+
+def parse(lines: Iterable[str], strict: bool = False) -> Tuple[str, List[_Command]]:
+    """Parse a Zgoubi input stream.
+
+    The first non-empty line is considered to be the title of the input, unless it is already a keyword line.
+
+    Examples:
+        >>> title, commands = parse(["My input", "'MARKER' START", "'END'"])
+        >>> title
+        'My input'
+
+    Args:
+        lines: an iterable of lines (e.g. an open file object or ``stream.splitlines()``).
+        strict: if True, raise an exception for blocks that cannot be parsed (instead of keeping them verbatim).
+
+    Returns:
+        a tuple with the title of the input and the list of commands.
+    """
+    title: str = ''
+    iterator = iter(lines)
+    first_line = ''
+    for first_line in iterator:
+        if first_line.strip():
+            break
+    if _KEYWORD_LINE.match(first_line) is not None:
+        iterator = _chain_first(first_line, iterator)
+    else:
+        title = first_line.strip()
+    return title, [build(*b, strict=strict) for b in tokenize(iterator)]
+
+
+def _chain_first(first: str, iterator: Iterator[str]) -> Iterator[str]:
+    yield first
+    yield from iterator
+
+
+def build(keyword: str, label1: str, label2: str, data: List[List[str]], strict: bool = False) -> _Command:
+    """Build a command from a tokenized block.
+
+    Args:
+        keyword: the Zgoubi keyword of the command.
+        label1: the first label.
+        label2: the second label.
+        data: the data lines (list of tokens).
+        strict: if True, raise an exception if the block cannot be parsed.
+
+    Returns:
+        the command; a `Fake` command holding the original input if the block cannot be parsed.
+
+    Raises:
+        ZgoubiParserException if the block cannot be parsed and ``strict`` is True.
+    """
+    parser = DATA_PARSERS.get(keyword)
+    if parser is None and strict:
+        raise ZgoubiParserException(f"No data parser for keyword {keyword}.")
+    if parser is not None:
+        try:
+            return parser(keyword, label1, label2, data)
+        except (ValueError, IndexError, KeyError, _ZgoubidooException) as e:
+            if strict:
+                raise ZgoubiParserException(f"Unable to parse the data of keyword {keyword} ({label1}): {e}.")
+            _logger.info(f"Unable to parse the data of keyword {keyword} ({label1}): {e}, kept verbatim.")
+    return _verbatim(keyword, label1, label2, data)
+
+
+def _verbatim(keyword: str, label1: str, label2: str, data: List[List[str]]) -> _Command:
+    lines = [' '.join(filter(None, [f"'{keyword}'", label1, label2]))] + [' '.join(tokens) for tokens in data]
+    text = '\n'.join(lines).replace('{', '{{').replace('}', '}}')
+    return _Fake.from_attributes(label1, label2, INPUT=f"\n{text}\n")
+
+
+def _float(token: str) -> float:
+    return fortran_float(token)
+
+
+def _floats(tokens: List[str]) -> List[float]:
+    return list(map(fortran_float, tokens))
+
+
+def _kobj(token: str) -> Tuple[int, int]:
+    _ = token.split('.')
+    return int(_[0]), int(_[1]) if len(_) > 1 and _[1] else 0
+
+
+def _no_data(keyword: str, label1: str, label2: str, data: List[List[str]]) -> _Command:
+    if data:
+        raise ValueError("unexpected data.")
+    return _find_command_by_keyword(keyword).from_attributes(label1, label2)
+
+
+def _drift(keyword: str, label1: str, label2: str, data: List[List[str]]) -> _Command:
+    line = data[0]
+    attributes = {'XL': _float(line[0]) * _ureg.cm, 'SPLIT': False}
+    if len(line) > 1:
+        if line[1].lower() != 'split':
+            raise ValueError("invalid drift data.")
+        attributes['SPLIT'] = True
+        attributes['SPLITS'] = int(line[2])
+        attributes['IL'] = int(line[3]) if len(line) > 3 else 0
+    return _find_command_by_keyword(keyword).from_attributes(label1, label2, **attributes)
+
+
+def _fringe_coefficients(tokens: List[str], face: str) -> Dict[str, float]:
+    coefficients = _floats(tokens[1:7])
+    return {f"C{i}_{face}": c for i, c in enumerate(coefficients)}
+
+
+def _quadrupole(keyword: str, label1: str, label2: str, data: List[List[str]]) -> _Command:
+    xl, r0, b0 = _floats(data[1][0:3])
+    return _magnetique.Quadrupole.from_attributes(
+        label1, label2,
+        IL=int(data[0][0]),
+        XL=xl * _ureg.cm,
+        R0=r0 * _ureg.cm,
+        B0=b0 * _ureg.kilogauss,
+        X_E=_float(data[2][0]) * _ureg.cm,
+        LAM_E=_float(data[2][1]) * _ureg.cm,
+        **_fringe_coefficients(data[3], 'E'),
+        X_S=_float(data[4][0]) * _ureg.cm,
+        LAM_S=_float(data[4][1]) * _ureg.cm,
+        **_fringe_coefficients(data[5], 'S'),
+        XPAS=_float(data[6][0]) * _ureg.cm,
+        KPOS=int(data[7][0]),
+        XCE=_float(data[7][1]) * _ureg.cm,
+        YCE=_float(data[7][2]) * _ureg.cm,
+        ALE=_float(data[7][3]) * _ureg.radian,
+    )
+
+
+def _bend(keyword: str, label1: str, label2: str, data: List[List[str]]) -> _Command:
+    xl, sk, b1 = _floats(data[1][0:3])
+    # The regular constructor is used so that ``post_init`` sees the parsed (chord) length and the flag disabling the
+    # arc length conversion (the fast construction path runs ``post_init`` with the default attributes).
+    return _magnetique.Bend(
+        label1, label2,
+        IL=int(data[0][0]),
+        XL=xl * _ureg.cm,
+        SK=sk * _ureg.radian,
+        B1=b1 * _ureg.kilogauss,
+        X_E=_float(data[2][0]) * _ureg.cm,
+        LAM_E=_float(data[2][1]) * _ureg.cm,
+        W_E=_float(data[2][2]) * _ureg.radian,
+        **_fringe_coefficients(data[3], 'E'),
+        X_S=_float(data[4][0]) * _ureg.cm,
+        LAM_S=_float(data[4][1]) * _ureg.cm,
+        W_S=_float(data[4][2]) * _ureg.radian,
+        **_fringe_coefficients(data[5], 'S'),
+        XPAS=_float(data[6][0]) * _ureg.cm,
+        KPOS=int(data[7][0]),
+        XCE=_float(data[7][1]) * _ureg.cm,
+        YCE=_float(data[7][2]) * _ureg.cm,
+        ALE=_float(data[7][3]) * _ureg.radian,
+        LENGTH_IS_ARC_LENGTH=False,
+    )
+
+
+def _changeref(keyword: str, label1: str, label2: str, data: List[List[str]]) -> _Command:
+    tokens = [t for line in data for t in line]
+    try:  # Old style: XCE, YCE, ALE
+        xce, yce, ale = _floats(tokens)
+        transformations = [['XS', xce * _ureg.cm], ['YS', yce * _ureg.cm], ['ZR', ale * _ureg.degree]]
+    except ValueError:  # New style: pairs of transformations and values
+        if len(tokens) % 2 != 0:
+            raise ValueError("invalid transformations.")
+        transformations = []
+        for t, v in zip(tokens[0::2], tokens[1::2]):
+            t = t.upper()
+            if t not in ('XS', 'YS', 'ZS', 'XR', 'YR', 'ZR'):
+                raise ValueError(f"invalid transformation {t}.")
+            transformations.append([t, _float(v) * (_ureg.cm if t.endswith('S') else _ureg.degree)])
+    return _commands.ChangRef.from_attributes(label1, label2, TRANSFORMATIONS=transformations)
+
+
+def _objet(keyword: str, label1: str, label2: str, data: List[List[str]]) -> _Command:
+    boro = _float(data[0][0]) * _ureg.kilogauss * _ureg.cm
+    kobj, k2 = _kobj(data[1][0])
+    if kobj == 2:
+        imax, idmax = int(data[2][0]), int(data[2][1])
+        particles = data[3:3 + imax]
+        if len(particles) != imax:
+            raise ValueError("invalid number of particles.")
+        try:
+            coordinates = _np.array([p[0:6] for p in particles], dtype=float)
+        except ValueError:  # Fortran-style exponents
+            coordinates = _np.array([_floats(p[0:6]) for p in particles])
+        iex = _np.array([int(i) for line in data[3 + imax:] for i in line], dtype=float)
+        if iex.shape[0] != imax:
+            raise ValueError("invalid number of IEX flags.")
+        o = _objet_module.Objet2.from_attributes(label1, label2, BORO=boro, KOBJ=kobj, K2=k2, IDMAX=idmax)
+        o.add(_np.concatenate([coordinates, iex[:, _np.newaxis]], axis=1))
+        return o
+    elif kobj == 5:
+        if k2 == 0:
+            raise ValueError("unsupported KOBJ=5 without NN.")
+        steps = _floats(data[2][0:6])
+        references = _np.array([_floats(line[0:6]) for line in [data[3]] + data[5:5 + k2 - 1]])
+        attributes = {
+            'BORO': boro,
+            'KOBJ': kobj,
+            'NN': k2,
+            **dict(zip(['PY', 'PT', 'PZ', 'PP', 'PX', 'PD'], steps)),
+            **{k: list(references[:, i]) for i, k in enumerate(['YR', 'TR', 'ZR', 'PR', 'XR', 'DR'])},
+        }
+        if k2 == 1:
+            optics = _floats(data[4][0:10])
+            attributes = {
+                **attributes,
+                'ALPHA_Y': optics[0],
+                'BETA_Y': optics[1] * _ureg.m,
+                'ALPHA_Z': optics[2],
+                'BETA_Z': optics[3] * _ureg.m,
+                'ALPHA_X': optics[4],
+                'BETA_X': optics[5] * _ureg.m,
+                'D_Y': optics[6] * _ureg.m,
+                'D_YP': optics[7],
+                'D_Z': optics[8] * _ureg.m,
+                'D_ZP': optics[9],
+            }
+        return _objet_module.Objet5.from_attributes(label1, label2, **attributes)
+    raise ValueError(f"unsupported KOBJ={kobj}.")
+
+
+def _particule(keyword: str, label1: str, label2: str, data: List[List[str]]) -> _Command:
+    tokens = data[0]
+    try:
+        m, q, g, tau = _floats(tokens[0:4])
+    except ValueError:  # Native particle given by its name
+        return _find_command(tokens[0]).from_attributes(label1 or tokens[0].upper(), label2)
+    return _particules.Particule.from_attributes(label1 or 'PARTICULE', label2,
+                                                 M=m * _ureg.MeV_c2,
+                                                 Q=q * _ureg.coulomb,
+                                                 G=g,
+                                                 tau=tau,
+                                                 )
+
+
+def _faistore(keyword: str, label1: str, label2: str, data: List[List[str]]) -> _Command:
+    return _commands.FaiStore.from_attributes(label1, label2,
+                                              FNAME=data[0][0],
+                                              LABELS=' '.join(data[0][1:]) or 'ALL',
+                                              IP=int(data[1][0]),
+                                              )
+
+
+def _faiscnl(keyword: str, label1: str, label2: str, data: List[List[str]]) -> _Command:
+    binary = data[0][0].lower().startswith('b_')
+    return _actions.Faiscnl.from_attributes(label1, label2, **{
+        'B_FNAME' if binary else 'FNAME': data[0][0],
+        'binary': binary,
+    })
+
+
+def _matrix(keyword: str, label1: str, label2: str, data: List[List[str]]) -> _Command:
+    return _commands.Matrix.from_attributes(label1, label2, IORD=int(data[0][0]), IFOC=int(data[0][1]))
+
+
+def _rebelote(keyword: str, label1: str, label2: str, data: List[List[str]]) -> _Command:
+    line = data[0]
+    if len(data) > 1:
+        raise ValueError("unsupported REBELOTE parameters list.")
+    k, _, n = line[2].partition('.')
+    return _commands.Rebelote.from_attributes(label1, label2,
+                                              NPASS=int(line[0]),
+                                              KWRIT=_float(line[1]),
+                                              K=int(k),
+                                              N=int(n) if n else None,
+                                              LABL1=line[3] if len(line) > 3 else None,
+                                              LABL2=line[4] if len(line) > 4 else None,
+                                              )
+
+
+def _aperture(keyword: str, label1: str, label2: str, data: List[List[str]]) -> _Command:
+    iform, j = _kobj(data[1][0])
+    c1, c2, c3, c4 = _floats(data[1][1:5])
+    return _find_command_by_keyword(keyword).from_attributes(label1, label2,
+                                                             IA=int(data[0][0]),
+                                                             IFORM=iform,
+                                                             J=j,
+                                                             C1=c1 * _ureg.cm,
+                                                             C2=c2 * _ureg.cm,
+                                                             C3=c3 * _ureg.cm,
+                                                             C4=c4 * _ureg.cm,
+                                                             )
+
+
+DATA_PARSERS: Dict[str, Callable[[str, str, str, List[List[str]]], _Command]] = {
+    'BEND': _bend,
+    'CHAMBR': _aperture,
+    'CHANGREF': _changeref,
+    'COLLIMA': _aperture,
+    'DRIFT': _drift,
+    'END': _no_data,
+    'ESL': _drift,
+    'FAISCEAU': _no_data,
+    'FAISCNL': _faiscnl,
+    'FAISTORE': _faistore,
+    'FIN': _no_data,
+    'MARKER': _no_data,
+    'MATRIX': _matrix,
+    'OBJET': _objet,
+    'PARTICUL': _particule,
+    'QUADRUPO': _quadrupole,
+    'REBELOTE': _rebelote,
+    'RESET': _no_data,
+    'YMY': _no_data,
+}
+"""Data parsers, indexed by Zgoubi keyword. Each parser takes the keyword, the labels and the tokenized data lines
+and returns the corresponding command (or raises a `ValueError` if the data are not supported). This registry can be
+extended to support additional keywords."""
@@ -0,0 +1,175 @@
+"""Retention policies for the raw (text) outputs of the Zgoubi runs.
+
+After each run, the raw outputs are kept at several places: the lines of the result file (`zgoubi.res`) concerning
+each command are attached to the command (`Command.output`), along with the results parsed by the command
+(`Command.results`), and the results of the run hold the full standard output and result file (`'stdout'` and
+`'result'`). For long scans, or long-running services, this amounts to a large quantity of text kept alive in memory.
+
+An `OutputRetention` policy bounds this memory usage:
+
+- `max_runs`: only the outputs and results of the last N runs are kept attached to the commands;
+- `keep_raw=False`: the raw outputs are discarded once processed, only the parsed results are kept;
+- `spill_path`: the raw outputs are spilled to disk (in a single append-only file) and are read back only when
+  accessed (see `SpilledOutput`).
+
+The default (process-wide) policy, `output_retention`, keeps everything in memory, as it was always the case.
+
+Examples:
+    >>> zgoubi = Zgoubi(retention=OutputRetention(max_runs=10, spill_path='/tmp'))  # doctest: +SKIP
+"""
+from __future__ import annotations
+from typing import Iterator, List, MutableSequence, Optional, Sequence, Tuple, Union
+from collections import OrderedDict
+import logging
+import os
+import tempfile
+import threading
+import weakref
+
+__all__ = ['OutputRetention', 'SpilledOutput', 'output_retention']
+_logger = logging.getLogger(__name__)
+
+SPILLED_CACHE_SIZE: int = 8
+"""Number of spilled outputs kept in memory once read back (see `SpilledOutput`)."""
+
+_spilled_cache: OrderedDict = OrderedDict()
+_spilled_cache_lock: threading.Lock = threading.Lock()
+
+
+def _remove_spill_file(filename: str):
+    try:
+        os.unlink(filename)
+    except OSError:
+        pass
+    with _spilled_cache_lock:
+        for key in [k for k in _spilled_cache if k[0] == filename]:
+            del _spilled_cache[key]
+
+
+class SpilledOutput(Sequence):
+    """Lines of a raw output spilled to disk, read back (lazily) when accessed.
+
+    The outputs read back are kept in a small cache (see `SPILLED_CACHE_SIZE`), so that successive accesses to the
+    lines of an output (e.g. indexing in a loop) read the spill file only once.
+    """
+
+    def __init__(self, filename: str, offset: int, size: int, length: int, policy: Optional[OutputRetention] = None):
+        """
+        Args:
+            filename: the name of the spill file
+            offset: the offset of the output in the file (in bytes)
+            size: the size of the output (in bytes)
+            length: the number of lines
+            policy: the policy owning the spill file (kept alive, with its spill file, as long as the output)
+        """
+        self._policy: Optional[OutputRetention] = policy
+        self._filename: str = filename
+        self._offset: int = offset
+        self._size: int = size
+        self._length: int = length
+
+    def __repr__(self) -> str:
+        return f"<{self.__class__.__name__} {self._length} lines in {self._filename!r}>"
+
+    @property
+    def lines(self) -> List[str]:
+        """The lines of the output (read from the spill file, or from the cache of the outputs read back)."""
+        key: Tuple[str, int] = (self._filename, self._offset)
+        with _spilled_cache_lock:
+            if key in _spilled_cache:
+                _spilled_cache.move_to_end(key)
+                return _spilled_cache[key]
+        with open(self._filename, 'rb') as f:
+            f.seek(self._offset)
+            lines = f.read(self._size).decode().split('\n')
+        with _spilled_cache_lock:
+            _spilled_cache[key] = lines
+            while len(_spilled_cache) > SPILLED_CACHE_SIZE:
+                _spilled_cache.popitem(last=False)
+        return lines
+
+    def __len__(self) -> int:
+        return self._length
+
+    def __getitem__(self, item):
+        return self.lines[item]
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self.lines)
+
+
+class OutputRetention:
+    """Retention policy for the raw outputs and the results attached to the commands."""
+
+    def __init__(self, max_runs: Optional[int] = None, keep_raw: bool = True, spill_path: Optional[str] = None):
+        """
+        Args:
+            max_runs: number of runs for which the outputs and results are kept attached to the commands (default:
+                      no limit)
+            keep_raw: keep the raw outputs (if False only the parsed results are kept)
+            spill_path: directory in which the raw outputs are spilled (default: the raw outputs are kept in memory)
+        """
+        self._max_runs: Optional[int] = max_runs
+        self._keep_raw: bool = keep_raw
+        self._spill_path: Optional[str] = spill_path
+        self._spill_file: Optional[str] = None
+        self._spill_offset: int = 0
+        self._spill_finalizer: Optional[weakref.finalize] = None
+        self._lock: threading.Lock = threading.Lock()
+
+    @property
+    def max_runs(self) -> Optional[int]:
+        """Number of runs for which the outputs and results are kept attached to the commands."""
+        return self._max_runs
+
+    @property
+    def keep_raw(self) -> bool:
+        """True if the raw outputs are kept (in memory or on disk)."""
+        return self._keep_raw
+
+    def retain(self, lines: Sequence[str]) -> Optional[Union[Sequence[str], SpilledOutput]]:
+        """Apply the policy to a raw output.
+
+        Args:
+            lines: the lines of the raw output.
+
+        Returns:
+            the lines themselves, a `SpilledOutput` if they are spilled to disk, or None if they are discarded.
+        """
+        if not self._keep_raw:
+            return None
+        if self._spill_path is None or isinstance(lines, SpilledOutput):
+            return lines
+        data = '\n'.join(lines).encode()
+        with self._lock:
+            if self._spill_file is None:
+                fd, self._spill_file = tempfile.mkstemp(prefix='zgoubidoo-outputs-', dir=self._spill_path)
+                os.close(fd)
+                # Removed when the policy is cleared or garbage collected, or at exit (a single hook per process)
+                self._spill_finalizer = weakref.finalize(self, _remove_spill_file, self._spill_file)
+            with open(self._spill_file, 'ab') as f:
+                f.write(data)
+            offset = self._spill_offset
+            self._spill_offset += len(data)
+            return SpilledOutput(self._spill_file, offset, len(data), len(lines), self)
+
+    def trim(self, entries: MutableSequence):
+        """Discard the oldest entries (outputs or results of the runs) in excess of the policy's limit.
+
+        Args:
+            entries: the list of entries (e.g. `Command.output` or `Command.results`), modified in place.
+        """
+        if self._max_runs is not None and len(entries) > self._max_runs:
+            del entries[:len(entries) - self._max_runs]
+
+    def clear(self):
+        """Remove the spill file (the spilled outputs become unavailable)."""
+        with self._lock:
+            if self._spill_file is not None:
+                self._spill_finalizer()
+                self._spill_file = None
+                self._spill_offset = 0
+
+
+output_retention: OutputRetention = OutputRetention()
+"""Default (process-wide) retention policy: all the outputs are kept in memory."""
@@ -0,0 +1,306 @@
+"""Segmented execution: restart the tracking from stored coordinates instead of from the start of the line.
+
+For scans changing only the parameters of the last elements of a long line (e.g. matching at the end of a transfer
+line), most of the tracking time is spent in the unchanged upstream part of the line. A `SegmentedInput` avoids it:
+
+- a baseline run of the complete line stores the particle coordinates at the exit of a set of split markers (using
+  `FaiStore`);
+- each mapping which only changes elements located downstream of a split marker is then run on a segment of the line,
+  starting at the most downstream of these markers with an `Objet2` holding the stored coordinates;
+- the other mappings are run on the complete line.
+
+The commands located upstream of the split marker which are not tracking elements (e.g. `Particule`, `Scaling`, the
+actions) are kept at the head of the segments. Note that the path length (`S`) and time of the particles restart from
+zero in the segments. Inputs using `Rebelote`, `Goto` or `Fit` (which relies on the element numbering) cannot be
+segmented.
+
+Examples:
+    >>> segmented = SegmentedInput(zi, markers=['M1', 'M2'])  # doctest: +SKIP
+    >>> segmented.baseline()  # doctest: +SKIP
+    >>> results = segmented(mappings=[{'Q9.K1': 1.0}, {'Q9.K1': 1.1}])  # doctest: +SKIP
+"""
+from __future__ import annotations
+from typing import Dict, Iterable, List, Optional, Tuple
+import logging
+import numpy as _np
+import pandas as _pd
+from .commands.commands import Command as _Command
+from .commands.actions import Action as _Action
+from .commands.actions import Fit as _Fit
+from .commands.actions import Goto as _Goto
+from .commands.beam import Beam as _Beam
+from .commands.commands import FaiStore as _FaiStore
+from .commands.commands import Ordre as _Ordre
+from .commands.commands import Rebelote as _Rebelote
+from .commands.commands import Scaling as _Scaling
+from .commands.mcobjet import MCObjet as _MCObjet
+from .commands.objet import Objet as _Objet
+from .commands.objet import Objet2 as _Objet2
+from .commands.particules import Particule as _Particule
+from .input import Input as _Input
+from .mappings import MappedParametersType as _MappedParametersType
+from .mappings import MappedParametersListType as _MappedParametersListType
+from .mappings import mapping_key as _mapping_key
+from .outputs import read_fai_file as _read_fai_file
+from .zgoubi import Zgoubi as _Zgoubi
+from .zgoubi import ZgoubiResults as _ZgoubiResults
+
+__all__ = ['SegmentationException', 'SegmentedInput', 'particles_from_fai', 'restart_head']
+_logger = logging.getLogger(__name__)
+
+SEGMENTS_FILENAME: str = 'segments.fai'
+"""Name of the file in which the coordinates at the split markers are stored by the baseline run."""
+
+SEGMENT_HEAD_COMMANDS: Tuple[type, ...] = (_Particule, _Action, _FaiStore, _Ordre, _Scaling)
+"""Types of the commands located upstream of a split marker which are kept at the head of the segments."""
+
+
+class SegmentationException(Exception):
+    """Exception raised for errors in the segmented execution."""
+
+    def __init__(self, m):
+        self.message = m
+
+
+def _column(df: _pd.DataFrame, *names: str) -> _np.ndarray:
+    for n in names:
+        if n in df.columns:
+            return df[n].values.astype(float)
+    raise SegmentationException(f"Columns {names} not found in the stored coordinates.")
+
+
+def _element(parameter) -> str:
+    """LABEL1 of the element of a mapped parameter (e.g. 'Q1' for 'Q1.B0')."""
+    return parameter.split('.')[0] if isinstance(parameter, str) else parameter[0]
+
+
+def particles_from_fai(fai: _pd.DataFrame) -> _np.ndarray:
+    """Coordinates of the particles stored in a .fai file, in the format (and units) expected by `Objet2`.
+
+    Args:
+        fai: the content of the .fai file (see `zgoubidoo.outputs.read_fai_file`).
+
+    Returns:
+        the coordinates (Y, T, Z, P, X, D, IEX) of the particles (one row per row of the .fai file).
+    """
+    return _np.stack([
+        _column(fai, 'Y-DY', 'Y'),
+        _column(fai, 'T'),
+        _column(fai, 'Z'),
+        _column(fai, 'P'),
+        _np.zeros(len(fai)),
+        _column(fai, 'D-1') + 1.0,
+        _np.where(_column(fai, '# KEX', 'KEX') > 0, 1.0, -1.0),
+    ], axis=1)
+
+
+def read_segments_file(filename: str = SEGMENTS_FILENAME, path: str = '.') -> Dict[str, _np.ndarray]:
+    """Read the coordinates stored at the split markers (in Zgoubi units, as expected by `Objet2`).
+
+    Args:
+        filename: the name of the .fai file
+        path: the path to the .fai file
+
+    Returns:
+        the coordinates (Y, T, Z, P, X, D, IEX) of the particles, indexed by LABEL1 of the markers.
+    """
+    fai = _read_fai_file(filename=filename, path=path)
+    fai['LABEL1'] = fai['LABEL1'].astype(str).str.strip()
+    fai = fai.sort_values('IT', kind='stable')
+    particles = particles_from_fai(fai)
+    return {label: particles[indices] for label, indices in fai.groupby('LABEL1').indices.items()}
+
+
+def restart_head(zgoubi_input: _Input, particles: _np.ndarray, label: str = 'SEGMENT') -> List[_Command]:
+    """Head of an input sequence restarting the tracking from given coordinates: an `Objet2` holding the coordinates
+    (with the reference rigidity of the beam or objet of the input sequence), followed by the particle of the beam.
+
+    Args:
+        zgoubi_input: the input sequence
+        particles: the coordinates of the particles (see `Objet2.add`)
+        label: the LABEL1 of the `Objet2`
+
+    Returns:
+        the list of commands.
+
+    Raises:
+        SegmentationException if the input sequence has no beam nor objet.
+    """
+    beam = zgoubi_input.beam
+    objets = zgoubi_input.line.filter((_Objet, _MCObjet))
+    if beam is not None:
+        objet = _Objet2(label, BORO=beam.kinematics.brho)
+        head = [objet, beam.particle()]
+    elif objets:
+        objet = _Objet2(label, BORO=objets[0].BORO)
+        head = [objet]
+    else:
+        raise SegmentationException("No beam or objet found in the input sequence.")
+    objet.add(particles)
+    return head
+
+
+class SegmentedInput:
+    """Execution of an input sequence restarting the tracking from coordinates stored at split markers."""
+
+    def __init__(self, zgoubi_input: _Input, markers: Iterable[str], zgoubi: Optional[_Zgoubi] = None):
+        """
+        Args:
+            zgoubi_input: the input sequence
+            markers: LABEL1 of the commands (typically markers) at the exit of which the coordinates are stored
+            zgoubi: the Zgoubi executable used for the runs (default: a new instance)
+
+        Raises:
+            SegmentationException if the input sequence cannot be segmented or if a marker is not found.
+        """
+        if zgoubi_input.line.filter((_Rebelote, _Goto, _Fit)):
+            raise SegmentationException("Inputs using Rebelote, Goto or Fit cannot be segmented.")
+        self._input: _Input = zgoubi_input
+        self._labels: Dict[str, int] = {e.LABEL1: i for i, e in enumerate(zgoubi_input.line)}
+        self._markers: List[str] = sorted(set(markers), key=lambda _: self._index(_))
+        self._zgoubi: _Zgoubi = zgoubi or _Zgoubi()
+        self._stored: Dict[Tuple, Dict[str, _np.ndarray]] = {}
+        self._baseline: _MappedParametersType = {}
+
+    def _index(self, label: str) -> int:
+        try:
+            return self._labels[label]
+        except KeyError:
+            raise SegmentationException(f"Element {label} not found in the input sequence.")
+
+    @property
+    def markers(self) -> List[str]:
+        """The split markers (in sequence order)."""
+        return list(self._markers)
+
+    def _split_beam_mapping(self, mapping: _MappedParametersType) -> Tuple[Tuple, _MappedParametersType]:
+        """Key of the beam part of a mapping (e.g. the beam slice) and the other parameters."""
+        beam = self._input.beam
+        prefix = f"{beam.LABEL1}." if beam is not None else None
+        beam_mapping = {k: v for k, v in mapping.items() if prefix is not None and str(k).startswith(prefix)}
+        return _mapping_key(beam_mapping), {k: v for k, v in mapping.items() if k not in beam_mapping}
+
+    def _run(self, zgoubi_input: _Input, mappings: _MappedParametersListType) -> List:
+        """Submit the runs of an input sequence and provide their paths (to collect their results)."""
+        before = {id(p[1]) for p in zgoubi_input.paths}
+        self._zgoubi(zgoubi_input, mappings=mappings)
+        return [p[1] for p in zgoubi_input.paths if id(p[1]) not in before]
+
+    def baseline(self, mapping: Optional[_MappedParametersType] = None) -> _ZgoubiResults:
+        """Run the complete line and store the coordinates at the split markers.
+
+        Args:
+            mapping: the mapping of the baseline run (the segments are only valid for changes with respect to it).
+
+        Returns:
+            the results of the baseline run(s) (one per beam mapping).
+        """
+        line = list(self._input.line)
+        head = max([i + 1 for i, e in enumerate(line) if isinstance(e, (_Beam, _Objet, _MCObjet, _Particule))] or [0])
+        line.insert(head, _FaiStore('SEGMENTS', FNAME=SEGMENTS_FILENAME, LABELS=' '.join(self._markers)))
+        results = self._zgoubi.collect(paths=self._run(_Input(name=self._input.name, line=line), [mapping or {}]))
+        self._stored = {}
+        for m, r in results.results:
+            try:
+                stored = read_segments_file(path=getattr(r['path'], 'name', r['path']))
+            except FileNotFoundError:
+                _logger.warning(f"Coordinates at the split markers not stored for mapping {m}.")
+                continue
+            self._stored[self._split_beam_mapping(m)[0]] = stored
+        self._baseline = dict(mapping or {})
+        return results
+
+    def restart_point(self, mapping: _MappedParametersType) -> Optional[str]:
+        """The split marker from which a mapping can be run (the most downstream marker located upstream of all the
+        elements changed by the mapping).
+
+        Args:
+            mapping: the mapping.
+
+        Returns:
+            the LABEL1 of the marker, None if the mapping must be run on the complete line.
+        """
+        beam_key, parameters = self._split_beam_mapping(mapping)
+        stored = self._stored.get(beam_key)
+        if stored is None:
+            return None
+        changed = []
+        for k in {**self._baseline, **parameters}.keys():
+            label = _element(k)
+            if self._baseline.get(k) is not None and _mapping_key({k: self._baseline[k]}) == \
+                    _mapping_key({k: parameters.get(k)}):
+                continue
+            if label not in self._labels:
+                return None  # e.g. 'ALL_LINE' parameters
+            changed.append(self._labels[label])
+        first_changed = min(changed, default=len(self._input.line))
+        candidates = [m for m in self._markers if self._labels[m] < first_changed and m in stored]
+        return candidates[-1] if candidates else None
+
+    def segment_parameters(self, marker: str, parameters: _MappedParametersType) -> _MappedParametersType:
+        """Parameters of a mapping applied to the segment starting at the exit of a split marker.
+
+        The parameters of the elements located upstream of the marker (unchanged with respect to the baseline, see
+        `restart_point`) are dropped, as these elements are not part of the segment.
+
+        Args:
+            marker: the LABEL1 of the split marker
+            parameters: the parameters of the mapping (without the beam parameters)
+
+        Returns:
+            the parameters of the elements of the segment.
+        """
+        index = self._index(marker)
+        return {k: v for k, v in parameters.items() if self._labels.get(_element(k), -1) > index}
+
+    def segment(self, marker: str, particles: _np.ndarray) -> _Input:
+        """Input sequence starting at the exit of a split marker.
+
+        Args:
+            marker: the LABEL1 of the split marker
+            particles: the coordinates of the particles at the exit of the marker
+
+        Returns:
+            the segment of the input sequence.
+        """
+        index = self._index(marker)
+        head = restart_head(self._input, particles)
+        line = list(self._input.line)
+        head += [e for e in line[:index + 1] if isinstance(e, SEGMENT_HEAD_COMMANDS)]
+        return _Input(name=f"{self._input.name}_from_{marker}", line=head + line[index + 1:])
+
+    def __call__(self, mappings: Optional[_MappedParametersListType] = None) -> _ZgoubiResults:
+        """Run the mappings, restarting from the split markers whenever possible.
+
+        Args:
+            mappings: the mappings to run (the beam mappings of the input are added).
+
+        Returns:
+            the results of all the runs (with the complete mappings).
+        """
+        mappings = mappings or [{}]
+        if self._input.beam_mappings:
+            mappings = [{**m, **b} for m in mappings for b in self._input.beam_mappings]
+        groups: Dict[Tuple, List[_MappedParametersType]] = {}
+        for m in mappings:
+            marker = self.restart_point(m)
+            groups.setdefault((marker, self._split_beam_mapping(m)[0] if marker else None), []).append(m)
+        paths = []
+        restored: Dict[Tuple[int, Tuple], List[_MappedParametersType]] = {}
+        for (marker, beam_key), group in groups.items():
+            if marker is None:  # The beam mappings are added back by the input sequence
+                parameters = {_mapping_key(p): p for p in (self._split_beam_mapping(m)[1] for m in group)}
+                paths += self._run(self._input, list(parameters.values()))
+                continue
+            _logger.info(f"Restarting {len(group)} mapping(s) from marker {marker}.")
+            segment = self.segment(marker, self._stored[beam_key][marker])
+            parameters = [self.segment_parameters(marker, self._split_beam_mapping(m)[1]) for m in group]
+            for m, p in zip(group, parameters):
+                restored.setdefault((id(segment), _mapping_key(p)), []).append(m)
+            paths += self._run(segment, parameters)
+        results = self._zgoubi.collect(paths=paths)
+        for r in results._results:
+            key = (id(r['input']), _mapping_key(r['mapping']))
+            if restored.get(key):
+                r['mapping'] = restored[key].pop(0)
+        return results
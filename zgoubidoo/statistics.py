@@ -0,0 +1,193 @@
+"""Streaming beam statistics computed from the Zgoubi tracks.
+
+The `BeamStatistics` accumulator computes beam moments grouped by any set of track columns (e.g. per element and per
+pass, with ``by=['LABEL1', 'IPASS']``) without keeping the tracks in memory: the tracks are processed by chunks and
+only the sums required for the moments are accumulated (counts, first and second order sums, minima and maxima). The
+accumulators are mergeable (``a + b``), so that the statistics of multiple runs, possibly computed in different
+processes, can be combined exactly.
+
+The available statistics are (see `BeamStatistics.to_df`):
+
+- ``'centroid'``: mean of the coordinates (``MEAN_Y``, ``MEAN_T``, ...);
+- ``'sigma'``: beam (covariance) matrix elements (``SIGMA_Y_Y``, ``SIGMA_Y_T``, ...);
+- ``'emittance'``: rms emittances of the transverse planes (``EMIT_Y``, ``EMIT_Z``);
+- ``'transmission'``: number of particles, of surviving particles (``IEX > 0``) and transmission;
+- ``'envelope'``: minimum and maximum of the coordinates (``MIN_Y``, ``MAX_Y``, ...).
+
+The moments are computed on the surviving particles only.
+
+Examples:
+    >>> stats = BeamStatistics(by=['LABEL1'])
+    >>> for chunk in iter_plt_file(columns=stats.columns):  # doctest: +SKIP
+    ...     stats.update(chunk)
+    >>> stats.to_df(['centroid', 'emittance'])  # doctest: +SKIP
+"""
+from __future__ import annotations
+from typing import Any, Dict, List, Mapping, Optional, Sequence
+import itertools
+import numpy as _np
+import pandas as _pd
+from .outputs import iter_plt_file
+
+__all__ = ['BeamStatistics', 'BEAM_STATISTICS', 'COORDINATES']
+
+COORDINATES: List[str] = ['Y', 'T', 'Z', 'P', 'D-1']
+"""Coordinates (columns of the tracks) used for the beam moments."""
+
+BEAM_STATISTICS: List[str] = ['centroid', 'sigma', 'emittance', 'transmission', 'envelope']
+"""Available beam statistics."""
+
+_PAIRS = list(itertools.combinations_with_replacement(range(len(COORDINATES)), 2))
+
+
+def _name(c: str) -> str:
+    return 'D' if c == 'D-1' else c
+
+
+class BeamStatistics:
+    """Mergeable accumulator of beam moments, grouped by track columns."""
+
+    def __init__(self, by: Sequence[str] = ('LABEL1', 'IPASS')):
+        """
+        Args:
+            by: the columns of the tracks used to group the particles.
+        """
+        self._by: List[str] = list(by)
+        self._sums: Optional[_pd.DataFrame] = None
+        self._min: Optional[_pd.DataFrame] = None
+        self._max: Optional[_pd.DataFrame] = None
+
+    @property
+    def by(self) -> List[str]:
+        """The columns used to group the particles."""
+        return self._by
+
+    @property
+    def columns(self) -> List[str]:
+        """Columns of the tracks required to compute the statistics."""
+        return list(dict.fromkeys(self._by + COORDINATES + ['KEX']))
+
+    def update(self, tracks: _pd.DataFrame) -> BeamStatistics:
+        """Accumulate the moments of a set of tracks (e.g. a chunk of a .plt file).
+
+        Args:
+            tracks: the tracks.
+
+        Returns:
+            the accumulator itself.
+        """
+        if len(tracks) == 0:
+            return self
+        alive = (tracks['KEX'].values > 0).astype(float)
+        coordinates = tracks[COORDINATES].values * alive[:, _np.newaxis]
+        data = {
+            'N': _np.ones(len(tracks)),
+            'N_ALIVE': alive,
+            **{f"S_{i}": coordinates[:, i] for i in range(len(COORDINATES))},
+            **{f"S_{i}_{j}": coordinates[:, i] * coordinates[:, j] for i, j in _PAIRS},
+        }
+        sums = _pd.DataFrame({**{b: tracks[b].values for b in self._by}, **data}).groupby(self._by, observed=True).sum()
+        survivors = tracks.loc[alive > 0, self._by + COORDINATES].groupby(self._by, observed=True)[COORDINATES]
+        minima, maxima = survivors.min(), survivors.max()
+        sums.index.names = minima.index.names = maxima.index.names = self._by
+        self._merge(sums, minima, maxima)
+        return self
+
+    def _merge(self, sums: _pd.DataFrame, minima: _pd.DataFrame, maxima: _pd.DataFrame):
+        if self._sums is None:
+            self._sums, self._min, self._max = sums, minima, maxima
+            return
+        self._sums = self._sums.add(sums, fill_value=0.0)
+        self._min = _pd.concat([self._min, minima]).groupby(level=self._by).min()
+        self._max = _pd.concat([self._max, maxima]).groupby(level=self._by).max()
+
+    def merge(self, other: BeamStatistics) -> BeamStatistics:
+        """Merge (in place) the moments accumulated by another accumulator (e.g. for another run).
+
+        Args:
+            other: the other accumulator (grouped by the same columns).
+
+        Returns:
+            the accumulator itself.
+        """
+        if other._by != self._by:
+            raise ValueError("Unable to merge beam statistics grouped by different columns.")
+        if other._sums is not None:
+            self._merge(other._sums, other._min, other._max)
+        return self
+
+    def __add__(self, other: BeamStatistics) -> BeamStatistics:
+        return BeamStatistics(self._by).merge(self).merge(other)
+
+    def update_from_file(self, filename: str = 'zgoubi.plt', path: str = '.', chunksize: int = 100000):
+        """Accumulate the moments of the tracks of a .plt file, read by chunks.
+
+        Args:
+            filename: the name of the file
+            path: the path to the .plt file
+            chunksize: the number of rows of each chunk
+
+        Returns:
+            the accumulator itself.
+        """
+        for chunk in iter_plt_file(filename=filename, path=path, columns=self.columns, chunksize=chunksize):
+            self.update(chunk)
+        return self
+
+    @classmethod
+    def reducer(cls, by: Sequence[str] = ('LABEL1', 'IPASS')):
+        """Reducer computing the statistics of each run in the workers (see the `reducer` option of `Zgoubi`).
+
+        Examples:
+            >>> z = Zgoubi(parse_outputs=['plt'], reducer=BeamStatistics.reducer(by=['LABEL1']))  # doctest: +SKIP
+
+        Args:
+            by: the columns of the tracks used to group the particles.
+
+        Returns:
+            a callable taking the parsed outputs and the mapping of a run.
+        """
+        def _reduce(outputs: Mapping[str, Any], mapping: Mapping) -> Optional[BeamStatistics]:
+            if outputs.get('plt') is None:
+                return None
+            return cls(by).update(outputs['plt'])
+        return _reduce
+
+    def to_df(self, stats: Optional[Sequence[str]] = None) -> _pd.DataFrame:
+        """Compute the statistics.
+
+        Args:
+            stats: the statistics to compute (see `BEAM_STATISTICS`, default: all).
+
+        Returns:
+            a dataframe indexed by the grouping columns.
+        """
+        stats = list(stats or BEAM_STATISTICS)
+        for s in stats:
+            if s not in BEAM_STATISTICS:
+                raise ValueError(f"Invalid beam statistics '{s}'.")
+        if self._sums is None:
+            return _pd.DataFrame()
+        n = self._sums['N_ALIVE'].values
+        with _np.errstate(invalid='ignore', divide='ignore'):
+            means = {i: self._sums[f"S_{i}"].values / n for i in range(len(COORDINATES))}
+            sigma = {(i, j): self._sums[f"S_{i}_{j}"].values / n - means[i] * means[j] for i, j in _PAIRS}
+        results: Dict[str, _np.ndarray] = {}
+        if 'transmission' in stats:
+            results['N'] = self._sums['N'].values
+            results['N_ALIVE'] = n
+            results['TRANSMISSION'] = n / self._sums['N'].values
+        if 'centroid' in stats:
+            for i, c in enumerate(COORDINATES):
+                results[f"MEAN_{_name(c)}"] = means[i]
+        if 'sigma' in stats:
+            for i, j in _PAIRS:
+                results[f"SIGMA_{_name(COORDINATES[i])}_{_name(COORDINATES[j])}"] = sigma[(i, j)]
+        if 'emittance' in stats:
+            results['EMIT_Y'] = _np.sqrt(_np.maximum(sigma[(0, 0)] * sigma[(1, 1)] - sigma[(0, 1)] ** 2, 0.0))
+            results['EMIT_Z'] = _np.sqrt(_np.maximum(sigma[(2, 2)] * sigma[(3, 3)] - sigma[(2, 3)] ** 2, 0.0))
+        df = _pd.DataFrame(results, index=self._sums.index)
+        if 'envelope' in stats:
+            df = df.join(self._min.rename(columns=lambda _: f"MIN_{_name(_)}"))
+            df = df.join(self._max.rename(columns=lambda _: f"MAX_{_name(_)}"))
+        return df
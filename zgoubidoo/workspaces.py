@@ -0,0 +1,317 @@
+"""Scratch workspaces (run directories) for the Zgoubi input and output files.
+
+Each Zgoubi run happens in its own directory, in which the input file is written and the output files (`zgoubi.res`,
+`zgoubi.plt`, etc.) are produced. The `WorkspaceManager` provides these directories:
+
+- the directories can be placed on a RAM-backed filesystem (tmpfs, typically `/dev/shm`), within a cap on the total
+  size of the workspaces stored in RAM (opt-in: set `ZGOUBIDOO_RAM_PATH` for the default manager); the size of a
+  workspace is measured once its run is completed (see `Workspace.settle`): if the cap is then exceeded (or if the RAM
+  filesystem is almost full) its content is moved to the regular temporary directory, and the new workspaces are
+  created on disk until RAM is available again;
+- released directories are emptied in a background thread and pooled, to be reused by the next runs instead of
+  creating new temporary directories.
+
+A `Workspace` can be used in place of a `tempfile.TemporaryDirectory` (it provides the `name` attribute and the
+`cleanup` method); it is released automatically when garbage collected.
+
+Examples:
+    >>> manager = WorkspaceManager(ram_path=None)
+    >>> w = manager.acquire()
+    >>> os.path.isdir(w.name)
+    True
+    >>> w.cleanup()
+"""
+from __future__ import annotations
+from typing import Dict, List, Optional
+import atexit
+import logging
+import os
+import shutil
+import tempfile
+import threading
+import weakref
+from concurrent.futures import ThreadPoolExecutor as _ThreadPoolExecutor
+
+__all__ = ['WorkspaceException', 'Workspace', 'WorkspaceManager', 'workspace_manager']
+_logger = logging.getLogger(__name__)
+
+RAM_PATH: str = '/dev/shm'
+"""Default location of the RAM-backed filesystem."""
+
+RAM_CAP: int = 2 * 1024 ** 3
+"""Default cap (in bytes) on the total size of the workspaces stored in RAM."""
+
+RAM_MIN_FREE: int = 256 * 1024 ** 2
+"""Minimum free space (in bytes) to be kept on the RAM-backed filesystem."""
+
+
+class WorkspaceException(Exception):
+    """Exception raised for errors in the workspaces module."""
+
+    def __init__(self, m):
+        self.message = m
+
+
+class Workspace:
+    """A scratch directory provided by a `WorkspaceManager`.
+
+    Compatible with `tempfile.TemporaryDirectory`: the path is given by `name` and `cleanup` releases the directory
+    (its content is removed and the directory is returned to the manager's pool).
+    """
+
+    def __init__(self, name: str, manager: WorkspaceManager, in_ram: bool = False):
+        self.name: str = name
+        self.in_ram: bool = in_ram
+        self._manager: WorkspaceManager = manager
+        self._finalizer = weakref.finalize(self, manager.release_path, name)
+
+    def __repr__(self) -> str:
+        return f"<{self.__class__.__name__} {self.name!r}>"
+
+    def __enter__(self) -> str:
+        return self.name
+
+    def __exit__(self, exc, value, tb):
+        self.cleanup()
+
+    def cleanup(self):
+        """Release the workspace (its content is removed asynchronously)."""
+        self._finalizer()
+
+    def settle(self) -> str:
+        """Account for the content of the workspace (e.g. once its run is completed), see `WorkspaceManager.settle`.
+
+        Returns:
+            the path of the workspace (it changes if its content is moved from RAM to disk).
+        """
+        return self._manager.settle(self)
+
+
+def _directory_size(path: str) -> int:
+    size = 0
+    for entry in os.scandir(path):
+        try:
+            if entry.is_dir(follow_symlinks=False):
+                size += _directory_size(entry.path)
+            else:
+                size += entry.stat(follow_symlinks=False).st_size
+        except OSError:
+            pass
+    return size
+
+
+def _empty_directory(path: str):
+    for entry in os.scandir(path):
+        if entry.is_dir(follow_symlinks=False):
+            shutil.rmtree(entry.path, ignore_errors=True)
+        else:
+            try:
+                os.unlink(entry.path)
+            except OSError:
+                pass
+
+
+def _remove_directories(paths: List[str]):
+    for path in paths:
+        shutil.rmtree(path, ignore_errors=True)
+    paths.clear()
+
+
+_managers: weakref.WeakSet = weakref.WeakSet()
+"""Live workspace managers, shut down at exit by a single exit hook (see `_shutdown_managers`)."""
+
+
+@atexit.register
+def _shutdown_managers():
+    for manager in list(_managers):
+        manager.shutdown()
+
+
+class WorkspaceManager:
+    """Provides pooled scratch workspaces, in RAM when possible.
+
+    Examples:
+        >>> manager = WorkspaceManager(ram_path=RAM_PATH, ram_cap=512 * 1024 ** 2, pool_size=16)
+        >>> with manager.acquire() as path:
+        ...     pass
+    """
+
+    def __init__(self,
+                 ram_path: Optional[str] = None,
+                 ram_cap: int = RAM_CAP,
+                 ram_min_free: int = RAM_MIN_FREE,
+                 disk_path: Optional[str] = None,
+                 pool_size: int = 64,
+                 ):
+        """
+        Args:
+            ram_path: location of the RAM-backed filesystem (None, the default, to disable the use of RAM)
+            ram_cap: cap (in bytes) on the total size of the workspaces stored in RAM
+            ram_min_free: minimum free space (in bytes) to keep on the RAM-backed filesystem
+            disk_path: location of the workspaces on disk (default to the system temporary directory)
+            pool_size: maximum number of (empty) directories kept for reuse
+        """
+        self._ram_path: Optional[str] = ram_path if ram_path and os.access(ram_path, os.W_OK) else None
+        self._ram_cap: int = ram_cap
+        self._ram_min_free: int = ram_min_free
+        self._disk_path: Optional[str] = disk_path
+        self._pool_size: int = pool_size
+        self._roots: List[str] = []
+        self._ram_root: Optional[str] = None
+        self._disk_root: Optional[str] = None
+        self._pool: List[str] = []
+        self._ram_pool: List[str] = []
+        self._ram_usage: Dict[str, int] = {}
+        self._ram_usage_total: int = 0
+        self._lock: threading.Lock = threading.Lock()
+        self._cleaner: _ThreadPoolExecutor = _ThreadPoolExecutor(max_workers=1)
+        self._closed: bool = False
+        _managers.add(self)
+        # The directories of a manager garbage collected without being shut down are removed as well
+        self._finalizer = weakref.finalize(self, _remove_directories, self._roots)
+        self._finalizer.atexit = False
+
+    @property
+    def ram_enabled(self) -> bool:
+        """True if the workspaces can be placed on a RAM-backed filesystem."""
+        return self._ram_path is not None
+
+    def _root(self, in_ram: bool) -> str:
+        with self._lock:
+            if in_ram:
+                if self._ram_root is None:
+                    self._ram_root = tempfile.mkdtemp(prefix='zgoubidoo-', dir=self._ram_path)
+                    self._roots.append(self._ram_root)
+                return self._ram_root
+            if self._disk_root is None:
+                self._disk_root = tempfile.mkdtemp(prefix='zgoubidoo-', dir=self._disk_path)
+                self._roots.append(self._disk_root)
+            return self._disk_root
+
+    @property
+    def ram_usage(self) -> int:
+        """Total size (in bytes) of the settled workspaces currently stored in RAM."""
+        return self._ram_usage_total
+
+    def _ram_available(self) -> bool:
+        if self._ram_path is None:
+            return False
+        try:
+            if shutil.disk_usage(self._ram_path).free < self._ram_min_free:
+                return False
+        except OSError:
+            return False
+        return self._ram_usage_total < self._ram_cap
+
+    def _account(self, path: str, size: int):
+        with self._lock:
+            self._ram_usage_total += size - self._ram_usage.pop(path, 0)
+            if size > 0:
+                self._ram_usage[path] = size
+
+    def settle(self, workspace: Workspace) -> str:
+        """Account for the size of a workspace stored in RAM, and move it to disk if the RAM budget is exceeded.
+
+        The budget (cap on the total size and minimum free space of the RAM filesystem) cannot be enforced while the
+        outputs are being written: it is checked when the workspace is settled (e.g. after each run), and the content
+        of the workspace is then moved to disk if needed, so that the RAM filesystem never fills up with the outputs of
+        many runs. Only the settled workspace is measured.
+
+        Args:
+            workspace: the workspace
+
+        Returns:
+            the path of the workspace (it changes if its content is moved to disk).
+        """
+        if not workspace.in_ram or self._closed:
+            return workspace.name
+        try:
+            self._account(workspace.name, _directory_size(workspace.name))
+            full = shutil.disk_usage(self._ram_path).free < self._ram_min_free
+        except OSError:
+            return workspace.name
+        if not full and self._ram_usage_total <= self._ram_cap:
+            return workspace.name
+        path = tempfile.mkdtemp(dir=self._root(False))
+        for entry in os.scandir(workspace.name):
+            shutil.move(entry.path, os.path.join(path, entry.name))
+        _logger.info(f"RAM budget exceeded, workspace {workspace.name} moved to {path}.")
+        workspace._finalizer.detach()
+        self._account(workspace.name, 0)
+        self.release_path(workspace.name)
+        workspace.name = path
+        workspace.in_ram = False
+        workspace._finalizer = weakref.finalize(workspace, self.release_path, path)
+        return path
+
+    def acquire(self, ram: bool = True) -> Workspace:
+        """Provide a new (empty) workspace.
+
+        Args:
+            ram: place the workspace in RAM if possible
+
+        Returns:
+            the workspace.
+        """
+        if self._closed:
+            raise WorkspaceException("The workspace manager has been shut down.")
+        in_ram = ram and self._ram_available()
+        with self._lock:
+            pool = self._ram_pool if in_ram else self._pool
+            if pool:
+                return Workspace(pool.pop(), self, in_ram)
+        return Workspace(tempfile.mkdtemp(dir=self._root(in_ram)), self, in_ram)
+
+    def release_path(self, path: str):
+        """Release a workspace directory: its content is removed in the background, then it is pooled for reuse.
+
+        Args:
+            path: the path of the workspace directory.
+        """
+        if self._closed:
+            shutil.rmtree(path, ignore_errors=True)
+            return
+        try:
+            self._cleaner.submit(self._recycle, path)
+        except RuntimeError:  # Cleaner already shut down
+            shutil.rmtree(path, ignore_errors=True)
+
+    def _recycle(self, path: str):
+        self._account(path, 0)
+        try:
+            _empty_directory(path)
+        except OSError:
+            shutil.rmtree(path, ignore_errors=True)
+            return
+        in_ram = self._ram_root is not None and os.path.dirname(path) == self._ram_root
+        with self._lock:
+            pool = self._ram_pool if in_ram else self._pool
+            if len(self._pool) + len(self._ram_pool) < self._pool_size and not self._closed:
+                pool.append(path)
+                return
+        shutil.rmtree(path, ignore_errors=True)
+
+    def wait(self):
+        """Wait for the completion of the pending cleanups."""
+        self._cleaner.submit(lambda: None).result()
+
+    def shutdown(self):
+        """Remove all the workspaces (including the ones still in use) and stop the background cleanup."""
+        if self._closed:
+            return
+        self._closed = True
+        self._cleaner.shutdown(wait=True)
+        _managers.discard(self)
+        with self._lock:
+            _remove_directories(self._roots)
+            self._pool = []
+            self._ram_pool = []
+            self._ram_usage = {}
+            self._ram_usage_total = 0
+
+
+workspace_manager: WorkspaceManager = WorkspaceManager(
+    ram_path=os.environ.get('ZGOUBIDOO_RAM_PATH') or None,
+)
+"""Default (process-wide) workspace manager, used by `Input` for the run directories (the run directories are placed
+in RAM only if `ZGOUBIDOO_RAM_PATH` is set, e.g. to `RAM_PATH`)."""
@@ -8,7 +8,7 @@
 
 """
 from __future__ import annotations
-from typing import TYPE_CHECKING, List, Mapping, Iterable, Optional, Tuple, Union
+from typing import TYPE_CHECKING, Any, Callable, Dict, List, Mapping, Iterable, Optional, Set, Tuple, Union
 import logging
 import tempfile
 import os
@@ -16,9 +16,16 @@ import numpy as _np
 import pandas as _pd
 import pint
 from .executable import Executable
+from .executable import ExecutionGovernor as _ExecutionGovernor
+from .executable import RunProgress as _RunProgress
+from .retention import OutputRetention as _OutputRetention
 from .transformations import GlobalCoordinateTransformation as _GlobalCoordinateTransformation
 from .transformations import FrenetCoordinateTransformation as _FrenetCoordinateTransformation
-from .outputs import read_plt_file, read_matrix_file, read_srloss_file, read_srloss_steps_file, read_optics_file
+from .outputs import read_plt_file, read_matrix_file, read_srloss_file, read_srloss_steps_file, read_optics_file, \
+    read_fai_file, read_plt_files
+from .statistics import BeamStatistics as _BeamStatistics
+from .cube import ResultsCube as _ResultsCube
+from .mappings import mapping_key as _mapping_key
 from . import ureg as _ureg
 import zgoubidoo
 from .constants import ZGOUBI_INPUT_FILENAME as _ZGOUBI_INPUT_FILENAME
@@ -41,6 +48,26 @@ class ZgoubiException(Exception):
         self.message = m
 
 
+OUTPUT_READERS: Dict[str, Callable[..., _pd.DataFrame]] = {
+    'plt': read_plt_file,
+    'fai': read_fai_file,
+    'matrix': read_matrix_file,
+    'optics': read_optics_file,
+    'srloss': read_srloss_file,
+    'srloss_steps': read_srloss_steps_file,
+}
+"""Readers of the Zgoubi output files, indexed by output type (see `Zgoubi` to parse the outputs after each run)."""
+
+
+def _compact(df: _pd.DataFrame, columns: Optional[List[str]] = None) -> _pd.DataFrame:
+    """Compact representation of a parsed output: selected columns only and categorical string columns."""
+    if columns is not None:
+        df = df[[c for c in columns if c in df.columns]]
+    for c in df.select_dtypes(include=['object', 'string']).columns:  # 'str' dtype with pandas >= 3
+        df[c] = df[c].astype('category')
+    return df
+
+
 class ZgoubiResults:
     """Results from a Zgoubi executable run."""
     def __init__(self, results: List[Mapping], options: Optional[Mapping] = None):
@@ -70,6 +97,9 @@ class ZgoubiResults:
         self._srloss_steps: Optional[_pd.DataFrame] = None
         self._step_by_step_optics: Optional[_pd.DataFrame] = None
         self._step_by_step_transfer_matrix: Optional[_pd.DataFrame] = None
+        self._index: Optional[Dict[Tuple, int]] = None
+        self._indexed: int = 0
+        self._grid: Optional[Tuple[int, _ResultsCube]] = None
 
     @classmethod
     def merge(cls, *results: ZgoubiResults):
@@ -95,19 +125,179 @@ class ZgoubiResults:
         """Retrieve results from the list using a numeric index."""
         return self._results[item]
 
+    @staticmethod
+    def _read_output(r: Mapping, output: str) -> _pd.DataFrame:
+        """Parsed output of a run: parsed by the worker after the run if available, read from the run directory
+        otherwise.
+
+        Raises:
+            FileNotFoundError if the output file is not present.
+        """
+        if output in r.get('outputs', {}):
+            if r['outputs'][output] is None:
+                raise FileNotFoundError(f"Output {output} not available for mapping {r['mapping']}.")
+            return r['outputs'][output].copy()
+        try:
+            p = r['path'].name
+        except AttributeError:
+            p = r['path']
+        return OUTPUT_READERS[output](path=p)
+
+    @property
+    def index(self) -> Dict[Tuple, int]:
+        """Hash index of the runs (position in the results list), keyed by mapping (see `mappings.mapping_key`)."""
+        if self._index is None or self._indexed != len(self._results):
+            self._index = {_mapping_key(r['mapping']): i for i, r in enumerate(self._results)}
+            self._indexed = len(self._results)
+        return self._index
+
+    def get(self, mapping: _MappedParametersType) -> Mapping:
+        """Results of the run of a given mapping (constant time lookup).
+
+        Args:
+            mapping: the mapping of the run.
+
+        Returns:
+            the results of the run.
+
+        Raises:
+            KeyError if no run matches the mapping.
+        """
+        return self._results[self.index[_mapping_key(mapping)]]
+
+    @staticmethod
+    def _selection(parameters: Optional[_MappedParametersListType]) -> Optional[Set[Tuple]]:
+        """Set of the keys of the selected mappings (None if all the runs are selected)."""
+        if parameters is None:
+            return None
+        return {_mapping_key(p) for p in parameters}
+
+    def cube(self, observables: Optional[Mapping[str, Callable[[Mapping], float]]] = None) -> _ResultsCube:
+        """Scalar observables of the runs arranged on the grid of the scan parameters.
+
+        By default the cube contains the CPU time of the runs and the values reduced by the workers when these are
+        scalars or dictionnaries of scalars (see the `reducer` option of `Zgoubi`). The grid of the scan parameters
+        (and its hash index) is built once and shared by the successive cubes.
+
+        Examples:
+            >>> cube = results.cube(observables={'T': lambda r: r['reduced']['transmission']})  # doctest: +SKIP
+            >>> cube.sel({'Q1.K1': 1.5})['T']  # doctest: +SKIP
+
+        Args:
+            observables: additional observables, computed from the results of each run, indexed by name
+
+        Returns:
+            a `ResultsCube`.
+        """
+        values: Dict[str, List[Optional[float]]] = {'CPUTIME': [r.get('cputime') for r in self._results]}
+        reduced = [r.get('reduced') for r in self._results]
+        if all(isinstance(v, (int, float)) for v in reduced):
+            values['REDUCED'] = reduced
+        elif all(isinstance(v, Mapping) for v in reduced):
+            for k in dict.fromkeys(k for v in reduced for k in v.keys()):
+                if all(isinstance(v.get(k), (int, float, type(None))) for v in reduced):
+                    values[k] = [v.get(k) for v in reduced]
+        for k, f in (observables or {}).items():
+            values[k] = [f(r) for r in self._results]
+        if self._grid is None or self._grid[0] != len(self._results):
+            self._grid = (len(self._results), _ResultsCube.from_mappings(self.mappings))
+        return self._grid[1].assign(values)
+
+    @property
+    def reduced(self) -> List[Tuple[_MappedParametersType, Any]]:
+        """Outputs reduced by the workers after each run (see the `reducer` option of `Zgoubi`).
+
+        Returns:
+            a list of tuples with the mapping and the reduced data of each run (None if the reducer failed).
+        """
+        return [(m, r.get('reduced')) for m, r in self.results]
+
+    @property
+    def reducer_exceptions(self) -> List[Tuple[_MappedParametersType, Exception]]:
+        """Exceptions raised by the reducer (see the `reducer` option of `Zgoubi`), for the runs where it failed.
+
+        Returns:
+            a list of tuples with the mapping and the exception of each failed reduction.
+        """
+        return [(m, r['reducer_exception']) for m, r in self.results if r.get('reducer_exception') is not None]
+
+    def beam_statistics(self,
+                        by: Iterable[str] = ('LABEL1', 'IPASS'),
+                        parameters: Optional[_MappedParametersListType] = None,
+                        chunksize: int = 100000,
+                        ) -> _BeamStatistics:
+        """Accumulate the beam moments of the runs matching the given parameters list, in bounded memory.
+
+        The .plt files are read by chunks (and only the required columns); the statistics reduced by the workers
+        (`BeamStatistics.reducer`) or the tracks parsed by the workers are used directly when available.
+
+        Args:
+            by: the columns of the tracks used to group the particles
+            parameters: the mappings of the runs to consider (default: all runs)
+            chunksize: the number of rows of the .plt files read at once
+
+        Returns:
+            the (merged) `BeamStatistics` accumulator.
+        """
+        statistics = _BeamStatistics(by)
+        selection = self._selection(parameters)
+        for k, r in self.results:
+            if selection is not None and _mapping_key(k) not in selection:
+                continue
+            reduced = r.get('reduced')
+            if isinstance(reduced, _BeamStatistics) and reduced.by == statistics.by:
+                statistics.merge(reduced)
+                continue
+            try:
+                if 'plt' in r.get('outputs', {}):
+                    statistics.update(self._read_output(r, 'plt'))
+                else:
+                    statistics.update_from_file(path=getattr(r['path'], 'name', r['path']), chunksize=chunksize)
+            except FileNotFoundError:
+                _logger.warning(f"Unable to read the Zgoubi .plt file for path {r['path']}.")
+        return statistics
+
+    def reduce(self,
+               stats: Optional[List[str]] = None,
+               by: Iterable[str] = ('LABEL1', 'IPASS'),
+               parameters: Optional[_MappedParametersListType] = None,
+               chunksize: int = 100000,
+               ) -> _pd.DataFrame:
+        """Beam statistics (centroids, beam matrices, emittances, transmission, envelopes) of the tracks.
+
+        Examples:
+            >>> results.reduce(stats=['centroid', 'emittance'], by=['LABEL1', 'IPASS'])  # doctest: +SKIP
+
+        Args:
+            stats: the statistics to compute (see `zgoubidoo.statistics.BEAM_STATISTICS`, default: all)
+            by: the columns of the tracks used to group the particles
+            parameters: the mappings of the runs to consider (default: all runs)
+            chunksize: the number of rows of the .plt files read at once
+
+        Returns:
+            a dataframe with the statistics, indexed by the grouping columns.
+        """
+        return self.beam_statistics(by=by, parameters=parameters, chunksize=chunksize).to_df(stats)
+
     def get_tracks(self,
                    parameters: Optional[_MappedParametersListType] = None,
                    force_reload: bool = False,
                    transformation: Optional[_CoordinateTransformationType] = None,
+                   n_procs: Optional[int] = None,
                    ) -> _pd.DataFrame:
         """
         Collects all tracks from the different Zgoubi instances matching the given parameters list
         in the results and concatenate them.
 
+        The .plt files can be parsed by a pool of processes (see `zgoubidoo.outputs.read_plt_files`), which is
+        beneficial for large scans; the number of processes is given by `n_procs` or by the 'n_procs' option of the
+        results. The tracks already parsed by the workers after the runs are used directly.
+
         Args:
             parameters:
             force_reload:
             transformation:
+            n_procs: number of processes used to parse the .plt files (default: no process pool)
 
         Returns:
             A concatenated DataFrame with all the tracks in the result matching the parameters list.
@@ -120,16 +310,27 @@ class ZgoubiResults:
 
         if self._tracks is not None and parameters is None and force_reload is False:
             return _transform_and_return_tracks(self._tracks)
+        n_procs = n_procs or self._options.get('n_procs')
+        selection = self._selection(parameters)
+        preloaded: Dict[int, Optional[_pd.DataFrame]] = {}
+        if n_procs is not None and n_procs > 1:
+            to_load = [r for k, r in self.results
+                       if (selection is None or _mapping_key(k) in selection) and 'plt' not in r.get('outputs', {})]
+            preloaded = dict(zip(
+                map(id, to_load),
+                read_plt_files([getattr(r['path'], 'name', r['path']) for r in to_load], n_procs=n_procs)
+            ))
         tracks = list()
         particle_id = 0
         for k, r in self.results:
-            if parameters is None or k in parameters:
+            if selection is None or _mapping_key(k) in selection:
                 try:
-                    try:
-                        p = r['path'].name
-                    except AttributeError:
-                        p = r['path']
-                    tracks.append(read_plt_file(path=p))
+                    if id(r) in preloaded:
+                        if preloaded[id(r)] is None:
+                            raise FileNotFoundError
+                        tracks.append(preloaded[id(r)])
+                    else:
+                        tracks.append(self._read_output(r, 'plt'))
                     tracks[-1]['IT'] += particle_id
                     particle_id = _np.max(tracks[-1]['IT'])
                     for kk, vv in k.items():
@@ -196,14 +397,11 @@ class ZgoubiResults:
         if self._srloss is not None and parameters is None and force_reload is False:
             return self._srloss
         srloss = list()
+        selection = self._selection(parameters)
         for k, r in self.results:
-            if parameters is None or k in parameters:
+            if selection is None or _mapping_key(k) in selection:
                 try:
-                    try:
-                        p = r['path'].name
-                    except AttributeError:
-                        p = r['path']
-                    srloss.append(read_srloss_file(path=p))
+                    srloss.append(self._read_output(r, 'srloss'))
                     for kk, vv in k.items():
                         srloss[-1][f"{kk}"] = vv
                 except FileNotFoundError:
@@ -247,14 +445,11 @@ class ZgoubiResults:
         if self._srloss_steps is not None and parameters is None and force_reload is False:
             return self._srloss_steps
         srloss_steps = list()
+        selection = self._selection(parameters)
         for k, r in self.results:
-            if parameters is None or k in parameters:
+            if selection is None or _mapping_key(k) in selection:
                 try:
-                    try:
-                        p = r['path'].name
-                    except AttributeError:
-                        p = r['path']
-                    srloss_steps.append(read_srloss_steps_file(path=p))
+                    srloss_steps.append(self._read_output(r, 'srloss_steps'))
                     for kk, vv in k.items():
                         srloss_steps[-1][f"{kk}"] = vv
                 except FileNotFoundError:
@@ -295,11 +490,7 @@ class ZgoubiResults:
             try:
                 m = list()
                 for r in self._results:
-                    try:
-                        p = r['path'].name
-                    except AttributeError:
-                        p = r['path']
-                    m.append(read_matrix_file(path=p))
+                    m.append(self._read_output(r, 'matrix'))
                 self._matrix = _pd.concat(m)
             except FileNotFoundError:
                 _logger.warning(
@@ -324,11 +515,7 @@ class ZgoubiResults:
         try:
             m = list()
             for r in self._results:
-                try:
-                    p = r['path'].name
-                except AttributeError:
-                    p = r['path']
-                m.append(read_optics_file(path=p))
+                m.append(self._read_output(r, 'optics'))
             self._optics = _pd.concat(m)
         except FileNotFoundError:
             _logger.warning(
@@ -374,6 +561,15 @@ class ZgoubiResults:
         """
         return self.compute_step_by_step_transfer_matrix()
 
+    @property
+    def envelope(self) -> zgoubidoo.envelope.LinearEnvelope:
+        """Linear envelope (propagation of beam matrices) from the step-by-step transfer matrices.
+
+        Returns:
+            the linear envelope (see `zgoubidoo.envelope.LinearEnvelope`).
+        """
+        return zgoubidoo.envelope.LinearEnvelope(self.step_by_step_transfer_matrix)
+
     def compute_step_by_step_optics(self,
                                     twiss_init: Optional[_BetaBlock] = None,
                                     force_reload: bool = False) -> Optional[_pd.DataFrame]:
@@ -444,11 +640,30 @@ class ZgoubiResults:
         ]
         self.results[0][1]['input'].save(destination=destination, what=files)
 
+    def release(self, results: bool = False):
+        """Release the raw outputs (standard output and result file) held by the results and attached to the commands.
+
+        Args:
+            results: also release the parsed results attached to the commands.
+
+        Returns:
+            the results themselves (for method chaining).
+        """
+        inputs = {}
+        for r in self._results:
+            r['stdout'] = None
+            r['result'] = None
+            if r.get('input') is not None:
+                inputs[id(r['input'])] = r['input']
+        for i in inputs.values():
+            i.release_outputs(results=results)
+        return self
+
     def print(self, what: str = 'result'):
         """Helper function to print the raw results from a Zgoubi run."""
         for m, r in self.results:
             print(f"Results for mapping {m}\n")
-            print('\n'.join(r[what]))
+            print('\n'.join(r[what] or ['(output not retained)']))
             print("================================================================================================")
             print("================================================================================================")
             print("================================================================================================")
@@ -466,7 +681,20 @@ class Zgoubi(Executable):
     RESULT_FILE: str = 'zgoubi.res'
     """Default name of the Zgoubi result '.res' file."""
 
-    def __init__(self, executable: str = EXECUTABLE_NAME, path: str = None, n_procs: Optional[int] = None):
+    def __init__(self,
+                 executable: str = EXECUTABLE_NAME,
+                 path: str = None,
+                 n_procs: Optional[int] = None,
+                 priority: int = 0,
+                 execution_governor: Optional[_ExecutionGovernor] = None,
+                 parse_outputs: Optional[Iterable[str]] = None,
+                 columns: Optional[Mapping[str, List[str]]] = None,
+                 reducer: Optional[Callable[[Mapping[str, Any], _MappedParametersType], Any]] = None,
+                 keep_parsed: bool = True,
+                 retention: Optional[_OutputRetention] = None,
+                 progress_callback: Optional[Callable[[_RunProgress], None]] = None,
+                 unbuffered: bool = True,
+                 ):
         """
         `Zgoubi` is responsible for running the Zgoubi executable within Zgoubidoo. It will run Zgoubi as a subprocess
         and offers a variety of concurency and parallelisation features.
@@ -477,19 +705,56 @@ class Zgoubi(Executable):
         The Zgoubi executable is called on an instance of `Input` specifying a list of paths containing Zgoubi input
         files. Multiple instances can thus be run in parallel.
 
-        TODO details on concurrency
+        The number of Zgoubi processes running concurrently is capped process-wide by the execution governor (see
+        `zgoubidoo.executable.governor`), which is shared by all the `Zgoubi` instances (including the ones created
+        internally, e.g. for the surveys or the fits); queued runs are started by order of priority.
+
+        The output files (see `OUTPUT_READERS`) can be parsed by the worker right after each run (`parse_outputs`),
+        while the other runs are still executing; the parsed outputs are stored in a compact form (selected columns,
+        categorical strings) with the results and used by `ZgoubiResults` instead of reading the files again. A
+        `reducer` can further be applied by the worker on the parsed outputs of each run (e.g. to compute beam
+        statistics), the parsed outputs being possibly discarded (`keep_parsed=False`). An exception raised by the
+        reducer does not discard the run: it is attached to its results (`reducer_exception`), with the parsed
+        outputs.
+
+        Examples:
+            >>> z = Zgoubi(parse_outputs=['plt'], columns={'plt': ['X', 'Y', 'T', 'LABEL1', 'IT']})
 
         Args:
             - executable: name of the Zgoubi executable
             - path: path to the Zgoubi executable
-            - n_procs: maximum number of Zgoubi simulations to be started in parallel
-
-        """
+            - n_procs: maximum number of Zgoubi simulations to be started in parallel by this instance
+            - priority: priority of the runs of this instance (higher values are started first)
+            - execution_governor: the execution governor (default to the process-wide governor)
+            - parse_outputs: output types to be parsed by the worker after each run (e.g. ['plt', 'matrix'])
+            - columns: columns to be kept for each parsed output type (default: all)
+            - reducer: callable applied (by the worker) to the parsed outputs and the mapping of each run
+            - keep_parsed: keep the parsed outputs with the results (if False, only the reduced data are kept)
+            - retention: retention policy for the raw outputs kept with the results and attached to the commands
+              (default to the process-wide policy, see `zgoubidoo.retention`)
+            - progress_callback: callable called with the progress of the runs, streamed from their standard output
+              (see `zgoubidoo.executable.RunProgress`)
+            - unbuffered: run Zgoubi with an unbuffered standard output, required for the live progress and the
+              detection of stalled runs (see `zgoubidoo.executable.Executable`)
+
+        """
+        self._parse_outputs: List[str] = list(parse_outputs or [])
+        self._columns: Mapping[str, List[str]] = columns or {}
+        self._reducer = reducer
+        self._keep_parsed: bool = keep_parsed
+        for o in self._parse_outputs:
+            if o not in OUTPUT_READERS:
+                raise ZgoubiException(f"Unable to parse the output '{o}' (no reader available).")
 
         super().__init__(executable=executable,
                          results_type=ZgoubiResults,
                          path=os.environ.get('ZGOUBI_EXECUTABLE_PATH', None),
-                         n_procs=n_procs
+                         n_procs=n_procs,
+                         priority=priority,
+                         execution_governor=execution_governor,
+                         retention=retention,
+                         progress_callback=progress_callback,
+                         unbuffered=unbuffered,
                          )
 
     def _extract_output(self, path, code_input: _Input, mapping) -> List[str]:
@@ -504,9 +769,32 @@ class Zgoubi(Executable):
             e.attach_output(outputs=Zgoubi.find_labeled_output(result, e.LABEL1, e.KEYWORD),
                             zgoubi_input=code_input,
                             parameters=mapping,
+                            retention=self._retention,
                             )
         return result
 
+    def _process_outputs(self, path: str, mapping: _MappedParametersType) -> Dict[str, Any]:
+        """Parse (and reduce) the outputs in the worker, right after the run."""
+        if not self._parse_outputs:
+            return {}
+        outputs: Dict[str, Optional[_pd.DataFrame]] = {}
+        for o in self._parse_outputs:
+            try:
+                outputs[o] = _compact(OUTPUT_READERS[o](path=path), self._columns.get(o))
+            except FileNotFoundError:
+                outputs[o] = None
+        processed: Dict[str, Any] = {}
+        if self._reducer is not None:
+            try:
+                processed['reduced'] = self._reducer(outputs, mapping)
+            except Exception as e:
+                _logger.warning(f"The reducer failed for mapping {mapping} in path {path}: {e}")
+                processed['reduced'] = None
+                processed['reducer_exception'] = e
+        if self._keep_parsed or 'reducer_exception' in processed:
+            processed['outputs'] = outputs
+        return processed
+
     @staticmethod
     def find_labeled_output(out: Iterable[str], label: str, keyword: str) -> List[str]:
         """